@@ -1,11 +1,20 @@
-from flask import Flask, render_template, jsonify
+from flask import Blueprint, Flask, Response, current_app, render_template, jsonify, request, g, make_response
+from datetime import date, datetime, timezone
+import argparse
+import functools
+import hashlib
+import importlib
 import os
-import pandas as pd
-import sqlite3
 import json
-import openai
-from pdfminer.high_level import extract_text
+import time
 from flask_cors import CORS
+from app.components.cache import LRUCache
+from app.components.compression import MIN_COMPRESS_SIZE, choose_encoding, compress_body, compress_chunks
+from app.components.generator import DOCUMENT_GENERATORS, GenerationError, create_llm_cache, get_openai_settings
+from app.components.prompt_compactor import PromptCompactor, get_settings as get_compaction_settings, refresh_compactor
+from app.components.resume_cache import ResumeTextCache
+from app.components.storage import create_db_manager
+from app.components.task_queue import TaskQueue
 
 def get_path(file_name):
     base_dir = os.path.dirname(os.path.abspath(__file__)) # Go up to parent auto-job-scraper/
@@ -18,14 +27,180 @@ def load_config(file_name):
     with open(file_name) as f:
         return json.load(f)
 
-config = load_config('data/config.json')
-app = Flask(__name__)
-CORS(app)
-app.config['TEMPLATES_AUTO_RELOAD'] = True
+views = Blueprint('jobs', __name__)
+
+# Columns rendered in the job list, the page only needs the job cards
+JOB_LIST_FIELDS = ["id", "title", "company", "location", "date", "min_salary", "max_salary", "applied", "interview",
+                   "rejected"]
+JOBS_PER_PAGE = 50
+# Most status changes accepted by one /update_job_statuses request
+MAX_STATUS_CHANGES = 1000
+# Responses compressed with gzip or brotli when the client accepts it
+COMPRESSIBLE_MIMETYPES = {'application/json', 'application/x-ndjson', 'text/html'}
+# Rows of /export_jobs are sent in chunks of about this many bytes
+EXPORT_CHUNK_SIZE = 64 * 1024
+# /stream/jobs checks for new jobs every poll interval and sends a keep-alive comment when idle. Each stream ends
+# after a while so it doesn't hold a server thread forever, and the browser reconnects from the last event id.
+STREAM_POLL_SECONDS = 2
+STREAM_KEEPALIVE_SECONDS = 15
+STREAM_MAX_SECONDS = 300
+# Production server defaults, overridden by config["server"] and the command line. Every worker process handles
+# requests on a pool of threads, so a slow cover letter or an open job stream doesn't hold up other users. A single
+# worker is the default, as generation tasks are only known to the worker that queued them.
+DEFAULT_SERVER_SETTINGS = {
+    "bind": "127.0.0.1:5000",
+    "workers": 1,
+    "threads": 8,
+    "timeout": 120
+}
+# Imported by the server's master process before it starts the workers, so they share the loaded modules instead of
+# each importing them on its first resume read or generation request
+PRELOAD_MODULES = ("pdfminer.high_level", "openai")
+
+
+class AppState:
+    """The config and the caches and background workers of one app, created once per worker process by create_app."""
+
+    def __init__(self, config):
+        self.config = config
+        self.db_path = get_path(config["db_path"])
+        # Job detail payloads (the job with its decompressed texts) by id, with the change marker they were read at.
+        # Every route that changes a job's status or documents also invalidates its entry.
+        self.job_details_cache = LRUCache(max_size=256)
+        # Bodies of the read endpoints' responses, keyed by request path and the ETag of the jobs table's change marker
+        self.response_cache = LRUCache(max_size=512)
+        # Text of the resume PDF, parsed again only when the file's content changes
+        self.resume_cache = ResumeTextCache(extract_pdf_text, persist=config.get("resume_text_cache", False))
+        # Strips boilerplate detected in the stored job descriptions from the prompts, false in config disables it
+        compaction_settings = get_compaction_settings(config)
+        self.prompt_compactor = PromptCompactor(compaction_settings) if compaction_settings is not None else None
+        self.openai_settings = get_openai_settings(config, create_llm_cache(config, get_path),
+                                                   compactor=self.prompt_compactor)
+        # Resume and cover letter generation, run in the background so a request doesn't wait on the language model
+        self.generation_queue = TaskQueue(max_workers=config.get("generation_workers", 2))
+
+
+def create_app(config_file='data/config.json'):
+    """Create the web app with the config read from config_file. A WSGI server calls it once in every worker process,
+    so each worker has its own caches, connection pools and generation threads. The job tables are created or migrated
+    first, as the read-only connections of GET requests can't do it."""
+    config = load_config(config_file)
+    verify_db_schema(config)
+    app = Flask(__name__)
+    CORS(app)
+    app.config['TEMPLATES_AUTO_RELOAD'] = True
+    app.extensions['job_scraper'] = AppState(config)
+    app.register_blueprint(views)
+    app.after_request(compress_response)
+    app.teardown_appcontext(close_db_managers)
+    return app
+
+def get_state():
+    return current_app.extensions['job_scraper']
+
+def extract_pdf_text(file):
+    # pdfminer is imported on the first resume read instead of when the app starts
+    from pdfminer.high_level import extract_text
+    return extract_text(file)
+
+def get_db_manager(read_only=None):
+    # DB_Manager or PG_Manager for the current request, on a pooled connection returned when the request ends.
+    # GET requests get a read-only connection by default.
+    if read_only is None:
+        read_only = request.method in ('GET', 'HEAD')
+    key = 'read_db_manager' if read_only else 'write_db_manager'
+    if key not in g:
+        state = get_state()
+        setattr(g, key, create_db_manager(state.config, state.db_path, pooled=True, read_only=read_only))
+    return getattr(g, key)
+
+def compress_response(response):
+    # gzip or brotli compress JSON and HTML responses, streamed ones chunk by chunk as they are produced. The encoding
+    # is added to the ETag, as the compressed body is a different representation.
+    if request.method == 'HEAD' or 'Content-Encoding' in response.headers or \
+            response.mimetype not in COMPRESSIBLE_MIMETYPES:
+        return response
+    response.vary.add('Accept-Encoding')
+    encoding = choose_encoding(request.accept_encodings)
+    if encoding is None or response.status_code not in (200, 304):
+        return response
+    if response.status_code == 200:
+        if response.is_streamed:
+            response.response = compress_chunks(response.response, encoding)
+            response.headers.pop('Content-Length', None)
+        else:
+            data = response.get_data()
+            if len(data) < MIN_COMPRESS_SIZE:
+                return response
+            response.set_data(compress_body(data, encoding))
+        response.headers['Content-Encoding'] = encoding
+    etag, weak = response.get_etag()
+    if etag:
+        response.set_etag(f"{etag}-{encoding}", weak)
+    return response
+
+def close_db_managers(exception):
+    # Return the request's connections to their pools, rolling back anything left uncommitted
+    for key in ('read_db_manager', 'write_db_manager'):
+        db_manager = g.pop(key, None)
+        if db_manager is not None:
+            db_manager.close()
+
+def conditional_response(view=None, daily=False):
+    # Serve a GET endpoint with an ETag and Last-Modified derived from the jobs table's change marker. A request
+    # carrying the current ETag gets a 304, and an unchanged response is served from response_cache without querying
+    # or rendering the jobs again. With daily, the response also depends on the current date, e.g. "posted in the
+    # last 7 days" counts, so the date is part of the ETag and cache key and no Last-Modified is sent.
+    if view is None:
+        return functools.partial(conditional_response, daily=daily)
+
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        max_id, count, updated_at = get_db_manager().get_change_marker("jobs")
+        version = f"{max_id}:{count}:{updated_at}"
+        if daily:
+            version += f":{date.today().isoformat()}"
+        etag = hashlib.sha1(version.encode()).hexdigest()[:20]
+        # Compressed responses carry the ETag with the encoding appended
+        if any(tag in request.if_none_match for tag in (etag, f"{etag}-br", f"{etag}-gzip")):
+            response = Response(status=304)
+        else:
+            key = (request.full_path, etag)
+            response_cache = get_state().response_cache
+            cached = response_cache.get(key)
+            if cached is None:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+                cached = (response.get_data(), response.mimetype)
+                response_cache.set(key, cached)
+            response = Response(cached[0], mimetype=cached[1])
+        response.set_etag(etag)
+        if updated_at and not daily:
+            response.last_modified = datetime.fromisoformat(updated_at).replace(tzinfo=timezone.utc)
+        # Let clients keep the response, but make them revalidate it on every use
+        response.cache_control.no_cache = True
+        return response.make_conditional(request)
+    return wrapper
+
+def get_job_details(job_id):
+    # The job with its texts from the cache, or a single primary key lookup. Don't modify the returned dict.
+    # Entries are only used while the jobs table's change marker is the same as when they were cached, as the
+    # scraper writes pre-generated cover letters from another process.
+    db_manager = get_db_manager()
+    job_details_cache = get_state().job_details_cache
+    marker = db_manager.get_change_marker("jobs")
+    cached = job_details_cache.get(job_id)
+    if cached is not None and cached[0] == marker:
+        return cached[1]
+    job = db_manager.get_job("jobs", job_id)
+    if job is not None:
+        job_details_cache.set(job_id, (marker, job))
+    return job
 
 def read_pdf(file_path):
     try:
-        text = extract_text(file_path)
+        text = get_state().resume_cache.get_text(file_path)
         return text
     except FileNotFoundError:
         print(f"Error: The file '{file_path}' was not found.")
@@ -47,250 +222,379 @@ def read_pdf(file_path):
 # except:
 #     print("No OpenAI Model found or it's incorrectly specified in the config. Please add one to config.json")
 
-@app.route('/')
+@views.route('/')
+@conditional_response
 def home():
-    jobs = read_jobs_from_db()
-    return render_template('jobs.html', jobs=jobs)
-
-@app.route('/job/<int:job_id>')
+    # One page of the job list, older pages through ?before=<id>. Descriptions are loaded on click via /job_details.
+    before = request.args.get('before', type=int)
+    db_manager = get_db_manager()
+    jobs = db_manager.list_jobs("jobs", fields=JOB_LIST_FIELDS, before_id=before, limit=JOBS_PER_PAGE + 1)
+    next_before = jobs[JOBS_PER_PAGE - 1]["id"] if len(jobs) > JOBS_PER_PAGE else None
+    return render_template('jobs.html', jobs=jobs[:JOBS_PER_PAGE], before=before, next_before=next_before)
+
+@views.route('/job/<int:job_id>')
+@conditional_response
 def job(job_id):
-    jobs = read_jobs_from_db()
-    return render_template('./templates/job_description.html', job=jobs[job_id])
+    job = get_job_details(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    return render_template('job_description.html', job=job)
 
-@app.route('/get_all_jobs')
+@views.route('/get_all_jobs')
+@conditional_response
 def get_all_jobs():
-    db_path = get_path(config["db_path"])
-    conn = sqlite3.connect(db_path)
-    query = "SELECT * FROM jobs"
-    df = pd.read_sql_query(query, conn)
-    df = df.sort_values(by='id', ascending=False)
-    df.reset_index(drop=True, inplace=True)
-    jobs = df.to_dict('records')
-    return jsonify(jobs)
-
-@app.route('/job_details/<int:job_id>')
+    # One page of jobs, newest first, e.g. /get_all_jobs?fields=id,title,company&limit=50
+    # Pass the returned next_before as ?before= to get the following page
+    limit = min(max(request.args.get('limit', 100, type=int), 1), 500)
+    before = request.args.get('before', type=int)
+    fields = [field.strip() for field in request.args.get('fields', '').split(',') if field.strip()]
+    db_manager = get_db_manager()
+    try:
+        # One extra row tells whether there is a next page
+        jobs = db_manager.list_jobs("jobs", include_hidden=True, fields=fields, before_id=before, limit=limit + 1)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    next_before = jobs[limit - 1]["id"] if len(jobs) > limit else None
+    return jsonify({"jobs": jobs[:limit], "next_before": next_before})
+
+@views.route('/export_jobs')
+def export_jobs():
+    # Every job, newest first, streamed from a database cursor so memory use stays flat however many there are.
+    # ?format=ndjson (default) writes one JSON object per line, ?format=json a JSON array. ?fields= as /get_all_jobs,
+    # ?include_hidden=0 leaves out hidden jobs.
+    output_format = request.args.get('format', 'ndjson')
+    if output_format not in ('ndjson', 'json'):
+        return jsonify({"error": f"Unknown format: {output_format}"}), 400
+    fields = [field.strip() for field in request.args.get('fields', '').split(',') if field.strip()]
+    try:
+        get_db_manager().get_list_fields(fields)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    include_hidden = request.args.get('include_hidden', '1') != '0'
+    mimetype = 'application/x-ndjson' if output_format == 'ndjson' else 'application/json'
+    return Response(stream_job_export(get_state(), output_format, fields, include_hidden), mimetype=mimetype)
+
+def stream_job_export(state, output_format, fields, include_hidden):
+    # The stream outlives the request, so it reads through its own pooled connection
+    db_manager = create_db_manager(state.config, state.db_path, pooled=True, read_only=True)
+    try:
+        if db_manager.connection is None:
+            raise RuntimeError("Could not connect to the database")
+        rows = (json.dumps(job) for job in db_manager.iter_jobs("jobs", include_hidden, fields))
+        separator = "\n" if output_format == 'ndjson' else ",\n"
+        chunk, size, first = [], 0, True
+        if output_format == 'json':
+            chunk.append("[")
+        for row in rows:
+            chunk.append(row if first or output_format == 'ndjson' else separator + row)
+            if output_format == 'ndjson':
+                chunk.append(separator)
+            first = False
+            size += len(row)
+            if size >= EXPORT_CHUNK_SIZE:
+                yield "".join(chunk)
+                chunk, size = [], 0
+        if output_format == 'json':
+            chunk.append("]")
+        yield "".join(chunk)
+    finally:
+        db_manager.close()
+
+@views.route('/search')
+@conditional_response
+def search():
+    # Ranked full-text search over title, company, location and description, e.g. /search?q=kafka&page=2
+    query = request.args.get('q', '')
+    page = max(request.args.get('page', 1, type=int), 1)
+    per_page = min(max(request.args.get('per_page', 25, type=int), 1), 100)
+    db_manager = get_db_manager()
+    total, jobs = db_manager.search_jobs("jobs", query, per_page, (page - 1) * per_page)
+    return jsonify({"query": query, "page": page, "per_page": per_page, "total": total, "jobs": jobs})
+
+@views.route('/query_jobs')
+@conditional_response(daily=True)
+def query_jobs():
+    # The job list filtered and sorted by facet selections, with the job counts of every facet value, e.g.
+    # /query_jobs?status=new&company=TechCorp&company=DataCorp&salary_min=120000&date_from=2024-09-01&sort=salary
+    page = max(request.args.get('page', 1, type=int), 1)
+    per_page = min(max(request.args.get('per_page', JOBS_PER_PAGE, type=int), 1), 500)
+    fields = [field.strip() for field in request.args.get('fields', '').split(',') if field.strip()]
+    filters = {facet: request.args.getlist(facet) for facet in ('status', 'company', 'location')}
+    try:
+        for bound in ('salary_min', 'salary_max'):
+            if request.args.get(bound):
+                filters[bound] = int(request.args[bound])
+        for bound in ('date_from', 'date_to'):
+            if request.args.get(bound):
+                filters[bound] = date.fromisoformat(request.args[bound]).isoformat()
+        total, jobs, facets = get_db_manager().query_jobs(
+            "jobs", filters, request.args.get('sort', 'newest'), per_page, (page - 1) * per_page,
+            fields or JOB_LIST_FIELDS, include_hidden=request.args.get('include_hidden') == '1')
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify({"page": page, "per_page": per_page, "total": total, "jobs": jobs, "facets": facets})
+
+@views.route('/stream/jobs')
+def stream_jobs():
+    # Server-Sent Events carrying the jobs added after the client's newest job, e.g. /stream/jobs?after=1234
+    last_id = request.headers.get('Last-Event-ID', type=int)
+    if last_id is None:
+        last_id = request.args.get('after', type=int)
+    if last_id is None:
+        return jsonify({"error": "Pass the id of the newest job you have as ?after="}), 400
+    return Response(stream_new_jobs(get_state(), last_id), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+def stream_new_jobs(state, last_id):
+    # The jobs table's change marker is cheap to check while nothing changed (SQLite answers it from PRAGMA
+    # data_version), so the table is only queried after the scraper inserted rows
+    started = last_sent = time.monotonic()
+    yield "retry: 5000\n\n"
+    while time.monotonic() - started < STREAM_MAX_SECONDS:
+        db_manager = create_db_manager(state.config, state.db_path, pooled=True, read_only=True)
+        try:
+            max_id = db_manager.get_change_marker("jobs")[0] if db_manager.connection is not None else None
+            jobs = []
+            if max_id is not None and max_id > last_id:
+                jobs = db_manager.list_jobs("jobs", fields=JOB_LIST_FIELDS, after_id=last_id)
+        finally:
+            db_manager.close()
+        if max_id is not None and max_id > last_id:
+            last_id = max([max_id] + [job["id"] for job in jobs])
+            if jobs:
+                yield f"id: {last_id}\nevent: jobs\ndata: {json.dumps(jobs)}\n\n"
+                last_sent = time.monotonic()
+        if time.monotonic() - last_sent >= STREAM_KEEPALIVE_SECONDS:
+            yield ": keep-alive\n\n"
+            last_sent = time.monotonic()
+        time.sleep(STREAM_POLL_SECONDS)
+
+@views.route('/job_details/<int:job_id>')
+@conditional_response
 def job_details(job_id):
-    db_path = get_path(config["db_path"])
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM jobs WHERE id = ?", (job_id,))
-    job_tuple = cursor.fetchone()
-    conn.close()
-    if job_tuple is not None:
-        # Get the column names from the cursor description
-        column_names = [column[0] for column in cursor.description]
-        # Create a dictionary mapping column names to row values
-        job = dict(zip(column_names, job_tuple))
+    # Fetch the job along with its decompressed description, cover letter and resume
+    job = get_job_details(job_id)
+    if job is not None:
         return jsonify(job)
     else:
         return jsonify({"error": "Job not found"}), 404
 
-@app.route('/hide_job/<int:job_id>', methods=['POST'])
+@views.route('/hide_job/<int:job_id>', methods=['POST'])
 def hide_job(job_id):
-    db_path = get_path(config["db_path"])
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-    cursor.execute("UPDATE jobs SET hidden = 1 WHERE id = ?", (job_id,))
-    conn.commit()
-    conn.close()
+    db_manager = get_db_manager()
+    db_manager.set_job_status("jobs", job_id, "hidden")
+    get_state().job_details_cache.invalidate(job_id)
     return jsonify({"success": "Job marked as hidden"}), 200
 
 
-@app.route('/mark_applied/<int:job_id>', methods=['POST'])
+@views.route('/mark_applied/<int:job_id>', methods=['POST'])
 def mark_applied(job_id):
     print("Applied clicked!")
-    db_path = get_path(config["db_path"])
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-    query = "UPDATE jobs SET applied = 1 WHERE id = ?"
-    print(f'Executing query: {query} with job_id: {job_id}')  # Log the query
-    cursor.execute(query, (job_id,))
-    conn.commit()
-    conn.close()
+    db_manager = get_db_manager()
+    db_manager.set_job_status("jobs", job_id, "applied")
+    get_state().job_details_cache.invalidate(job_id)
     return jsonify({"success": "Job marked as applied"}), 200
 
-@app.route('/mark_interview/<int:job_id>', methods=['POST'])
+@views.route('/mark_interview/<int:job_id>', methods=['POST'])
 def mark_interview(job_id):
     print("Interview clicked!")
-    db_path = get_path(config["db_path"])
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-    query = "UPDATE jobs SET interview = 1 WHERE id = ?"
-    print(f'Executing query: {query} with job_id: {job_id}')
-    cursor.execute(query, (job_id,))
-    conn.commit()
-    conn.close()
+    db_manager = get_db_manager()
+    db_manager.set_job_status("jobs", job_id, "interview")
+    get_state().job_details_cache.invalidate(job_id)
     return jsonify({"success": "Job marked as interview"}), 200
 
-@app.route('/mark_rejected/<int:job_id>', methods=['POST'])
+@views.route('/mark_rejected/<int:job_id>', methods=['POST'])
 def mark_rejected(job_id):
     print("Rejected clicked!")
-    db_path = get_path(config["db_path"])
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-    query = "UPDATE jobs SET rejected = 1 WHERE id = ?"
-    print(f'Executing query: {query} with job_id: {job_id}')
-    cursor.execute(query, (job_id,))
-    conn.commit()
-    conn.close()
+    db_manager = get_db_manager()
+    db_manager.set_job_status("jobs", job_id, "rejected")
+    get_state().job_details_cache.invalidate(job_id)
     return jsonify({"success": "Job marked as rejected"}), 200
 
-@app.route('/get_cover_letter/<int:job_id>')
+@views.route('/update_job_statuses', methods=['POST'])
+def update_job_statuses():
+    # Apply many status changes in one transaction, including reversals, e.g.
+    # {"changes": [{"id": 12, "status": "hidden", "value": false}, {"id": 15, "status": "applied", "value": true}]}
+    payload = request.get_json(silent=True) or {}
+    changes = payload.get("changes")
+    if not isinstance(changes, list) or len(changes) > MAX_STATUS_CHANGES:
+        return jsonify({"error": f"Expected a list of at most {MAX_STATUS_CHANGES} changes"}), 400
+    try:
+        changes = [(int(change["id"]), change["status"], get_status_value(change.get("value", True)))
+                   for change in changes]
+        db_manager = get_db_manager()
+        updated = db_manager.set_job_statuses("jobs", changes)
+    except (AttributeError, KeyError, TypeError, ValueError) as e:
+        return jsonify({"error": f"Invalid status change: {e}"}), 400
+    for job_id in {job_id for job_id, _, _ in changes}:
+        get_state().job_details_cache.invalidate(job_id)
+    return jsonify({"success": f"Applied {updated} status changes", "updated": updated}), 200
+
+def get_status_value(value):
+    # Only a JSON boolean or 0/1, so a malformed reversal like "false" is rejected instead of setting the status
+    if value in (0, 1) and isinstance(value, (bool, int)):
+        return bool(value)
+    raise ValueError(f"value must be true or false, got {value!r}")
+
+@views.route('/get_cover_letter/<int:job_id>')
+@conditional_response
 def get_cover_letter(job_id):
-    db_path = get_path(config["db_path"])
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-    cursor.execute("SELECT cover_letter FROM jobs WHERE id = ?", (job_id,))
-    cover_letter = cursor.fetchone()
-    conn.close()
-    if cover_letter is not None:
-        return jsonify({"cover_letter": cover_letter[0]})
+    job = get_job_details(job_id)
+    if job is not None:
+        return jsonify({"cover_letter": job["cover_letter"]})
     else:
         return jsonify({"error": "Cover letter not found"}), 404
 
-@app.route('/get_resume/<int:job_id>', methods=['POST'])
-def get_resume(job_id):
-    print("Resume clicked!")
-    db_path = get_path(config["db_path"])
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-    cursor.execute("SELECT job_description, title, company FROM jobs WHERE id = ?", (job_id,))
-    job_tuple = cursor.fetchone()
-    if job_tuple is not None:
-        # Get the column names from the cursor description
-        column_names = [column[0] for column in cursor.description]
-        # Create a dictionary mapping column names to row values
-        job = dict(zip(column_names, job_tuple))
-    resume = read_pdf(config["resume_path"])
+def get_generation_inputs(job_id):
+    # The job and resume text needed to generate a resume or cover letter, or the error response if one is missing
+    db_manager = get_db_manager()
+    job = db_manager.get_job("jobs", job_id, ("job_description",))
+    if job is None:
+        return None, None, (jsonify({"error": "Job not found"}), 404)
+
+    state = get_state()
+    resume = read_pdf(state.config["resume_path"])
+    # Check if resume is None
+    if resume is None:
+        print("Error: Resume not found or couldn't be read.")
+        return None, None, (jsonify({"error": "Resume not found or couldn't be read."}), 400)
 
     # Check if OpenAI API key is empty
-    if not config["OpenAI_API_KEY"]:
+    if not state.config.get("OpenAI_API_KEY"):
         print("Error: OpenAI API key is empty.")
-        return jsonify({"error": "OpenAI API key is empty."}), 400
-
-    openai.api_key = config["OpenAI_API_KEY"]
-    consideration = ""
-    user_prompt = ("You are a career coach with a client that is applying for a job as a "
-                   + job['title'] + " at " + job['company']
-                   + ". They have a resume that you need to review and suggest how to tailor it for the job. "
-                     "Approach this task in the following steps: \n 1. Highlight three to five most important responsibilities for this role based on the job description. "
-                     "\n2. Based on these most important responsibilities from the job description, please tailor the resume for this role. Do not make information up. "
-                     "Respond with the final resume only. \n\n Here is the job description: "
-                   + job['job_description'] + "\n\n Here is the resume: " + resume)
-    if consideration:
-        user_prompt += "\nConsider incorporating that " + consideration
-
+        return None, None, (jsonify({"error": "OpenAI API key is empty."}), 400)
+    if state.prompt_compactor is not None:
+        refresh_compactor(state.prompt_compactor, db_manager, "jobs")
+    return job, resume, None
+
+def generate_job_text(state, field, job_id, job, resume):
+    # Generate the job's resume or cover letter and save it. As it also runs on generation_queue threads, outside of
+    # any request, it saves through its own pooled connection.
+    text = DOCUMENT_GENERATORS[field](job, resume, state.openai_settings)
+    db_manager = create_db_manager(state.config, state.db_path, pooled=True)
     try:
-        completion = openai.ChatCompletion.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "user", "content": user_prompt},
-            ],
-        )
-        response = completion.choices[0].message.content
-    except Exception as e:
-        print(f"Error connecting to OpenAI: {e}")
-        return jsonify({"error": f"Error connecting to OpenAI: {e}"}), 500
-
-    query = "UPDATE jobs SET resume = ? WHERE id = ?"
-    print(f'Executing query: {query} with job_id: {job_id} and resume: {response}')
-    cursor.execute(query, (response, job_id))
-    conn.commit()
-    conn.close()
+        db_manager.set_job_text("jobs", job_id, field, text)
+    finally:
+        db_manager.close()
+    state.job_details_cache.invalidate(job_id)
+    return text
+
+@views.route('/generate/<field>/<int:job_id>', methods=['POST'])
+def generate(field, job_id):
+    # Queue generating a cover_letter or resume for the job, poll the returned status_url for the result
+    if field not in DOCUMENT_GENERATORS:
+        return jsonify({"error": f"Unknown document: {field}"}), 404
+    job, resume, error = get_generation_inputs(job_id)
+    if error is not None:
+        return error
+    state = get_state()
+    task_id = state.generation_queue.submit((field, job_id), generate_job_text, state, field, job_id, job, resume)
+    return jsonify({"task_id": task_id, "status_url": f"/tasks/{task_id}"}), 202
+
+@views.route('/tasks/<task_id>')
+def task_status(task_id):
+    # Status of a generation task: queued, running, done (with the result) or failed (with the error)
+    task = get_state().generation_queue.get(task_id)
+    if task is None:
+        return jsonify({"error": "Task not found"}), 404
+    return jsonify(task)
+
+@views.route('/prompt_stats')
+def prompt_stats():
+    # Tokens saved by prompt compaction since the app started
+    prompt_compactor = get_state().prompt_compactor
+    if prompt_compactor is None:
+        return jsonify({"error": "Prompt compaction is disabled"}), 404
+    return jsonify(prompt_compactor.get_stats())
+
+@views.route('/get_resume/<int:job_id>', methods=['POST'])
+def get_resume(job_id):
+    # Generates the resume within the request, /generate/resume/<job_id> does the same in the background
+    print("Resume clicked!")
+    job, resume, error = get_generation_inputs(job_id)
+    if error is not None:
+        return error
+    try:
+        response = generate_job_text(get_state(), "resume", job_id, job, resume)
+    except GenerationError as e:
+        return jsonify({"error": str(e)}), 500
     return jsonify({"resume": response}), 200
 
-@app.route('/get_CoverLetter/<int:job_id>', methods=['POST'])
+@views.route('/get_CoverLetter/<int:job_id>', methods=['POST'])
 def get_CoverLetter(job_id):
+    # Generates the cover letter within the request, /generate/cover_letter/<job_id> does the same in the background
     print("CoverLetter clicked!")
-    db_path = get_path(config["db_path"])
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-
-    def get_chat_gpt(prompt):
-        try:
-            completion = openai.ChatCompletion.create(
-                model=config["OpenAI_Model"],
-                messages=[
-                    {"role": "user", "content": prompt},
-                ],
-            )
-            return completion.choices[0].message.content
-        except Exception as e:
-            print(f"Error connecting to OpenAI: {e}")
-            return None
-
-    cursor.execute("SELECT job_description, title, company FROM jobs WHERE id = ?", (job_id,))
-    job_tuple = cursor.fetchone()
-    if job_tuple is not None:
-        column_names = [column[0] for column in cursor.description]
-        job = dict(zip(column_names, job_tuple))
-
-    resume = read_pdf(config["resume_path"])
+    job, resume, error = get_generation_inputs(job_id)
+    if error is not None:
+        return error
+    try:
+        response = generate_job_text(get_state(), "cover_letter", job_id, job, resume)
+    except GenerationError as e:
+        return jsonify({"error": str(e)}), 500
+    return jsonify({"cover_letter": response}), 200
 
-    # Check if resume is None
-    if resume is None:
-        print("Error: Resume not found or couldn't be read.")
-        return jsonify({"error": "Resume not found or couldn't be read."}), 400
+def verify_db_schema(config):
+    # Create or migrate the job tables to the current schema version
+    db_manager = create_db_manager(config, get_path(config["db_path"]))
+    if db_manager.connection is not None:
+        for table_name in (config["jobs_tablename"], config["filtered_jobs_tablename"]):
+            db_manager.ensure_schema(table_name)
+    db_manager.close()
 
-    # Check if OpenAI API key is empty
-    if not config["OpenAI_API_KEY"]:
-        print("Error: OpenAI API key is empty.")
-        return jsonify({"error": "OpenAI API key is empty."}), 400
-
-    openai.api_key = config["OpenAI_API_KEY"]
-    consideration = ""
-    user_prompt = ("You are a career coach with over 15 years of experience helping job seekers land their dream jobs in tech. You are helping a candidate to write a cover letter for the below role. Approach this task in three steps. Step 1. Identify main challenges someone in this position would face day to day. Step 2. Write an attention grabbing hook for your cover letter that highlights your experience and qualifications in a way that shows you empathize and can successfully take on challenges of the role. Consider incorporating specific examples of how you tackled these challenges in your past work, and explore creative ways to express your enthusiasm for the opportunity. Put emphasis on how the candidate can contribute to company as opposed to just listing accomplishments. Keep your hook within 100 words or less. Step 3. Finish writing the cover letter based on the resume and keep it within 250 words. Respond with final cover letter only. \n job description: " + job['job_description'] + "\n company: " + job['company'] + "\n title: " + job['title'] + "\n resume: " + resume)
-    if consideration:
-        user_prompt += "\nConsider incorporating that " + consideration
-
-    response = get_chat_gpt(user_prompt)
-    if response is None:
-        return jsonify({"error": "Failed to get a response from OpenAI."}), 500
-
-    user_prompt2 = ("You are young but experienced career coach helping job seekers land their dream jobs in tech. I need your help crafting a cover letter. Here is a job description: " + job['job_description'] + "\nhere is my resume: " + resume + "\nHere's the cover letter I got so far: " + response + "\nI need you to help me improve it. Let's approach this in following steps. \nStep 1. Please set the formality scale as follows: 1 is conversational English, my initial Cover letter draft is 10. Step 2. Identify three to five ways this cover letter can be improved, and elaborate on each way with at least one thoughtful sentence. Step 4. Suggest an improved cover letter based on these suggestions with the Formality Score set to 7. Avoid subjective qualifiers such as drastic, transformational, etc. Keep the final cover letter within 250 words. Please respond with the final cover letter only.")
-    if user_prompt2:
-        response = get_chat_gpt(user_prompt2)
-        if response is None:
-            return jsonify({"error": "Failed to get a response from OpenAI."}), 500
-
-    query = "UPDATE jobs SET cover_letter = ? WHERE id = ?"
-    print(f'Executing query: {query} with job_id: {job_id} and cover letter: {response}')
-    cursor.execute(query, (response, job_id))
-    conn.commit()
-    conn.close()
-    return jsonify({"cover_letter": response}), 200
+def preload_modules():
+    for name in PRELOAD_MODULES:
+        try:
+            importlib.import_module(name)
+        except ImportError:
+            pass
 
-def read_jobs_from_db():
-    db_path = get_path(config["db_path"])
-    conn = sqlite3.connect(db_path)
-    query = "SELECT * FROM jobs WHERE hidden = 0"
-    df = pd.read_sql_query(query, conn)
-    df = df.sort_values(by='id', ascending=False)
-    # df.reset_index(drop=True, inplace=True)
-    return df.to_dict('records')
-
-def verify_db_schema():
-    db_path = get_path(config["db_path"])
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-
-    # Get the table information
-    cursor.execute("PRAGMA table_info(jobs)")
-    table_info = cursor.fetchall()
-
-    # Check if the "cover_letter" column exists
-    if "cover_letter" not in [column[1] for column in table_info]:
-        # If it doesn't exist, add it
-        cursor.execute("ALTER TABLE jobs ADD COLUMN cover_letter TEXT")
-        print("Added cover_letter column to jobs table")
-
-    if "resume" not in [column[1] for column in table_info]:
-        # If it doesn't exist, add it
-        cursor.execute("ALTER TABLE jobs ADD COLUMN resume TEXT")
-        print("Added resume column to jobs table")
-
-    conn.close()
+def serve(config_file, settings):
+    # Serve the app with gunicorn: worker processes with a thread pool each, every worker creating its own app
+    try:
+        from gunicorn.app.base import BaseApplication
+    except ImportError:
+        print("gunicorn is not installed (pip install gunicorn), falling back to Flask's threaded server")
+        host, _, port = settings["bind"].rpartition(':')
+        create_app(config_file).run(host=host or None, port=int(port), threaded=True)
+        return
+
+    class WorkerApplication(BaseApplication):
+        def load_config(self):
+            self.cfg.set('bind', settings["bind"])
+            self.cfg.set('workers', settings["workers"])
+            self.cfg.set('threads', settings["threads"])
+            self.cfg.set('worker_class', 'gthread')
+            self.cfg.set('timeout', settings["timeout"])
+
+        def load(self):
+            # Called in each worker after it started, so no connection or thread is shared across processes
+            return create_app(config_file)
+
+    if settings["workers"] > 1:
+        print(f"Warning: generation tasks are tracked per worker, with {settings['workers']} workers polling "
+              f"/tasks/<task_id> fails when another worker answers it. Use one worker with more threads instead.")
+    preload_modules()
+    WorkerApplication().run()
 
 if __name__ == "__main__":
-    verify_db_schema()  # Verify the DB schema before running the app
-    app.run(debug=True, port=5001)
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Run the web interface.")
+    parser.add_argument('config_file', nargs='?', default='data/config.json',
+                        help="Path to the configuration file (default: data/config.json).")
+    parser.add_argument('-serve', action='store_true',
+                        help="Serve with multiple worker processes and threads instead of the debug server.")
+    parser.add_argument('-bind', help="Address to listen on, e.g. 0.0.0.0:5000.")
+    parser.add_argument('-workers', type=int,
+                        help="Number of worker processes (default: 1, generation tasks are tracked per worker).")
+    parser.add_argument('-threads', type=int, help="Number of request threads per worker.")
+    args = parser.parse_args()
+
+    config = load_config(args.config_file)
+    if args.serve:
+        # Migrated once before the workers start, so they don't migrate the database at the same time
+        verify_db_schema(config)
+        settings = {**DEFAULT_SERVER_SETTINGS, **config.get("server", {})}
+        settings.update({key: value for key, value in (("bind", args.bind), ("workers", args.workers),
+                                                       ("threads", args.threads)) if value is not None})
+        serve(args.config_file, settings)
+    else:
+        create_app(args.config_file).run(debug=True, port=5001)
@@ -0,0 +1,151 @@
+from .db_connection import connect
+from collections import OrderedDict
+from concurrent.futures import Future
+import threading
+import time
+
+
+class LRUCache:
+    """Small thread-safe least recently used cache. Values are evicted once more than max_size keys are stored, and
+    can be invalidated by key when the data they were built from changes."""
+
+    def __init__(self, max_size=256):
+        self.max_size = max_size
+        self.items = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        with self.lock:
+            if key not in self.items:
+                self.misses += 1
+                return default
+            self.items.move_to_end(key)
+            self.hits += 1
+            return self.items[key]
+
+    def set(self, key, value):
+        with self.lock:
+            self.items[key] = value
+            self.items.move_to_end(key)
+            while len(self.items) > self.max_size:
+                self.items.popitem(last=False)
+
+    def invalidate(self, key):
+        with self.lock:
+            self.items.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.items.clear()
+
+    def __len__(self):
+        return len(self.items)
+
+    def __contains__(self, key):
+        return key in self.items
+
+
+class PersistentCache:
+    """Cache of text values in a SQLite file, so entries survive restarts and are shared by every process using the
+    file. Entries expire ttl_seconds after they were stored, and once the stored values exceed max_bytes the least
+    recently used ones are evicted. get_or_set coalesces concurrent calls for the same key in this process into one
+    computation."""
+
+    def __init__(self, db_path, ttl_seconds=None, max_bytes=None, sqlite_settings=None):
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.connection = connect(db_path, sqlite_settings, check_same_thread=False)
+        self.connection.execute("CREATE TABLE IF NOT EXISTS cache_entries (key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+                                "size INTEGER NOT NULL, created_at REAL NOT NULL, last_used REAL NOT NULL)")
+        self.connection.execute("CREATE INDEX IF NOT EXISTS cache_entries_last_used ON cache_entries (last_used)")
+        self.connection.commit()
+        self.lock = threading.Lock()
+        # Future of the computation in progress for a key
+        self.in_flight = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        now = time.time()
+        with self.lock:
+            row = self.connection.execute("SELECT value, created_at FROM cache_entries WHERE key = ?",
+                                          (key,)).fetchone()
+            if row is not None and self.ttl_seconds is not None and row[1] + self.ttl_seconds <= now:
+                self.connection.execute("DELETE FROM cache_entries WHERE key = ?", (key,))
+                row = None
+            if row is None:
+                self.connection.commit()
+                self.misses += 1
+                return default
+            self.connection.execute("UPDATE cache_entries SET last_used = ? WHERE key = ?", (now, key))
+            self.connection.commit()
+            self.hits += 1
+            return row[0]
+
+    def set(self, key, value):
+        now = time.time()
+        with self.lock:
+            self.connection.execute("INSERT OR REPLACE INTO cache_entries (key, value, size, created_at, last_used) "
+                                    "VALUES (?, ?, ?, ?, ?)", (key, value, len(value.encode()), now, now))
+            self.evict(now)
+            self.connection.commit()
+
+    def evict(self, now):
+        if self.ttl_seconds is not None:
+            self.connection.execute("DELETE FROM cache_entries WHERE created_at <= ?", (now - self.ttl_seconds,))
+        if self.max_bytes is not None:
+            # Keep the most recently used entries that fit in max_bytes together
+            self.connection.execute("""
+                DELETE FROM cache_entries WHERE key IN (
+                    SELECT key FROM (SELECT key, sum(size) OVER (ORDER BY last_used DESC, key) AS total
+                                     FROM cache_entries)
+                    WHERE total > ?)
+            """, (self.max_bytes,))
+
+    def get_or_set(self, key, compute):
+        """Get the cached value, or store and return the value of compute(). While one thread computes a key, other
+        threads asking for it wait for that result instead of computing it again. Errors are not cached."""
+        value = self.get(key)
+        if value is not None:
+            return value
+        with self.lock:
+            future = self.in_flight.get(key)
+            computing = future is None
+            if computing:
+                future = self.in_flight[key] = Future()
+        if not computing:
+            return future.result()
+        try:
+            # Another thread may have stored the value between the lookup above and taking over the key
+            value = self.get(key)
+            if value is None:
+                value = compute()
+                self.set(key, value)
+            future.set_result(value)
+            return value
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self.lock:
+                del self.in_flight[key]
+
+    def invalidate(self, key):
+        with self.lock:
+            self.connection.execute("DELETE FROM cache_entries WHERE key = ?", (key,))
+            self.connection.commit()
+
+    def clear(self):
+        with self.lock:
+            self.connection.execute("DELETE FROM cache_entries")
+            self.connection.commit()
+
+    def __len__(self):
+        with self.lock:
+            return self.connection.execute("SELECT count(*) FROM cache_entries").fetchone()[0]
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
@@ -0,0 +1,79 @@
+import zlib
+
+try:
+    import brotli
+except ImportError:  # brotli is optional, responses are gzip compressed without it
+    brotli = None
+
+# Bodies smaller than this aren't worth compressing
+MIN_COMPRESS_SIZE = 1024
+# Streamed output is flushed to the client once this many uncompressed bytes were added, so rows keep flowing
+STREAM_FLUSH_SIZE = 64 * 1024
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+
+def get_supported_encodings():
+    return ('br', 'gzip') if brotli is not None else ('gzip',)
+
+
+def choose_encoding(accept_encodings):
+    """The best encoding both the client and this server support, honouring the client's q-values.
+    :param accept_encodings: The request's parsed Accept-Encoding header (werkzeug's request.accept_encodings).
+    :return: 'br', 'gzip' or None.
+    """
+    return accept_encodings.best_match(get_supported_encodings())
+
+
+class Compressor:
+    """Incremental gzip or brotli compressor with the same interface for both."""
+
+    def __init__(self, encoding):
+        if encoding == 'br':
+            self.compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+            self.compress_chunk = self.compressor.process
+        else:
+            # wbits=31 writes the gzip header and trailer
+            self.compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+            self.compress_chunk = self.compressor.compress
+        self.encoding = encoding
+
+    def compress(self, data):
+        return self.compress_chunk(data)
+
+    def flush(self):
+        # Emit everything compressed so far without ending the stream
+        if self.encoding == 'br':
+            return self.compressor.flush()
+        return self.compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        if self.encoding == 'br':
+            return self.compressor.finish()
+        return self.compressor.flush()
+
+
+def compress_body(data, encoding):
+    compressor = Compressor(encoding)
+    return compressor.compress(data) + compressor.finish()
+
+
+def compress_chunks(chunks, encoding):
+    """Compress an iterable of str or bytes chunks as they are produced, e.g. rows streamed from a cursor."""
+    compressor = Compressor(encoding)
+    pending = 0
+    try:
+        for chunk in chunks:
+            data = chunk.encode() if isinstance(chunk, str) else chunk
+            output = compressor.compress(data)
+            pending += len(data)
+            if pending >= STREAM_FLUSH_SIZE:
+                output += compressor.flush()
+                pending = 0
+            if output:
+                yield output
+        yield compressor.finish()
+    finally:
+        # Closing the stream early, e.g. when the client disconnects, also closes the source and its cursor
+        if hasattr(chunks, 'close'):
+            chunks.close()
@@ -0,0 +1,116 @@
+from .logger import Logger
+from urllib.request import pathname2url
+import re
+import sqlite3
+import threading
+
+log = Logger('__name__')
+
+# Default SQLite performance profile. WAL lets the web app keep reading while the hourly scrape writes, and the
+# busy timeout makes writers wait for a lock instead of failing with "database is locked".
+DEFAULT_SQLITE_SETTINGS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "mmap_size": 268435456,  # 256 MiB
+    "cache_size": -65536,  # negative values are KiB, so 64 MiB
+    "busy_timeout": 5000,  # milliseconds
+    "temp_store": "MEMORY"
+}
+PRAGMA_VALUE_REGEX = r'^-?\d+$|^[A-Za-z_]+$'
+# Idle connections kept open per pool, connections released beyond this are closed
+MAX_IDLE_CONNECTIONS = 8
+
+
+def connect(db_path, settings=None, **kwargs):
+    """Open a SQLite connection with the performance profile applied.
+    :param db_path: Path to the SQLite database file.
+    :param settings: Optional dict overriding DEFAULT_SQLITE_SETTINGS, usually config["sqlite"].
+    :param kwargs: Extra keyword arguments passed through to sqlite3.connect.
+    :return: The open sqlite3 connection.
+    """
+    connection = sqlite3.connect(db_path, **kwargs)
+    apply_settings(connection, settings)
+    return connection
+
+
+def connect_read_only(db_path, settings=None, **kwargs):
+    """Open a read-only SQLite connection (mode=ro URI) with the performance profile applied. Writes through it
+    fail with sqlite3.OperationalError.
+    """
+    # The journal mode is a property of the database file and can't be changed through a read-only connection
+    settings = {**(settings or {}), "journal_mode": None}
+    return connect(f"file:{pathname2url(db_path)}?mode=ro", settings, uri=True, **kwargs)
+
+
+def get_settings(settings=None):
+    """Merge user settings over the defaults, a value of None disables that pragma."""
+    merged = dict(DEFAULT_SQLITE_SETTINGS)
+    merged.update(settings or {})
+    return {name: value for name, value in merged.items() if value is not None}
+
+
+def apply_settings(connection, settings=None):
+    """Apply the pragmas of the performance profile to an open connection."""
+    for name, value in get_settings(settings).items():
+        if name not in DEFAULT_SQLITE_SETTINGS:
+            log.warning(f"Ignoring unknown SQLite setting: {name}")
+            continue
+        # Pragmas can't be bound as parameters, so only allow plain integers and keywords
+        if not re.match(PRAGMA_VALUE_REGEX, str(value)):
+            log.warning(f"Ignoring invalid value for SQLite setting {name}: {value}")
+            continue
+        connection.execute(f"PRAGMA {name} = {value}")
+
+
+class ConnectionPool:
+    """Pool of open connections to one SQLite database, so request handlers reuse connections instead of paying for
+    connect and pragma setup on every request. A connection is used by one thread at a time, between acquire() and
+    release(), but may move between threads.
+    """
+    pools = {}
+    pools_lock = threading.Lock()
+
+    def __init__(self, db_path, settings=None, read_only=False, max_idle=MAX_IDLE_CONNECTIONS):
+        self.db_path = db_path
+        self.settings = settings
+        self.read_only = read_only
+        self.max_idle = max_idle
+        self.idle = []
+        self.lock = threading.Lock()
+
+    @classmethod
+    def get_pool(cls, db_path, settings=None, read_only=False):
+        # Pools are shared by the whole process, one per database file and access mode
+        key = (db_path, read_only)
+        with cls.pools_lock:
+            if key not in cls.pools:
+                cls.pools[key] = cls(db_path, settings, read_only)
+            return cls.pools[key]
+
+    def acquire(self):
+        with self.lock:
+            if self.idle:
+                return self.idle.pop()
+        open_connection = connect_read_only if self.read_only else connect
+        return open_connection(self.db_path, self.settings, check_same_thread=False)
+
+    def release(self, connection):
+        # Roll back anything the request left uncommitted, so the next user starts from a clean connection
+        try:
+            if connection.in_transaction:
+                connection.rollback()
+        except sqlite3.Error as e:
+            log.warning(f"Discarding a pooled connection that failed to roll back: {e}")
+            connection.close()
+            return
+        with self.lock:
+            if len(self.idle) < self.max_idle:
+                self.idle.append(connection)
+                return
+        connection.close()
+
+    def close_all(self):
+        with self.lock:
+            idle, self.idle = self.idle, []
+        for connection in idle:
+            connection.close()
@@ -1,19 +1,51 @@
+from .cache import LRUCache
+from .db_connection import connect
+from .db_schema import (JOB_COLUMNS, SEARCH_COLUMNS, SEARCH_WEIGHTS, STATUS_COLUMNS, TEXT_COLUMNS, compress_text,
+                        decompress_text, ensure_schema, get_keys_table_name, get_search_table_name,
+                        get_texts_table_name, parse_posting_id)
 from .logger import Logger
-import pandas
+from datetime import date, datetime, timedelta, timezone
+from itertools import islice
 import sqlite3
 from sqlite3 import Error
 
 
 class DB_Manager:
+    """SQLite storage for the job tables. PG_Manager implements the same methods for PostgreSQL, use
+    storage.create_db_manager to get the backend set in the config."""
     log = Logger('__name__')
+    PLACEHOLDER = '?'
+    # Current UTC time in the updated_at format, milliseconds so changes within a second still move the marker
+    TIMESTAMP_SQL = "strftime('%Y-%m-%d %H:%M:%f', 'now')"
+    INSERT_CHUNK_SIZE = 500
+    LOOKUP_CHUNK_SIZE = 300
+    # Change markers by connection, reused while PRAGMA data_version shows no other connection has written since
+    change_markers = LRUCache(max_size=64)
+    # Orders query_jobs can sort by, ties are broken by the newest job first
+    JOB_SORTS = {
+        'newest': 'jobs.id DESC',
+        'posted': 'jobs.date DESC, jobs.id DESC',
+        'salary': 'jobs.max_salary DESC, jobs.id DESC',
+        'company': 'jobs.company, jobs.id DESC'
+    }
+    # Status facet values, "new" matches jobs not marked applied, interview or rejected
+    JOB_STATUS_FILTERS = ('new', 'applied', 'interview', 'rejected', 'hidden')
+    # Bounds of the max_salary facet ranges, and the posting date facet's "posted within days" counts
+    SALARY_FACET_BOUNDS = (50000, 100000, 150000, 200000)
+    DATE_FACET_DAYS = (1, 7, 30)
+    # Most company and location facet values returned, the ones with the most jobs first
+    FACET_VALUES_LIMIT = 20
 
-    def __init__(self):
-        self.connection = None
+    def __init__(self, connection=None, pool=None):
+        self.connection = connection
+        self.pool = pool
+        self.insert_statements = {}
+        self.checked_tables = set()
 
-    def create_connection(self, db_path):
-        # Create a database connection to a SQLite database
+    def create_connection(self, db_path, sqlite_settings=None):
+        # Create a database connection to a SQLite database, tuned with the shared performance profile
         try:
-            self.connection = sqlite3.connect(db_path)  # creates a SQL database in the 'data' directory
+            self.connection = connect(db_path, sqlite_settings)  # creates a SQL database in the 'data' directory
             self.log.info("Successfully connected to the database.")
         except Error as e:
             self.log.error(f"Error thrown while attempting to connect to database, error: {e}")
@@ -21,7 +53,11 @@ class DB_Manager:
         return self.connection
 
     def close(self):
-        if self.connection:
+        if self.connection and self.pool is not None:
+            # Pooled connections stay open for the next user
+            self.pool.release(self.connection)
+            self.connection = None
+        elif self.connection:
             try:
                 self.connection.close()
                 self.log.info("Database connection closed.")
@@ -29,69 +65,530 @@ class DB_Manager:
                 self.log.error(f"Error closing the database connection: {e}")
 
     def create_table(self, df, table_name):
-        ''''
-        # Create a new table with the data from the dataframe
-        df.to_sql(table_name, connection, if_exists='replace', index=False)
-        print (f"Created the {table_name} table and added {len(df)} records")
-        '''
-        # Create a new table with the data from the DataFrame
-        # Prepare data types mapping from pandas to SQLite
-        type_mapping = {
-            'int64': 'INTEGER',
-            'float64': 'REAL',
-            'datetime64[ns]': 'TIMESTAMP',
-            'object': 'TEXT',
-            'bool': 'INTEGER'
-        }
-
-        # Prepare a string with column names and their types
-        columns_with_types = ', '.join(
-            f'"{column}" {type_mapping[str(df.dtypes[column])]}'
-            for column in df.columns
-        )
-
-        # Prepare SQL query to create a new table
-        create_table_sql = f"""
-            CREATE TABLE IF NOT EXISTS "{table_name}" (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                {columns_with_types}
-            );
-        """
-
-        # Execute SQL query
+        # Create a new table with the explicit job schema and bulk insert the DataFrame records
+        self.ensure_schema(table_name)
+        added_records = self.insert_records(df, table_name)
+        self.log.info(f"Created the {table_name} table and added {added_records} records")
+
+    def update_table(self, df, table_name):
+        # Update the existing table with new records. Duplicates are rejected by the unique indexes, so only the
+        # incoming rows are touched instead of re-reading the whole table.
+        self.ensure_schema(table_name)
+        new_records = self.insert_records(df, table_name)
+
+        if new_records > 0:
+            self.log.info(f"Added {new_records} new records to the {table_name} table")
+        else:
+            self.log.info(f"No new records to add to the {table_name} table")
+
+    def ensure_schema(self, table_name):
+        # Create or migrate the table to the current schema version, once per connection
+        if table_name not in self.checked_tables:
+            ensure_schema(self.connection, table_name)
+            self.checked_tables.add(table_name)
+
+    def insert_records(self, records, table_name):
+        """
+        Bulk insert records into a job table, skipping duplicates.
+
+        Args:
+            records (DataFrame | list[dict]): The records to insert, either a DataFrame or a list of job dicts.
+            table_name (str): The name of the table to insert into.
+
+        Returns:
+            int: The number of records added, or 0 if the insert failed.
+        """
+        source_columns, source_rows = self.get_source_rows(records)
+        if not source_columns:
+            return 0
+
+        # Only insert schema columns, the id is always assigned by the database
+        positions = [i for i, column in enumerate(source_columns) if column in JOB_COLUMNS and column != 'id']
+        columns = tuple(source_columns[i] for i in positions)
+        url_position = source_columns.index('job_url') if 'job_url' in source_columns else None
+        add_posting_id = 'posting_id' not in columns and url_position is not None
+        if add_posting_id:
+            columns += ('posting_id',)
+        updated_at = () if 'updated_at' in columns else (self.get_timestamp(),)
+        columns += ('updated_at',) * len(updated_at)
+        # New rows are matched back to their source row through the unique job_url, to store their compressed text
+        # fields in the texts table and index them for full-text search
+        text_positions = [i for i, column in enumerate(source_columns) if column in TEXT_COLUMNS]
+        text_columns = tuple(source_columns[i] for i in text_positions)
+        description_position = source_columns.index('job_description') if 'job_description' in source_columns else None
+
+        insert_sql = self.get_insert_statement(table_name, columns)
+        texts_insert_sql = self.get_texts_insert_statement(table_name, text_columns) if text_columns else None
+        search_insert_sql = self.get_search_insert_statement(table_name)
+        added_records = 0
+        try:
+            # Stream the rows into executemany in chunks, all inside one transaction
+            while chunk := list(islice(source_rows, self.INSERT_CHUNK_SIZE)):
+                job_rows = [tuple(row[i] for i in positions) + ((parse_posting_id(row[url_position]),)
+                                                                if add_posting_id else ()) + updated_at
+                            for row in chunk]
+                last_id = self.connection.execute(f'SELECT max(id) FROM "{table_name}"').fetchone()[0] or 0
+                changes_before = self.connection.total_changes
+                self.connection.executemany(insert_sql, job_rows)
+                added_records += self.connection.total_changes - changes_before
+                if url_position is None:
+                    continue
+                new_ids = dict(self.connection.execute(
+                    f'SELECT job_url, id FROM "{table_name}" WHERE id > ?', (last_id,)).fetchall())
+                # Only the first source row of a job_url was inserted, later rows with the same url were ignored, so
+                # each new id is paired once, as PG_Manager does with DISTINCT ON
+                new_rows = [(new_ids.pop(row[url_position]), row) for row in chunk if row[url_position] in new_ids]
+                if texts_insert_sql:
+                    self.connection.executemany(texts_insert_sql, (
+                        (job_id, *(compress_text(row[i]) for i in text_positions)) for job_id, row in new_rows))
+                self.connection.executemany(search_insert_sql, (
+                    (row[description_position] if description_position is not None else None, job_id)
+                    for job_id, row in new_rows))
+            self.connection.commit()
+        except sqlite3.Error as e:
+            self.connection.rollback()
+            self.log.error(f"Error adding records to the {table_name} table, error: {e}")
+            return 0
+        return added_records
+
+    @staticmethod
+    def get_timestamp():
+        # Python equivalent of TIMESTAMP_SQL
+        return datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S.%f')[:-3]
+
+    @staticmethod
+    def get_source_rows(records):
+        # Column names and a row tuple iterator for a DataFrame or a list of job dicts. DataFrames are recognized by
+        # their itertuples, so pandas isn't imported by code that only reads jobs, such as the web app.
+        if hasattr(records, 'itertuples'):
+            return list(records.columns), records.itertuples(index=False, name=None)
+        records = list(records)
+        # Every key found in any record, as jobs whose description couldn't be fetched lack some fields
+        source_columns = list(dict.fromkeys(column for record in records for column in record))
+        return source_columns, (tuple(record.get(column) for column in source_columns) for record in records)
+
+    def get_insert_statement(self, table_name, columns):
+        # Build each insert statement once so sqlite3 reuses the same prepared statement across chunks and runs
+        key = (table_name, columns)
+        if key not in self.insert_statements:
+            self.insert_statements[key] = (
+                f'INSERT OR IGNORE INTO "{table_name}" ({", ".join(f'"{column}"' for column in columns)}) '
+                f'VALUES ({", ".join("?" for _ in columns)})')
+        return self.insert_statements[key]
+
+    def get_texts_insert_statement(self, table_name, text_columns):
+        key = (get_texts_table_name(table_name), text_columns)
+        if key not in self.insert_statements:
+            self.insert_statements[key] = (
+                f'INSERT OR REPLACE INTO "{key[0]}" (job_id, {", ".join(f'"{column}"' for column in text_columns)}) '
+                f'VALUES (?, {", ".join("?" for _ in text_columns)})')
+        return self.insert_statements[key]
+
+    def get_search_insert_statement(self, table_name):
+        # Index a new job for full-text search, the description is bound separately as it isn't in the job table
+        key = (get_search_table_name(table_name), SEARCH_COLUMNS)
+        if key not in self.insert_statements:
+            self.insert_statements[key] = (
+                f'INSERT INTO "{key[0]}" (rowid, {", ".join(SEARCH_COLUMNS)}) '
+                f'SELECT id, title, company, location, ? FROM "{table_name}" WHERE id = ?')
+        return self.insert_statements[key]
+
+    def get_job(self, table_name, job_id, text_fields=TEXT_COLUMNS):
+        """
+        Get a single job by id, along with the requested text fields.
+
+        Args:
+            table_name (str): The name of the job table.
+            job_id (int): The id of the job.
+            text_fields (tuple): The text fields to fetch and decompress from the texts table.
+
+        Returns:
+            dict: The job, or None if no job has that id.
+        """
+        cursor = self.execute(f'SELECT * FROM "{table_name}" WHERE id = {self.PLACEHOLDER}', (job_id,))
+        jobs = self.fetch_dicts(cursor)
+        if not jobs:
+            return None
+        job = jobs[0]
+        if text_fields:
+            job.update(self.get_job_texts(table_name, job_id, text_fields))
+        return job
+
+    def get_job_texts(self, table_name, job_id, fields=TEXT_COLUMNS):
+        # Fetch and decompress text fields of a job, missing texts are returned as None
+        fields = [field for field in fields if field in TEXT_COLUMNS]
+        row = self.execute(
+            f'SELECT {", ".join(fields)} FROM "{get_texts_table_name(table_name)}" WHERE job_id = {self.PLACEHOLDER}',
+            (job_id,)).fetchone()
+        return {field: decompress_text(row[i]) if row else None for i, field in enumerate(fields)}
+
+    def list_jobs(self, table_name, include_hidden=False, fields=None, before_id=None, limit=None, loaded_at=None,
+                  after_id=None):
+        """
+        List jobs newest first, optionally one keyset page at a time.
+
+        Args:
+            table_name (str): The name of the job table.
+            include_hidden (bool): Whether to include hidden jobs.
+            fields (list[str]): The job columns and text fields to return, id is always included. Defaults to every
+                job column without the text fields.
+            before_id (int): Only return jobs with a lower id, i.e. the last id of the previous page.
+            limit (int): The maximum number of jobs to return, all of them if None.
+            loaded_at (str): Only return jobs with this date_loaded, i.e. the jobs added by one scraper run.
+            after_id (int): Only return jobs with a higher id, i.e. the jobs added since a client last looked.
+
+        Returns:
+            list[dict]: The jobs.
+        """
+        sql, params, text_fields = self.get_list_query(table_name, include_hidden, fields, before_id, limit, loaded_at,
+                                                       after_id)
+        jobs = self.fetch_dicts(self.execute(sql, params))
+        for job in jobs:
+            for field in text_fields:
+                job[field] = decompress_text(job[field])
+        return jobs
+
+    def iter_jobs(self, table_name, include_hidden=False, fields=None, batch_size=500):
+        """
+        Iterate over all jobs newest first, fetching batch_size rows at a time, so memory use doesn't grow with the
+        table. Takes the same filters as list_jobs.
+
+        Args:
+            table_name (str): The name of the job table.
+            include_hidden (bool): Whether to include hidden jobs.
+            fields (list[str]): The job columns and text fields to return, id is always included.
+            batch_size (int): Rows fetched from the cursor at a time.
+
+        Yields:
+            dict: The jobs.
+        """
+        sql, params, text_fields = self.get_list_query(table_name, include_hidden, fields)
+        cursor = self.open_stream_cursor(sql, params)
+        try:
+            rows = cursor.fetchmany(batch_size)
+            # A server-side cursor only has a description after the first fetch
+            column_names = [column[0] for column in cursor.description] if rows else []
+            while rows:
+                for job in self.to_dicts(column_names, rows):
+                    for field in text_fields:
+                        job[field] = decompress_text(job[field])
+                    yield job
+                rows = cursor.fetchmany(batch_size)
+        finally:
+            cursor.close()
+
+    def get_list_query(self, table_name, include_hidden=False, fields=None, before_id=None, limit=None,
+                       loaded_at=None, after_id=None):
+        # The SELECT of list_jobs and iter_jobs with its parameters, and the text fields to decompress
+        select, from_sql, text_fields = self.get_select(table_name, fields)
+        conditions, params = [], []
+        if not include_hidden:
+            conditions.append('jobs.hidden = 0')
+        if before_id is not None:
+            conditions.append(f'jobs.id < {self.PLACEHOLDER}')
+            params.append(before_id)
+        if loaded_at is not None:
+            conditions.append(f'jobs.date_loaded = {self.PLACEHOLDER}')
+            params.append(loaded_at)
+        if after_id is not None:
+            conditions.append(f'jobs.id > {self.PLACEHOLDER}')
+            params.append(after_id)
+        where = f'WHERE {" AND ".join(conditions)} ' if conditions else ''
+        limit_sql = ''
+        if limit is not None:
+            limit_sql = f' LIMIT {self.PLACEHOLDER}'
+            params.append(limit)
+        return f'SELECT {select} FROM {from_sql} {where}ORDER BY jobs.id DESC{limit_sql}', params, text_fields
+
+    def get_select(self, table_name, fields=None):
+        # Select list and FROM clause returning the requested fields, joining the texts table only when needed
+        job_fields, text_fields = self.get_list_fields(fields)
+        select = ', '.join([f'jobs."{field}"' for field in job_fields] + [f'texts."{field}"' for field in text_fields])
+        from_sql = f'"{table_name}" AS jobs'
+        if text_fields:
+            from_sql += f' LEFT JOIN "{get_texts_table_name(table_name)}" AS texts ON texts.job_id = jobs.id'
+        return select, from_sql, text_fields
+
+    @staticmethod
+    def get_list_fields(fields):
+        # Split the requested fields into job columns and text fields, rejecting unknown names
+        if not fields:
+            return list(JOB_COLUMNS), []
+        unknown = [field for field in fields if field not in JOB_COLUMNS and field not in TEXT_COLUMNS]
+        if unknown:
+            raise ValueError(f"Unknown job fields: {', '.join(unknown)}")
+        job_fields = ['id'] + [field for field in JOB_COLUMNS if field in fields and field != 'id']
+        return job_fields, [field for field in TEXT_COLUMNS if field in fields]
+
+    def set_job_status(self, table_name, job_id, status, value=1):
+        # Set one of the applied, hidden, interview or rejected flags of a job
+        return self.set_job_statuses(table_name, [(job_id, status, value)]) > 0
+
+    def set_job_statuses(self, table_name, changes):
+        """
+        Set or clear the status flags of many jobs in a single transaction.
+
+        Args:
+            table_name (str): The name of the job table.
+            changes (list[tuple]): (job_id, status, value) tuples, status is one of applied, hidden, interview or
+                rejected and a false value clears the flag. A later change to the same job and status wins.
+
+        Returns:
+            int: The number of changes that matched a job.
+        """
+        flags = {}
+        for job_id, status, value in changes:
+            if status not in STATUS_COLUMNS:
+                raise ValueError(f"Unknown job status: {status}")
+            flags[(int(job_id), status)] = int(bool(value))
+        # One UPDATE per status and value, for up to LOOKUP_CHUNK_SIZE jobs at a time
+        groups = {}
+        for (job_id, status), value in flags.items():
+            groups.setdefault((status, value), []).append(job_id)
+        updated = 0
+        try:
+            for (status, value), job_ids in groups.items():
+                for i in range(0, len(job_ids), self.LOOKUP_CHUNK_SIZE):
+                    chunk = job_ids[i:i + self.LOOKUP_CHUNK_SIZE]
+                    cursor = self.execute(
+                        f'UPDATE "{table_name}" SET {status} = {self.PLACEHOLDER}, '
+                        f'updated_at = {self.TIMESTAMP_SQL} '
+                        f'WHERE id IN ({", ".join([self.PLACEHOLDER] * len(chunk))})', [value] + chunk)
+                    updated += cursor.rowcount
+            self.connection.commit()
+        except Exception:
+            self.connection.rollback()
+            raise
+        return updated
+
+    def get_change_marker(self, table_name):
+        """
+        Get a marker that changes whenever jobs are added to, changed in or removed from a table.
+
+        Args:
+            table_name (str): The name of the job table.
+
+        Returns:
+            tuple: The highest id, the number of jobs and the latest updated_at (None if no job has one).
+        """
+        # data_version only changes when another connection commits, and total_changes counts this connection's
+        # own writes, so while both are unchanged the marker computed last time on this connection still holds
+        versions = (self.connection.execute('PRAGMA data_version').fetchone()[0], self.connection.total_changes)
+        key = (id(self.connection), table_name)
+        cached = self.change_markers.get(key)
+        if cached is not None and cached[0] is self.connection and cached[1] == versions:
+            return cached[2]
+        marker = self.query_change_marker(table_name)
+        self.change_markers.set(key, (self.connection, versions, marker))
+        return marker
+
+    def query_change_marker(self, table_name):
+        # Separate subqueries, so each max() is answered from the primary key or the updated_at index
+        max_id, count, updated_at = self.execute(
+            f'SELECT (SELECT max(id) FROM "{table_name}"), (SELECT count(*) FROM "{table_name}"), '
+            f'(SELECT max(updated_at) FROM "{table_name}")').fetchone()
+        return max_id, count, str(updated_at) if updated_at is not None else None
+
+    def execute(self, sql, params=()):
+        # Run a statement on a new cursor, shared by both backends as their connections differ
         cursor = self.connection.cursor()
-        cursor.execute(create_table_sql)
+        cursor.execute(sql, params)
+        return cursor
 
-        # Commit the transaction
-        self.connection.commit()
+    def fetch_dicts(self, cursor):
+        # Fetch all rows of a cursor as dicts keyed by column name
+        return self.to_dicts([column[0] for column in cursor.description], cursor.fetchall())
+
+    def to_dicts(self, column_names, rows):
+        return [dict(zip(column_names, row)) for row in rows]
 
-        # Insert DataFrame records one by one
-        insert_sql = f"""
-            INSERT INTO "{table_name}" ({', '.join(f'"{column}"' for column in df.columns)})
-            VALUES ({', '.join(['?' for _ in df.columns])})
+    def open_stream_cursor(self, sql, params=()):
+        # A cursor to fetch a large result from in batches, SQLite steps through the rows as they are fetched
+        return self.execute(sql, params)
+
+    def search_jobs(self, table_name, query, limit=25, offset=0, include_hidden=False):
         """
-        for record in df.to_dict(orient='records'):
-            cursor.execute(insert_sql, list(record.values()))
+        Full-text search the jobs, best matches first.
 
-        # Commit the transaction
-        self.connection.commit()
+        Args:
+            table_name (str): The name of the job table.
+            query (str): Plain search text, every word must match the title, company, location or description.
+            limit (int): Page size.
+            offset (int): Number of matches to skip.
+            include_hidden (bool): Whether to include hidden jobs.
 
-        self.log.info(f"Created the {table_name} table and added {len(df)} records")
+        Returns:
+            tuple: The total number of matches, and the page of matching jobs (without their text fields).
+        """
+        match = self.to_search_query(query)
+        if not match:
+            return 0, []
+        search_table = get_search_table_name(table_name)
+        where = f'"{search_table}" MATCH ?' + ('' if include_hidden else ' AND jobs.hidden = 0')
+        # CROSS JOIN keeps the full-text index as the outer loop, otherwise SQLite may scan every job instead
+        from_sql = f'FROM "{search_table}" CROSS JOIN "{table_name}" AS jobs ON jobs.id = "{search_table}".rowid'
+        total = self.connection.execute(f'SELECT count(*) {from_sql} WHERE {where}', (match,)).fetchone()[0]
+        cursor = self.connection.execute(
+            f'SELECT jobs.*, bm25("{search_table}", {", ".join(map(str, SEARCH_WEIGHTS))}) AS rank {from_sql} '
+            f'WHERE {where} ORDER BY rank, jobs.id DESC LIMIT ? OFFSET ?', (match, limit, offset))
+        return total, self.fetch_dicts(cursor)
 
-    def update_table(self, df, table_name):
-        # Update the existing table with new records.
-        df_existing = pandas.read_sql(f'select * from {table_name}', self.connection)
+    def query_jobs(self, table_name, filters=None, sort='newest', limit=50, offset=0, fields=None,
+                   include_hidden=False):
+        """
+        Filter and sort the jobs by facet selections, and count the jobs of every facet value. Values selected within
+        a facet match jobs with any of them, and the facets are combined with AND. Each facet's counts apply the
+        selections of the other facets but not its own, so they show how many jobs selecting a value would add.
 
-        # Create a dataframe with unique records in df that are not in df_existing
-        df_new_records = (pandas.concat([df, df_existing, df_existing])
-                          .drop_duplicates(['title', 'company', 'date'], keep=False))
+        Args:
+            table_name (str): The name of the job table.
+            filters (dict): Facet selections, all optional:
+                status (list[str]): Values of JOB_STATUS_FILTERS. Selecting hidden includes hidden jobs.
+                company, location (list[str]): Exact values.
+                salary_min, salary_max (int): Bounds the posted salary range has to overlap. Jobs without a salary
+                    are left out when either is set.
+                date_from, date_to (str): Posting date range as YYYY-MM-DD, inclusive.
+            sort (str): One of JOB_SORTS.
+            limit (int): Page size.
+            offset (int): Number of matching jobs to skip.
+            fields (list[str]): The job columns and text fields to return, as for list_jobs.
+            include_hidden (bool): Whether to include hidden jobs.
 
-        # If there are new records, append them to the existing table
-        if len(df_new_records) > 0:
-            df_new_records.to_sql(table_name, self.connection, if_exists='append', index=False)
-            self.log.info(f"Added {len(df_new_records)} new records to the {table_name} table")
-        else:
-            self.log.info(f"No new records to add to the {table_name} table")
+        Returns:
+            tuple: The total number of matching jobs, the page of jobs, and the facet counts: status (count by
+                status), company and location (lists of value and count), salary (counts by max_salary range) and
+                date (counts of jobs posted within the last DATE_FACET_DAYS days).
+        """
+        if sort not in self.JOB_SORTS:
+            raise ValueError(f"Unknown sort: {sort}")
+        filters = filters or {}
+        conditions = self.get_facet_conditions(filters)
+        if not include_hidden and 'hidden' not in (filters.get('status') or []):
+            conditions['hidden'] = ('jobs.hidden = 0', [])
+
+        select, from_sql, text_fields = self.get_select(table_name, fields)
+        where, params = self.get_where(conditions)
+        total = self.execute(f'SELECT count(*) FROM "{table_name}" AS jobs {where}', params).fetchone()[0]
+        jobs = self.fetch_dicts(self.execute(
+            f'SELECT {select} FROM {from_sql} {where}ORDER BY {self.JOB_SORTS[sort]} '
+            f'LIMIT {self.PLACEHOLDER} OFFSET {self.PLACEHOLDER}', params + [limit, offset]))
+        for job in jobs:
+            for field in text_fields:
+                job[field] = decompress_text(job[field])
+        return total, jobs, self.get_facet_counts(table_name, conditions, include_hidden)
+
+    def get_facet_conditions(self, filters):
+        # The SQL condition and parameters of each facet's selection, keyed by facet
+        placeholder = self.PLACEHOLDER
+        conditions = {}
+        statuses = list(filters.get('status') or [])
+        unknown = [status for status in statuses if status not in self.JOB_STATUS_FILTERS]
+        if unknown:
+            raise ValueError(f"Unknown job statuses: {', '.join(unknown)}")
+        if statuses:
+            status_sql = [self.get_status_condition(status) for status in statuses]
+            conditions['status'] = (f'({" OR ".join(status_sql)})', [])
+        for facet in ('company', 'location'):
+            values = list(filters.get(facet) or [])
+            if values:
+                conditions[facet] = (f'jobs.{facet} IN ({", ".join([placeholder] * len(values))})', values)
+        salary_sql, salary_params = [], []
+        if filters.get('salary_min') is not None:
+            salary_sql.append(f'jobs.max_salary >= {placeholder}')
+            salary_params.append(int(filters['salary_min']))
+        if filters.get('salary_max') is not None:
+            salary_sql.append(f'jobs.max_salary > 0 AND jobs.min_salary <= {placeholder}')
+            salary_params.append(int(filters['salary_max']))
+        if salary_sql:
+            conditions['salary'] = (' AND '.join(salary_sql), salary_params)
+        date_sql, date_params = [], []
+        if filters.get('date_from'):
+            date_sql.append(f'jobs.date >= {placeholder}')
+            date_params.append(filters['date_from'])
+        if filters.get('date_to'):
+            date_sql.append(f'jobs.date <= {placeholder}')
+            date_params.append(filters['date_to'])
+        if date_sql:
+            conditions['date'] = (' AND '.join(date_sql), date_params)
+        return conditions
+
+    @staticmethod
+    def get_status_condition(status):
+        if status == 'new':
+            return '(jobs.applied = 0 AND jobs.interview = 0 AND jobs.rejected = 0)'
+        return f'jobs.{status} = 1'
+
+    @staticmethod
+    def get_where(conditions, exclude=None):
+        # WHERE clause combining the facet conditions, leaving out one facet's own selection for its counts
+        selected = [condition for facet, condition in conditions.items() if facet != exclude]
+        if not selected:
+            return '', []
+        return (f'WHERE {" AND ".join(sql for sql, _ in selected)} ',
+                [param for _, params in selected for param in params])
+
+    def get_facet_counts(self, table_name, conditions, include_hidden):
+        placeholder = self.PLACEHOLDER
+        facets = {}
+        # Hidden jobs only count towards the hidden status, unless they are included anyway
+        status_conditions = {facet: condition for facet, condition in conditions.items() if facet != 'hidden'}
+        visible = '' if include_hidden else 'jobs.hidden = 0 AND '
+        where, params = self.get_where(status_conditions, exclude='status')
+        counts = self.execute(
+            'SELECT ' + ', '.join(
+                f'SUM(CASE WHEN {visible if status != "hidden" else ""}{self.get_status_condition(status)} '
+                f'THEN 1 ELSE 0 END)' for status in self.JOB_STATUS_FILTERS) +
+            f' FROM "{table_name}" AS jobs {where}', params).fetchone()
+        facets['status'] = {status: int(count or 0) for status, count in zip(self.JOB_STATUS_FILTERS, counts)}
+
+        for facet in ('company', 'location'):
+            where, params = self.get_where(conditions, exclude=facet)
+            cursor = self.execute(
+                f'SELECT jobs.{facet}, count(*) FROM "{table_name}" AS jobs {where}GROUP BY jobs.{facet} '
+                f'ORDER BY count(*) DESC, jobs.{facet} LIMIT {placeholder}', params + [self.FACET_VALUES_LIMIT])
+            facets[facet] = [{"value": value, "count": count} for value, count in cursor.fetchall()]
+
+        # Salary ranges by max_salary, 0 is a job without a posted salary
+        bounds = (0, 1) + self.SALARY_FACET_BOUNDS
+        ranges = [(low, high) for low, high in zip(bounds, bounds[1:])] + [(bounds[-1], None)]
+        where, params = self.get_where(conditions, exclude='salary')
+        range_sql, range_params = [], []
+        for low, high in ranges:
+            range_sql.append(f'SUM(CASE WHEN jobs.max_salary >= {placeholder}' +
+                             (f' AND jobs.max_salary < {placeholder}' if high is not None else '') +
+                             ' THEN 1 ELSE 0 END)')
+            range_params += [low] if high is None else [low, high]
+        counts = self.execute(f'SELECT {", ".join(range_sql)} FROM "{table_name}" AS jobs {where}',
+                              range_params + params).fetchone()
+        facets['salary'] = [{"min": low, "max": high, "count": int(count or 0)}
+                            for (low, high), count in zip(ranges, counts)]
+
+        # Jobs posted within the last days, counted from today
+        where, params = self.get_where(conditions, exclude='date')
+        since = [(date.today() - timedelta(days=days)).isoformat() for days in self.DATE_FACET_DAYS]
+        counts = self.execute(
+            'SELECT ' + ', '.join(f'SUM(CASE WHEN jobs.date >= {placeholder} THEN 1 ELSE 0 END)' for _ in since) +
+            f' FROM "{table_name}" AS jobs {where}', since + params).fetchone()
+        facets['date'] = [{"days": days, "since": day, "count": int(count or 0)}
+                          for days, day, count in zip(self.DATE_FACET_DAYS, since, counts)]
+        return facets
+
+    @staticmethod
+    def to_search_query(text):
+        # Quote every word so user input is never parsed as FTS5 query syntax
+        return ' '.join('"' + word.replace('"', '""') + '"' for word in (text or '').split())
+
+    def set_job_text(self, table_name, job_id, field, text):
+        # Store a compressed text field for a job, such as a generated cover letter or resume
+        if field not in TEXT_COLUMNS:
+            raise ValueError(f"Unknown text field: {field}")
+        self.execute(
+            f'INSERT INTO "{get_texts_table_name(table_name)}" (job_id, {field}) '
+            f'VALUES ({self.PLACEHOLDER}, {self.PLACEHOLDER}) '
+            f'ON CONFLICT (job_id) DO UPDATE SET {field} = excluded.{field}', (job_id, compress_text(text)))
+        self.execute(f'UPDATE "{table_name}" SET updated_at = {self.TIMESTAMP_SQL} WHERE id = {self.PLACEHOLDER}',
+                     (job_id,))
+        self.connection.commit()
 
     def table_exists(self, table_name):
         # Check if the table already exists in the database
@@ -103,26 +600,57 @@ class DB_Manager:
 
     def find_new_jobs(self, all_jobs, config):
         # From all_jobs, find the jobs that are not already in the database. Function checks both the jobs and
-        # filtered_jobs tables.
-        jobs_tablename = config['jobs_tablename']
-        filtered_jobs_tablename = config['filtered_jobs_tablename']
-        jobs_db = pandas.DataFrame()
-        filtered_jobs_db = pandas.DataFrame()
+        # filtered_jobs tables, looking up only the candidate jobs' keys through the unique indexes.
+        existing_keys = []
         if self.connection is not None:
-            if self.table_exists(jobs_tablename):
-                query = f"SELECT * FROM {jobs_tablename}"
-                jobs_db = pandas.read_sql_query(query, self.connection)
-            if self.table_exists(filtered_jobs_tablename):
-                query = f"SELECT * FROM {filtered_jobs_tablename}"
-                filtered_jobs_db = pandas.read_sql_query(query, self.connection)
-
-        new_joblist = [job for job in all_jobs if not self.job_exists(jobs_db, job)
-                       and not self.job_exists(filtered_jobs_db, job)]
+            for table_name in (config['jobs_tablename'], config['filtered_jobs_tablename']):
+                if self.table_exists(table_name):
+                    self.ensure_schema(table_name)
+                    existing_keys.append(self.find_existing_keys(all_jobs, table_name))
+                # Jobs moved to the archive database by retention leave their dedupe keys behind
+                if self.table_exists(get_keys_table_name(table_name)):
+                    existing_keys.append(self.find_existing_keys(all_jobs, get_keys_table_name(table_name)))
+
+        new_joblist = [job for job in all_jobs if not any(self.job_exists(keys, job) for keys in existing_keys)]
         return new_joblist
 
-    def job_exists(self, df, job):
-        # Check if the job already exists in the dataframe
-        if df.empty:
-            return False
-        return bool((df['job_url'] == job['job_url']).any() | (
-            ((df['title'] == job['title']) & (df['company'] == job['company']) & (df['date'] == job['date'])).any()))
+    def find_existing_keys(self, jobs, table_name):
+        """
+        Find which of the given jobs' dedupe keys are already stored in a table.
+
+        Args:
+            jobs (list[dict]): The candidate jobs.
+            table_name (str): The name of the job table to check.
+
+        Returns:
+            tuple: Sets of the existing posting ids, job urls and (title, company, date) keys.
+        """
+        posting_ids, job_urls, title_company_dates = set(), set(), set()
+        cursor = self.connection.cursor()
+        for i in range(0, len(jobs), self.LOOKUP_CHUNK_SIZE):
+            chunk = jobs[i:i + self.LOOKUP_CHUNK_SIZE]
+            chunk_ids = [posting_id for posting_id in (self.get_posting_id(job) for job in chunk) if posting_id]
+            if chunk_ids:
+                cursor.execute(f'SELECT posting_id FROM "{table_name}" WHERE posting_id IN '
+                               f'({", ".join("?" for _ in chunk_ids)})', chunk_ids)
+                posting_ids.update(row[0] for row in cursor.fetchall())
+            chunk_urls = [job['job_url'] for job in chunk if job.get('job_url')]
+            if chunk_urls:
+                cursor.execute(f'SELECT job_url FROM "{table_name}" WHERE job_url IN '
+                               f'({", ".join("?" for _ in chunk_urls)})', chunk_urls)
+                job_urls.update(row[0] for row in cursor.fetchall())
+            cursor.execute(f'SELECT title, company, date FROM "{table_name}" WHERE (title, company, date) IN '
+                           f'(VALUES {", ".join("(?, ?, ?)" for _ in chunk)})',
+                           [value for job in chunk for value in (job['title'], job['company'], job['date'])])
+            title_company_dates.update(cursor.fetchall())
+        return posting_ids, job_urls, title_company_dates
+
+    def job_exists(self, existing_keys, job):
+        # Check if the job matches any of the existing keys found by find_existing_keys
+        posting_ids, job_urls, title_company_dates = existing_keys
+        return (self.get_posting_id(job) in posting_ids or job.get('job_url') in job_urls
+                or (job['title'], job['company'], job['date']) in title_company_dates)
+
+    @staticmethod
+    def get_posting_id(job):
+        return job.get('posting_id') or parse_posting_id(job.get('job_url'))
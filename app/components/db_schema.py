@@ -0,0 +1,274 @@
+from .logger import Logger
+import re
+import sqlite3
+import zlib
+
+log = Logger('__name__')
+
+# Bump SCHEMA_VERSION and append a migration to MIGRATIONS whenever the job table schema changes. Each table's
+# version is tracked in the schema_versions table, so the jobs and filtered_jobs tables migrate independently.
+SCHEMA_VERSION = 5
+POSTING_ID_REGEX = r'/jobs/view/(?:[^/]*-)?(\d+)'
+COMPRESSION_LEVEL = 6
+
+# Version 1 job table schema, in insert order. Kept as-is so migrate_v1 always produces the same table.
+JOB_COLUMNS_V1 = {
+    'id': 'INTEGER PRIMARY KEY AUTOINCREMENT',
+    'posting_id': 'INTEGER',
+    'title': 'TEXT NOT NULL',
+    'company': "TEXT NOT NULL DEFAULT ''",
+    'location': "TEXT NOT NULL DEFAULT ''",
+    'date': 'DATE',
+    'job_url': 'TEXT',
+    'job_description': 'TEXT',
+    'applied': 'INTEGER NOT NULL DEFAULT 0 CHECK (applied IN (0, 1))',
+    'hidden': 'INTEGER NOT NULL DEFAULT 0 CHECK (hidden IN (0, 1))',
+    'interview': 'INTEGER NOT NULL DEFAULT 0 CHECK (interview IN (0, 1))',
+    'rejected': 'INTEGER NOT NULL DEFAULT 0 CHECK (rejected IN (0, 1))',
+    'min_salary': 'INTEGER NOT NULL DEFAULT 0',
+    'max_salary': 'INTEGER NOT NULL DEFAULT 0',
+    'date_loaded': 'TIMESTAMP',
+    'cover_letter': 'TEXT',
+    'resume': 'TEXT'
+}
+
+# Large text fields live zlib-compressed in a side table ("<table>_texts", one row per job), so list queries on the
+# hot job table never read them. They are only fetched, and decompressed, when a single job's details are needed.
+TEXT_COLUMNS = ('job_description', 'cover_letter', 'resume')
+JOB_COLUMNS = {column: column_type for column, column_type in JOB_COLUMNS_V1.items() if column not in TEXT_COLUMNS}
+# Set whenever a job is inserted or its status or documents change, in UTC with millisecond precision. The web
+# interface derives its ETag and Last-Modified headers from it.
+JOB_COLUMNS['updated_at'] = 'TIMESTAMP'
+
+# Full-text search index ("<table>_search"). It is contentless, storing only the index keyed by job id, since the
+# texts are already stored compressed. Rank weights favour matches in the title, then company, location and description.
+SEARCH_COLUMNS = ('title', 'company', 'location', 'job_description')
+SEARCH_WEIGHTS = (10.0, 5.0, 2.0, 1.0)
+
+# Indexes backing the scraper's dedupe lookups and the web interface's list queries: (name suffix, unique, columns)
+JOB_INDEXES = [
+    ('posting_id', True, 'posting_id'),
+    ('job_url', True, 'job_url'),
+    ('title_company_date', True, 'title, company, date'),
+    ('hidden_id', False, 'hidden, id'),
+    # Facet filters and counts of query_jobs, every facet query also filters on hidden
+    ('hidden_company', False, 'hidden, company'),
+    ('hidden_location', False, 'hidden, location'),
+    ('hidden_date', False, 'hidden, date'),
+    ('hidden_max_salary', False, 'hidden, max_salary')
+]
+
+# Dedupe keys of the jobs moved to the archive database ("<table>_keys"), so the scraper never re-fetches them
+KEY_COLUMNS = ('posting_id', 'job_url', 'title', 'company', 'date')
+
+STATUS_COLUMNS = ('applied', 'hidden', 'interview', 'rejected')
+SALARY_COLUMNS = ('min_salary', 'max_salary')
+
+
+def get_texts_table_name(table_name):
+    return f'{table_name}_texts'
+
+
+def get_search_table_name(table_name):
+    return f'{table_name}_search'
+
+
+def get_keys_table_name(table_name):
+    return f'{table_name}_keys'
+
+
+def compress_text(text):
+    """Compress a text field for storage, None stays None."""
+    return zlib.compress(text.encode('utf-8'), COMPRESSION_LEVEL) if text is not None else None
+
+
+def decompress_text(data):
+    """Decompress a stored text field, None stays None."""
+    return zlib.decompress(data).decode('utf-8') if data is not None else None
+
+
+def parse_posting_id(job_url):
+    """Extract the integer LinkedIn posting id from a job url, or None if it has none."""
+    match = re.search(POSTING_ID_REGEX, job_url or '')
+    return int(match.group(1)) if match else None
+
+
+def ensure_schema(connection, table_name):
+    """Create the job table at the current schema version, or migrate it in place if it is older.
+    :param connection: Open sqlite3 connection.
+    :param table_name: Name of the job table to check.
+    :return: The schema version the table was at before this call.
+    """
+    connection.execute("CREATE TABLE IF NOT EXISTS schema_versions (table_name TEXT PRIMARY KEY, version INTEGER)")
+    version = get_version(connection, table_name)
+    if version == SCHEMA_VERSION:
+        return version
+
+    # A savepoint rather than BEGIN, so the migration also works inside a caller's open transaction
+    connection.execute("SAVEPOINT ensure_schema")
+    existed = table_exists(connection, table_name)
+    try:
+        if not existed:
+            create_job_table(connection, table_name)
+            log.info(f"Created the {table_name} table at schema version {SCHEMA_VERSION}")
+        else:
+            for target_version in range(version + 1, SCHEMA_VERSION + 1):
+                MIGRATIONS[target_version](connection, table_name)
+                log.info(f"Migrated the {table_name} table to schema version {target_version}")
+        connection.execute("INSERT OR REPLACE INTO schema_versions (table_name, version) VALUES (?, ?)",
+                           (table_name, SCHEMA_VERSION))
+        connection.execute("RELEASE ensure_schema")
+    except sqlite3.Error:
+        connection.execute("ROLLBACK TO ensure_schema")
+        connection.execute("RELEASE ensure_schema")
+        raise
+
+    migrated = set(range(version + 1, SCHEMA_VERSION + 1)) if existed else set()
+    if migrated & VACUUM_AFTER_MIGRATIONS and not connection.in_transaction:
+        log.info(f"Vacuuming the database after migrating the {table_name} table")
+        connection.execute("VACUUM")
+    return version
+
+
+def get_version(connection, table_name):
+    """Get the schema version of a table, tables created before versioning are version 0."""
+    row = connection.execute("SELECT version FROM schema_versions WHERE table_name = ?", (table_name,)).fetchone()
+    return row[0] if row else 0
+
+
+def table_exists(connection, table_name):
+    row = connection.execute("SELECT count(name) FROM sqlite_master WHERE type='table' AND name = ?",
+                             (table_name,)).fetchone()
+    return row[0] == 1
+
+
+def get_columns(connection, table_name):
+    return [column[1] for column in connection.execute(f'PRAGMA table_info("{table_name}")')]
+
+
+def create_job_table(connection, table_name):
+    columns_with_types = ', '.join(f'"{column}" {column_type}' for column, column_type in JOB_COLUMNS.items())
+    connection.execute(f'CREATE TABLE IF NOT EXISTS "{table_name}" ({columns_with_types})')
+    create_job_indexes(connection, table_name)
+    create_updated_at_index(connection, table_name)
+    create_texts_table(connection, table_name)
+    create_search_table(connection, table_name)
+
+
+def create_updated_at_index(connection, table_name):
+    # Kept out of JOB_INDEXES as the column doesn't exist yet when migrate_v1 builds the version 1 table
+    connection.execute(f'CREATE INDEX IF NOT EXISTS "idx_{table_name}_updated_at" ON "{table_name}" (updated_at)')
+
+
+def create_texts_table(connection, table_name):
+    columns_with_types = ', '.join(f'"{column}" BLOB' for column in TEXT_COLUMNS)
+    connection.execute(f'CREATE TABLE IF NOT EXISTS "{get_texts_table_name(table_name)}" '
+                       f'(job_id INTEGER PRIMARY KEY, {columns_with_types})')
+
+
+def create_job_indexes(connection, table_name):
+    for suffix, unique, columns in JOB_INDEXES:
+        connection.execute(f'CREATE {"UNIQUE " if unique else ""}INDEX IF NOT EXISTS "idx_{table_name}_{suffix}" '
+                           f'ON "{table_name}" ({columns})')
+
+
+def create_search_table(connection, table_name):
+    connection.execute(f'CREATE VIRTUAL TABLE IF NOT EXISTS "{get_search_table_name(table_name)}" USING fts5('
+                       f'{", ".join(SEARCH_COLUMNS)}, content="", tokenize="porter unicode61")')
+
+
+def create_keys_table(connection, table_name):
+    keys_table = get_keys_table_name(table_name)
+    columns_with_types = ', '.join(f'"{column}" {JOB_COLUMNS[column].split(" ")[0]}' for column in KEY_COLUMNS)
+    connection.execute(f'CREATE TABLE IF NOT EXISTS "{keys_table}" ({columns_with_types})')
+    # Not unique, archived rows are deleted from the job table so their keys are only ever added once
+    for suffix, unique, columns in JOB_INDEXES:
+        if unique:
+            connection.execute(f'CREATE INDEX IF NOT EXISTS "idx_{keys_table}_{suffix}" ON "{keys_table}" ({columns})')
+
+
+def migrate_v1(connection, table_name):
+    """Rebuild a table whose schema was inferred from pandas dtypes into the explicit typed schema. The posting id
+    is parsed out of job_url, and rows that duplicate an older row are dropped by the unique indexes."""
+    connection.create_function('parse_posting_id', 1, parse_posting_id, deterministic=True)
+    legacy_columns = set(get_columns(connection, table_name))
+    select_columns = [legacy_column_expression(column, legacy_columns) for column in JOB_COLUMNS_V1]
+
+    migrating_table = f'{table_name}_migrating'
+    connection.execute(f'DROP TABLE IF EXISTS "{migrating_table}"')
+    columns_with_types = ', '.join(f'"{column}" {column_type}' for column, column_type in JOB_COLUMNS_V1.items())
+    connection.execute(f'CREATE TABLE "{migrating_table}" ({columns_with_types})')
+    create_job_indexes(connection, migrating_table)
+    cursor = connection.execute(f"""
+        INSERT OR IGNORE INTO "{migrating_table}" ({', '.join(f'"{column}"' for column in JOB_COLUMNS_V1)})
+        SELECT {', '.join(select_columns)} FROM "{table_name}" ORDER BY id
+    """)
+    copied = cursor.rowcount
+    total = connection.execute(f'SELECT count(*) FROM "{table_name}"').fetchone()[0]
+    if copied < total:
+        log.warning(f"Dropped {total - copied} duplicate records while migrating the {table_name} table")
+
+    connection.execute(f'DROP TABLE "{table_name}"')
+    # Drop the temporary indexes so the final ones can be created under the table's own name
+    for suffix, _, _ in JOB_INDEXES:
+        connection.execute(f'DROP INDEX IF EXISTS "idx_{migrating_table}_{suffix}"')
+    connection.execute(f'ALTER TABLE "{migrating_table}" RENAME TO "{table_name}"')
+    create_job_indexes(connection, table_name)
+
+
+def migrate_v2(connection, table_name):
+    """Move the job description, cover letter and resume out of the job table into its compressed texts table."""
+    connection.create_function('compress_text', 1, compress_text, deterministic=True)
+    create_texts_table(connection, table_name)
+    connection.execute(f"""
+        INSERT OR REPLACE INTO "{get_texts_table_name(table_name)}" (job_id, {', '.join(TEXT_COLUMNS)})
+        SELECT id, {', '.join(f'compress_text("{column}")' for column in TEXT_COLUMNS)} FROM "{table_name}"
+    """)
+    for column in TEXT_COLUMNS:
+        connection.execute(f'ALTER TABLE "{table_name}" DROP COLUMN "{column}"')
+
+
+def migrate_v3(connection, table_name):
+    """Create the full-text search index and index the existing jobs."""
+    connection.create_function('decompress_text', 1, decompress_text, deterministic=True)
+    create_search_table(connection, table_name)
+    connection.execute(f"""
+        INSERT INTO "{get_search_table_name(table_name)}" (rowid, {', '.join(SEARCH_COLUMNS)})
+        SELECT jobs.id, jobs.title, jobs.company, jobs.location, decompress_text(texts.job_description)
+        FROM "{table_name}" AS jobs LEFT JOIN "{get_texts_table_name(table_name)}" AS texts ON texts.job_id = jobs.id
+    """)
+
+
+def migrate_v4(connection, table_name):
+    """Add the indexed updated_at change marker column, left empty for existing jobs."""
+    connection.execute(f'ALTER TABLE "{table_name}" ADD COLUMN "updated_at" TIMESTAMP')
+    create_updated_at_index(connection, table_name)
+
+
+def migrate_v5(connection, table_name):
+    """Create the indexes backing the job list's facet filters."""
+    create_job_indexes(connection, table_name)
+
+
+def legacy_column_expression(column, legacy_columns):
+    # Select expression converting a legacy column into its typed equivalent
+    if column == 'posting_id':
+        return 'parse_posting_id(job_url)'
+    if column in STATUS_COLUMNS:
+        return f'CASE WHEN "{column}" THEN 1 ELSE 0 END' if column in legacy_columns else '0'
+    if column in SALARY_COLUMNS:
+        return f'COALESCE(CAST("{column}" AS INTEGER), 0)' if column in legacy_columns else '0'
+    if column in ('title', 'company', 'location'):
+        return f"COALESCE(\"{column}\", '')" if column in legacy_columns else "''"
+    return f'"{column}"' if column in legacy_columns else 'NULL'
+
+
+MIGRATIONS = {
+    1: migrate_v1,
+    2: migrate_v2,
+    3: migrate_v3,
+    4: migrate_v4,
+    5: migrate_v5
+}
+# Migrations that free enough pages to be worth a VACUUM once they are committed
+VACUUM_AFTER_MIGRATIONS = {2}
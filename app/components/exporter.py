@@ -0,0 +1,138 @@
+from .file_utils import replace_file
+from .logger import Logger
+from datetime import date, datetime
+import os
+import uuid
+
+# pyarrow, imported by load_pyarrow when jobs are first exported, so scraper runs without new jobs don't load it
+pa = None
+pq = None
+
+log = Logger('__name__')
+
+# Each run's jobs are written as a new Parquet file under a Hive-style partition for the day they were loaded, e.g.
+# data/exports/linkedin_jobs/date_loaded=2024-09-01/part-093000-1a2b3c4d.parquet, so readers such as
+# pandas.read_parquet(path, filters=[('date_loaded', '>=', '2024-09-01')]) only open the days they need.
+EXPORT_COMPRESSION = 'zstd'
+PARTITION_COLUMN = 'date_loaded'
+# Export column types, fixed so every file in a dataset has the same schema regardless of the values in a run
+EXPORT_COLUMNS = (
+    ('posting_id', 'int64'),
+    ('title', 'string'),
+    ('company', 'string'),
+    ('location', 'string'),
+    ('date', 'date32'),
+    ('job_url', 'string'),
+    ('job_description', 'string'),
+    ('applied', 'int8'),
+    ('hidden', 'int8'),
+    ('interview', 'int8'),
+    ('rejected', 'int8'),
+    ('min_salary', 'int64'),
+    ('max_salary', 'int64'),
+    ('loaded_at', 'timestamp'),
+)
+
+
+def load_pyarrow():
+    # pyarrow is only required for the Parquet exports, returns False when it isn't installed
+    global pa, pq
+    if pa is None:
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            return False
+        pa, pq = pyarrow, pyarrow.parquet
+    return True
+
+
+def get_export_schema():
+    types = {'string': pa.string(), 'int8': pa.int8(), 'int64': pa.int64(), 'date32': pa.date32(),
+             'timestamp': pa.timestamp('us')}
+    return pa.schema([(column, types[column_type]) for column, column_type in EXPORT_COLUMNS])
+
+
+def export_jobs(jobs, dataset, export_path, loaded_at):
+    """Write one run's jobs as a compressed Parquet file in the partition for the day they were loaded.
+    :param jobs: List of job dicts from the JobProcessor.
+    :param dataset: Name of the dataset directory, e.g. linkedin_jobs.
+    :param export_path: Resolved root directory of the exports.
+    :param loaded_at: datetime the jobs were loaded into the database.
+    :return: Path of the written file, or None if there was nothing to write.
+    """
+    if not load_pyarrow():
+        log.error("Exporting jobs requires pyarrow, install it with: pip install pyarrow")
+        return None
+    if not jobs:
+        return None
+    columns = {column: [to_export_value(job.get(column), column_type) for job in jobs]
+               for column, column_type in EXPORT_COLUMNS if column != 'loaded_at'}
+    columns['loaded_at'] = [loaded_at] * len(jobs)
+    table = pa.table(columns, schema=get_export_schema())
+
+    partition_path = get_partition_path(export_path, dataset, loaded_at.date())
+    os.makedirs(partition_path, exist_ok=True)
+    file_path = os.path.join(partition_path, f"part-{loaded_at:%H%M%S}-{uuid.uuid4().hex[:8]}.parquet")
+    write_table(table, file_path)
+    log.info(f"Exported {len(jobs)} jobs to {file_path}")
+    return file_path
+
+
+def get_partition_path(export_path, dataset, partition_date):
+    return os.path.join(export_path, dataset, f"{PARTITION_COLUMN}={partition_date.isoformat()}")
+
+
+def to_export_value(value, column_type):
+    # Convert a scraped value to the Python type pyarrow expects for the column, missing values become null
+    if value is None or (isinstance(value, float) and value != value):
+        return None
+    if column_type in ('int8', 'int64'):
+        return int(value)
+    if column_type == 'date32':
+        return value if isinstance(value, date) else date.fromisoformat(str(value)[:10])
+    return str(value)
+
+
+def write_table(table, file_path):
+    replace_file(file_path, lambda temporary_path: pq.write_table(table, temporary_path,
+                                                                   compression=EXPORT_COMPRESSION))
+
+
+def compact_exports(export_path, min_files=2):
+    """Merge the small per-run files of every partition into a single file.
+    :param export_path: Resolved root directory of the exports.
+    :param min_files: Only partitions with at least this many files are compacted.
+    :return: The number of partitions compacted.
+    """
+    if not load_pyarrow():
+        log.error("Compacting exports requires pyarrow, install it with: pip install pyarrow")
+        return 0
+    if not os.path.isdir(export_path):
+        return 0
+    compacted = 0
+    for dataset in sorted(os.listdir(export_path)):
+        dataset_path = os.path.join(export_path, dataset)
+        if not os.path.isdir(dataset_path):
+            continue
+        for partition in sorted(os.listdir(dataset_path)):
+            partition_path = os.path.join(dataset_path, partition)
+            file_names = sorted(name for name in os.listdir(partition_path) if name.endswith('.parquet'))
+            if len(file_names) >= min_files:
+                compact_partition(partition_path, file_names)
+                compacted += 1
+    log.info(f"Compacted {compacted} export partitions in {export_path}")
+    return compacted
+
+
+def compact_partition(partition_path, file_names):
+    file_paths = [os.path.join(partition_path, name) for name in file_names]
+    schema = get_export_schema()
+    table = pa.concat_tables(pq.read_table(file_path, schema=schema) for file_path in file_paths)
+    table = table.sort_by('loaded_at')
+    # The merged file is in place before the small files are removed, so a failed compaction loses nothing
+    file_name = f"compacted-{datetime.now():%H%M%S}-{uuid.uuid4().hex[:8]}.parquet"
+    write_table(table, os.path.join(partition_path, file_name))
+    for file_path in file_paths:
+        os.remove(file_path)
+    log.info(f"Merged {len(file_paths)} files into one in {partition_path}")
@@ -0,0 +1,11 @@
+import os
+
+
+def replace_file(file_path, write):
+    """Write a file through a temporary file, so readers never see it partially written.
+    :param file_path: Path of the file to create or replace.
+    :param write: Function writing the new content to the temporary path it is passed.
+    """
+    temporary_path = f"{file_path}.tmp"
+    write(temporary_path)
+    os.replace(temporary_path, file_path)
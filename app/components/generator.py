@@ -0,0 +1,151 @@
+from .cache import PersistentCache
+from .logger import Logger
+import hashlib
+import json
+import threading
+import time
+
+log = Logger('__name__')
+
+# Tailored resumes have always been generated with this model, cover letters use config["OpenAI_Model"]
+RESUME_MODEL = "gpt-3.5-turbo"
+# Replies of the language model by model and prompt, overridden by config["llm_cache"], false disables the cache
+DEFAULT_LLM_CACHE_SETTINGS = {"path": "data/llm_cache.db", "ttl_days": 30, "max_size_mb": 64}
+
+
+class GenerationError(Exception):
+    """Raised when the language model could not generate a resume or cover letter."""
+
+
+def get_openai_settings(config, cache=None, rate_limiter=None, compactor=None):
+    """OpenAI connection settings from the config. OpenAI_API_BASE points the calls at another OpenAI compatible
+    server, e.g. a local stub in tests. cache is an optional PersistentCache of replies, rate_limiter an optional
+    RateLimiter every request to OpenAI waits for and compactor an optional PromptCompactor for the prompt inputs."""
+    return {
+        "api_key": config.get("OpenAI_API_KEY"),
+        "model": config.get("OpenAI_Model"),
+        "api_base": config.get("OpenAI_API_BASE"),
+        "cache": cache,
+        "rate_limiter": rate_limiter,
+        "compactor": compactor
+    }
+
+
+def create_llm_cache(config, resolve_path):
+    """Create the PersistentCache of replies set in config["llm_cache"], shared by the web app and the scraper.
+    :param config: The loaded config.json.
+    :param resolve_path: Function resolving the configured cache path, e.g. get_path.
+    :return: The cache, or None if it is disabled.
+    """
+    if config.get("llm_cache") is False:
+        return None
+    settings = {**DEFAULT_LLM_CACHE_SETTINGS, **(config.get("llm_cache") or {})}
+    ttl_days, max_size_mb = settings["ttl_days"], settings["max_size_mb"]
+    return PersistentCache(resolve_path(settings["path"]),
+                           ttl_seconds=ttl_days * 86400 if ttl_days is not None else None,
+                           max_bytes=int(max_size_mb * 1024 * 1024) if max_size_mb is not None else None,
+                           sqlite_settings=config.get("sqlite"))
+
+
+class RateLimiter:
+    """Spaces calls evenly so that at most requests_per_minute start in any minute, shared by all threads."""
+
+    def __init__(self, requests_per_minute):
+        self.interval = 60 / requests_per_minute
+        self.next_start = 0
+        self.lock = threading.Lock()
+
+    def wait(self):
+        with self.lock:
+            now = time.monotonic()
+            start = max(now, self.next_start)
+            self.next_start = start + self.interval
+        if start > now:
+            time.sleep(start - now)
+
+
+def get_prompt_key(model, prompt):
+    # Replies are cached by the content they were generated from, so identical prompts share one reply
+    return hashlib.sha256(json.dumps([model, prompt]).encode()).hexdigest()
+
+
+def get_chat_gpt(prompt, settings, model=None):
+    """Send a single user message to the chat completions API, or get the reply to the same model and prompt from
+    settings["cache"]. Identical requests in flight at the same time are sent once.
+    :param prompt: The user message.
+    :param settings: OpenAI settings from get_openai_settings.
+    :param model: The model to use, defaults to settings["model"].
+    :return: The content of the reply.
+    """
+    model = model or settings["model"]
+    if settings.get("cache") is None:
+        return request_chat_completion(prompt, settings, model)
+    return settings["cache"].get_or_set(get_prompt_key(model, prompt),
+                                        lambda: request_chat_completion(prompt, settings, model))
+
+
+def request_chat_completion(prompt, settings, model):
+    try:
+        # Imported on the first request, so the web app and the scraper don't load openai when they start
+        import openai
+    except ImportError:
+        raise GenerationError("Generating text requires openai, install it with: pip install openai") from None
+    if settings.get("rate_limiter") is not None:
+        settings["rate_limiter"].wait()
+    options = {"api_base": settings["api_base"]} if settings.get("api_base") else {}
+    try:
+        completion = openai.ChatCompletion.create(
+            model=model,
+            messages=[
+                {"role": "user", "content": prompt},
+            ],
+            api_key=settings["api_key"],
+            **options
+        )
+        return completion.choices[0].message.content
+    except Exception as e:
+        log.error(f"Error connecting to OpenAI: {e}")
+        raise GenerationError(f"Error connecting to OpenAI: {e}") from e
+
+
+def compact_inputs(job, resume, settings):
+    # Strip boilerplate from the description and fit both to their token budgets, when a compactor is set
+    compactor = settings.get("compactor")
+    if compactor is None:
+        return job, resume
+    return compactor.compact_job(job), compactor.compact_resume(resume)
+
+
+def generate_resume(job, resume, settings):
+    """Tailor the resume to the job, job needs its title, company and job_description."""
+    job, resume = compact_inputs(job, resume, settings)
+    return get_chat_gpt(get_resume_prompt(job, resume), settings, RESUME_MODEL)
+
+
+def generate_cover_letter(job, resume, settings):
+    """Write a cover letter for the job from the resume, then have it revised in a second pass."""
+    job, resume = compact_inputs(job, resume, settings)
+    draft = get_chat_gpt(get_cover_letter_prompt(job, resume), settings)
+    return get_chat_gpt(get_cover_letter_revision_prompt(job, resume, draft), settings)
+
+
+# Generator of each document stored with a job, by its text field
+DOCUMENT_GENERATORS = {"cover_letter": generate_cover_letter, "resume": generate_resume}
+
+
+def get_resume_prompt(job, resume):
+    return ("You are a career coach with a client that is applying for a job as a "
+            + job['title'] + " at " + job['company']
+            + ". They have a resume that you need to review and suggest how to tailor it for the job. "
+              "Approach this task in the following steps: \n 1. Highlight three to five most important responsibilities for this role based on the job description. "
+              "\n2. Based on these most important responsibilities from the job description, please tailor the resume for this role. Do not make information up. "
+              "Respond with the final resume only. \n\n Here is the job description: "
+            + job['job_description'] + "\n\n Here is the resume: " + resume)
+
+
+def get_cover_letter_prompt(job, resume):
+    return ("You are a career coach with over 15 years of experience helping job seekers land their dream jobs in tech. You are helping a candidate to write a cover letter for the below role. Approach this task in three steps. Step 1. Identify main challenges someone in this position would face day to day. Step 2. Write an attention grabbing hook for your cover letter that highlights your experience and qualifications in a way that shows you empathize and can successfully take on challenges of the role. Consider incorporating specific examples of how you tackled these challenges in your past work, and explore creative ways to express your enthusiasm for the opportunity. Put emphasis on how the candidate can contribute to company as opposed to just listing accomplishments. Keep your hook within 100 words or less. Step 3. Finish writing the cover letter based on the resume and keep it within 250 words. Respond with final cover letter only. \n job description: " + job['job_description'] + "\n company: " + job['company'] + "\n title: " + job['title'] + "\n resume: " + resume)
+
+
+def get_cover_letter_revision_prompt(job, resume, draft):
+    return ("You are young but experienced career coach helping job seekers land their dream jobs in tech. I need your help crafting a cover letter. Here is a job description: " + job['job_description'] + "\nhere is my resume: " + resume + "\nHere's the cover letter I got so far: " + draft + "\nI need you to help me improve it. Let's approach this in following steps. \nStep 1. Please set the formality scale as follows: 1 is conversational English, my initial Cover letter draft is 10. Step 2. Identify three to five ways this cover letter can be improved, and elaborate on each way with at least one thoughtful sentence. Step 4. Suggest an improved cover letter based on these suggestions with the Formality Score set to 7. Avoid subjective qualifiers such as drastic, transformational, etc. Keep the final cover letter within 250 words. Please respond with the final cover letter only.")
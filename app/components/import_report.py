@@ -0,0 +1,83 @@
+from .logger import Logger
+import os
+import re
+import subprocess
+import sys
+
+log = Logger('__name__')
+
+# Dependencies the scraper only imports once a run needs them, reported separately from the startup imports. requests
+# isn't one of them, main imports it at startup, so it is part of main's time.
+DEFERRED_MODULES = ("bs4", "langdetect", "pyarrow.parquet", "psycopg2", "openai", "pdfminer.high_level", "pandas")
+# A line of python -X importtime output: "import time: <self us> | <cumulative us> | <indented module name>"
+IMPORT_TIME_REGEX = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \| ( *)(\S+)$')
+
+
+def run_python(arguments, path):
+    # Run a fresh interpreter that can import the modules in path, e.g. main and components
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, (path, os.environ.get('PYTHONPATH')))))
+    return subprocess.run([sys.executable, *arguments], env=env, capture_output=True, text=True)
+
+
+def measure_imports(statement, path, skip=()):
+    """Run statement in a fresh interpreter with -X importtime and collect the time taken by each import.
+    :param statement: Python code to run, e.g. "import main".
+    :param path: Directory added to the interpreter's sys.path, e.g. the one main.py is in.
+    :param skip: Names of modules to leave out, e.g. those the interpreter loads before running any code.
+    :return: (module, self microseconds, cumulative microseconds, nesting depth) tuples in the order the imports
+        finished, or None if the statement failed, e.g. because a module isn't installed.
+    """
+    result = run_python(['-X', 'importtime', '-c', statement], path)
+    if result.returncode != 0:
+        return None
+    entries = []
+    for line in result.stderr.splitlines():
+        match = IMPORT_TIME_REGEX.match(line)
+        if match and match.group(4) not in skip:
+            # Nested imports are indented by two spaces per level
+            entries.append((match.group(4), int(match.group(1)), int(match.group(2)), len(match.group(3)) // 2))
+    return entries
+
+
+def get_total(entries):
+    # The time of a top level import includes everything it imported in turn, in milliseconds
+    return sum(cumulative for _, _, cumulative, depth in entries if depth == 0) / 1000
+
+
+def measure_statement(statement, setup, path):
+    # Milliseconds statement takes in a fresh interpreter after running setup, or None if it failed
+    code = f"import time; {setup}; started = time.perf_counter(); {statement}; print(time.perf_counter() - started)"
+    result = run_python(['-c', code], path)
+    if result.returncode != 0:
+        return None
+    return float(result.stdout.split()[-1]) * 1000
+
+
+def report_import_times(path, top=15):
+    """Log how long importing the scraper's entry point takes with its slowest modules, and what each dependency
+    imported later in a run adds. Every measurement runs in a fresh interpreter, so none benefits from another.
+    :param path: Directory of main.py.
+    :param top: Number of slowest modules to list.
+    :return: Milliseconds by measured module, None for the ones that could not be imported.
+    """
+    interpreter_modules = {entry[0] for entry in measure_imports("pass", path) or []}
+    entries = measure_imports("import main", path, interpreter_modules)
+    if entries is None:
+        log.error("Could not import main")
+        return {}
+    times = {"main": get_total(entries)}
+    log.info(f"Importing main took {times['main']:.1f} ms, slowest modules:")
+    for module, self_time, cumulative, _ in sorted(entries, key=lambda entry: entry[2], reverse=True)[:top]:
+        log.info(f"  {module}: {cumulative / 1000:.1f} ms ({self_time / 1000:.1f} ms in the module itself)")
+
+    log.info("Deferred dependencies, imported when a run needs them:")
+    for module in DEFERRED_MODULES:
+        entries = measure_imports(f"import {module}", path, interpreter_modules)
+        times[module] = get_total(entries) if entries is not None else None
+        log.info(f"  {module}: {'not installed' if times[module] is None else f'{times[module]:.1f} ms'}")
+    # langdetect reads its language profiles from files on the first detection
+    times["langdetect profiles"] = measure_statement("init_factory()",
+                                                     "from langdetect.detector_factory import init_factory", path)
+    if times["langdetect profiles"] is not None:
+        log.info(f"  langdetect profiles: {times['langdetect profiles']:.1f} ms")
+    return times
@@ -1,8 +1,5 @@
-from bs4 import BeautifulSoup
 from itertools import groupby
-from langdetect import detect
 from datetime import datetime, time, timedelta
-from langdetect.lang_detect_exception import LangDetectException
 from .logger import Logger
 from .request_handler import get_with_retry
 from urllib.parse import quote
@@ -10,6 +7,12 @@ import random
 import re
 
 
+def detect(text):
+    # langdetect is imported, and loads its language profiles, on the first detection instead of at startup
+    from langdetect import detect as detect_language
+    return detect_language(text)
+
+
 class JobProcessor:
     log = Logger('__name__')
     SALARY_RANGE_REGEX = r'\$\s*(\d{1,3}(?:,\d{3})?(?:k)?)\s*(?:-|to)\s*\$\s*(\d{1,3}(?:,\d{3})?(?:k)?)'
@@ -61,6 +64,8 @@ class JobProcessor:
     def convert_response_to_beautifulsoup(response):
         if not response:
             return None
+        # Imported on first use, so runs that exit before scraping don't load bs4
+        from bs4 import BeautifulSoup
         return BeautifulSoup(response.content, 'html.parser')
 
     @staticmethod
@@ -97,6 +102,7 @@ class JobProcessor:
             date = date_tag['datetime'] if date_tag else date_tag_new['datetime'] if date_tag_new else ''
             job_description = ''
             job = {
+                'posting_id': int(job_posting_id) if job_posting_id.isdigit() else None,
                 'title': title,
                 'company': company.text.strip().replace('\n', ' ') if company else '',
                 'location': location.text.strip() if location else '',
@@ -134,8 +140,9 @@ class JobProcessor:
                 job['min_salary'], job['max_salary'] = (
                     JobProcessor.parse_job_salary_range(job_desc_data, salary_text_pattern))
                 missing_job_description_count += 1 if "Could not find Job Description" == job['job_description'] else 0
-                language = JobProcessor.safe_detect(job['job_description'])
-                if language not in config['languages']:
+                # Only detected when languages are configured, loading langdetect's profiles costs a noticeable start
+                language = JobProcessor.safe_detect(job['job_description']) if config['languages'] else None
+                if language is not None and language not in config['languages']:
                     JobProcessor.log.info(f"Job description language not supported: {language}")
                     #continue
                 job_list.append(job)
@@ -200,6 +207,7 @@ class JobProcessor:
 
     @staticmethod
     def safe_detect(text):
+        from langdetect.lang_detect_exception import LangDetectException
         try:
             return detect(text)
         except LangDetectException:
@@ -0,0 +1,292 @@
+from .db_manager import DB_Manager
+from .db_schema import (JOB_COLUMNS, JOB_INDEXES, SCHEMA_VERSION, STATUS_COLUMNS, TEXT_COLUMNS, compress_text,
+                        get_search_table_name, get_texts_table_name, parse_posting_id)
+from datetime import date, datetime
+from io import StringIO
+from itertools import islice
+import csv
+import threading
+import uuid
+
+try:
+    import psycopg2
+    import psycopg2.pool
+except ImportError:  # psycopg2 is only required for the postgres backend
+    psycopg2 = None
+
+# PostgreSQL types of the job table columns, matching db_schema.JOB_COLUMNS
+PG_COLUMN_TYPES = {
+    'id': 'BIGSERIAL PRIMARY KEY',
+    'posting_id': 'BIGINT',
+    'title': 'TEXT NOT NULL',
+    'company': "TEXT NOT NULL DEFAULT ''",
+    'location': "TEXT NOT NULL DEFAULT ''",
+    'date': 'DATE',
+    'job_url': 'TEXT',
+    'applied': 'SMALLINT NOT NULL DEFAULT 0 CHECK (applied IN (0, 1))',
+    'hidden': 'SMALLINT NOT NULL DEFAULT 0 CHECK (hidden IN (0, 1))',
+    'interview': 'SMALLINT NOT NULL DEFAULT 0 CHECK (interview IN (0, 1))',
+    'rejected': 'SMALLINT NOT NULL DEFAULT 0 CHECK (rejected IN (0, 1))',
+    'min_salary': 'INTEGER NOT NULL DEFAULT 0',
+    'max_salary': 'INTEGER NOT NULL DEFAULT 0',
+    'date_loaded': 'TIMESTAMP',
+    'updated_at': 'TIMESTAMP'
+}
+# Expressions casting a staged text value into its column, applying the column defaults to missing values
+PG_COLUMN_CASTS = {
+    'posting_id': "NULLIF({0}, '')::bigint",
+    'title': "COALESCE({0}, '')",
+    'company': "COALESCE({0}, '')",
+    'location': "COALESCE({0}, '')",
+    'date': "NULLIF({0}, '')::date",
+    'date_loaded': "NULLIF({0}, '')::timestamp",
+    'updated_at': "NULLIF({0}, '')::timestamp",
+    **{column: "COALESCE(NULLIF({0}, '')::numeric::integer, 0)::smallint" for column in STATUS_COLUMNS},
+    'min_salary': "COALESCE(NULLIF({0}, '')::numeric::integer, 0)",
+    'max_salary': "COALESCE(NULLIF({0}, '')::numeric::integer, 0)"
+}
+# Full-text search weights, the same order of importance as db_schema.SEARCH_WEIGHTS
+PG_SEARCH_DOCUMENT = ("setweight(to_tsvector('english', {0}.title), 'A') || "
+                      "setweight(to_tsvector('english', {0}.company), 'B') || "
+                      "setweight(to_tsvector('english', {0}.location), 'C') || "
+                      "setweight(to_tsvector('english', COALESCE({1}, '')), 'D')")
+
+
+class PG_Manager(DB_Manager):
+    """PostgreSQL storage for the job tables, with the same methods as the SQLite DB_Manager. Connections come from
+    a pool shared by every PG_Manager in the process, and close() returns the connection to the pool. Several
+    scraper containers and web workers can write to the same database."""
+    PLACEHOLDER = '%s'
+    TIMESTAMP_SQL = "(clock_timestamp() AT TIME ZONE 'UTC')"
+    pools = {}
+    pools_lock = threading.Lock()
+
+    def create_connection(self, settings):
+        # Check out a connection from the pool for these settings, creating the pool on first use
+        if psycopg2 is None:
+            self.log.error("The postgres db_backend requires psycopg2, install it with: pip install psycopg2-binary")
+            self.connection = None
+            return None
+        try:
+            self.pool = self.get_pool(settings)
+            self.connection = self.pool.getconn()
+            self.log.info("Successfully connected to the database.")
+        except psycopg2.Error as e:
+            self.log.error(f"Error thrown while attempting to connect to database, error: {e}")
+            self.connection = None
+        return self.connection
+
+    @classmethod
+    def get_pool(cls, settings):
+        connect_kwargs = {key: value for key, value in settings.items()
+                          if key not in ('min_connections', 'max_connections') and value is not None}
+        key = tuple(sorted(connect_kwargs.items()))
+        with cls.pools_lock:
+            if key not in cls.pools:
+                cls.pools[key] = psycopg2.pool.ThreadedConnectionPool(
+                    settings.get('min_connections', 1), settings.get('max_connections', 10), **connect_kwargs)
+            return cls.pools[key]
+
+    def close(self):
+        if self.connection is not None and self.pool is not None:
+            try:
+                self.pool.putconn(self.connection)
+                self.log.info("Database connection returned to the pool.")
+            except psycopg2.Error as e:
+                self.log.error(f"Error closing the database connection: {e}")
+            self.connection = None
+
+    def ensure_schema(self, table_name):
+        # Create the job, texts and search tables at the current schema version, once per connection
+        if table_name in self.checked_tables:
+            return
+        cursor = self.connection.cursor()
+        # Serialise schema creation across concurrent scrapers
+        cursor.execute("SELECT pg_advisory_xact_lock(hashtext('ensure_schema'))")
+        cursor.execute("CREATE TABLE IF NOT EXISTS schema_versions (table_name TEXT PRIMARY KEY, version INTEGER)")
+        cursor.execute("SELECT version FROM schema_versions WHERE table_name = %s", (table_name,))
+        row = cursor.fetchone()
+        if row is None:
+            columns_with_types = ', '.join(f'"{column}" {PG_COLUMN_TYPES[column]}' for column in JOB_COLUMNS)
+            cursor.execute(f'CREATE TABLE IF NOT EXISTS "{table_name}" ({columns_with_types})')
+            self.create_job_indexes(cursor, table_name)
+            cursor.execute(f'CREATE TABLE IF NOT EXISTS "{get_texts_table_name(table_name)}" (job_id BIGINT PRIMARY '
+                           f'KEY, {", ".join(f"{column} BYTEA" for column in TEXT_COLUMNS)})')
+            search_table = get_search_table_name(table_name)
+            cursor.execute(f'CREATE TABLE IF NOT EXISTS "{search_table}" '
+                           f'(job_id BIGINT PRIMARY KEY, document TSVECTOR NOT NULL)')
+            cursor.execute(f'CREATE INDEX IF NOT EXISTS "idx_{search_table}_document" '
+                           f'ON "{search_table}" USING GIN (document)')
+            cursor.execute("INSERT INTO schema_versions (table_name, version) VALUES (%s, %s)",
+                           (table_name, SCHEMA_VERSION))
+            self.log.info(f"Created the {table_name} table at schema version {SCHEMA_VERSION}")
+        elif row[0] in (3, 4):
+            # Version 4 added the updated_at change marker, version 5 the facet indexes of the job list
+            cursor.execute(f'ALTER TABLE "{table_name}" ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP')
+            self.create_job_indexes(cursor, table_name)
+            cursor.execute("UPDATE schema_versions SET version = %s WHERE table_name = %s", (SCHEMA_VERSION, table_name))
+            self.log.info(f"Migrated the {table_name} table to schema version {SCHEMA_VERSION}")
+        elif row[0] != SCHEMA_VERSION:
+            self.log.warning(f"The {table_name} table is at schema version {row[0]}, expected {SCHEMA_VERSION}")
+        self.connection.commit()
+        self.checked_tables.add(table_name)
+
+    @staticmethod
+    def create_job_indexes(cursor, table_name):
+        for suffix, unique, columns in JOB_INDEXES + [('updated_at', False, 'updated_at')]:
+            cursor.execute(f'CREATE {"UNIQUE " if unique else ""}INDEX IF NOT EXISTS '
+                           f'"idx_{table_name}_{suffix}" ON "{table_name}" ({columns})')
+
+    def insert_records(self, records, table_name):
+        """
+        Bulk insert records into a job table with COPY, skipping duplicates.
+
+        Rows are streamed into a temporary staging table with COPY, then moved into the job, texts and search
+        tables by a single INSERT ... ON CONFLICT DO NOTHING, so the whole load is one transaction.
+
+        Args:
+            records (DataFrame | list[dict]): The records to insert, either a DataFrame or a list of job dicts.
+            table_name (str): The name of the table to insert into.
+
+        Returns:
+            int: The number of records added, or 0 if the insert failed.
+        """
+        source_columns, source_rows = self.get_source_rows(records)
+        if not source_columns or 'job_url' not in source_columns:
+            return 0
+        url_position = source_columns.index('job_url')
+        positions = [i for i, column in enumerate(source_columns) if column in JOB_COLUMNS and column != 'id']
+        columns = tuple(source_columns[i] for i in positions)
+        add_posting_id = 'posting_id' not in columns
+        if add_posting_id:
+            columns += ('posting_id',)
+        updated_at = [] if 'updated_at' in columns else [self.get_timestamp()]
+        columns += ('updated_at',) * len(updated_at)
+        text_positions = [i for i, column in enumerate(source_columns) if column in TEXT_COLUMNS]
+        text_columns = tuple(source_columns[i] for i in text_positions)
+        description_position = source_columns.index('job_description') if 'job_description' in source_columns else None
+
+        staging_columns = (*columns, *text_columns, 'search_description', 'source_order')
+        job_casts = [PG_COLUMN_CASTS.get(column, '{0}').format(f'staging."{column}"') for column in columns]
+        texts_table = get_texts_table_name(table_name)
+        search_table = get_search_table_name(table_name)
+        try:
+            cursor = self.connection.cursor()
+            cursor.execute(f'CREATE TEMP TABLE job_staging ('
+                           f'{", ".join(f"{column} TEXT" for column in columns)}'
+                           f'{"".join(f", {column} BYTEA" for column in text_columns)}'
+                           f', search_description TEXT, source_order BIGINT) ON COMMIT DROP')
+            order = 0
+            while chunk := list(islice(source_rows, self.INSERT_CHUNK_SIZE)):
+                buffer = StringIO()
+                writer = csv.writer(buffer, quoting=csv.QUOTE_NOTNULL)
+                for row in chunk:
+                    job_values = [row[i] for i in positions]
+                    if add_posting_id:
+                        job_values.append(parse_posting_id(row[url_position]))
+                    job_values += updated_at
+                    text_values = [self.to_bytea(compress_text(row[i])) for i in text_positions]
+                    description = row[description_position] if description_position is not None else None
+                    writer.writerow([self.to_copy_value(value) for value in (*job_values, *text_values,
+                                                                              description, order)])
+                    order += 1
+                buffer.seek(0)
+                cursor.copy_expert(f'COPY job_staging ({", ".join(staging_columns)}) FROM STDIN WITH (FORMAT csv)',
+                                   buffer)
+
+            texts_sql = (f', texts AS (INSERT INTO "{texts_table}" (job_id, {", ".join(text_columns)}) '
+                         f'SELECT inserted.id, {", ".join(f"staged.{column}" for column in text_columns)} '
+                         f'FROM inserted JOIN staged ON staged.job_url = inserted.job_url '
+                         f'ON CONFLICT (job_id) DO NOTHING)') if text_columns else ''
+            cursor.execute(f"""
+                WITH staged AS (
+                    SELECT DISTINCT ON (job_url) * FROM job_staging ORDER BY job_url, source_order
+                ), inserted AS (
+                    INSERT INTO "{table_name}" ({', '.join(f'"{column}"' for column in columns)})
+                    SELECT {', '.join(job_casts)} FROM job_staging AS staging ORDER BY staging.source_order
+                    ON CONFLICT DO NOTHING
+                    RETURNING id, job_url, title, company, location
+                ){texts_sql}, search AS (
+                    INSERT INTO "{search_table}" (job_id, document)
+                    SELECT inserted.id, {PG_SEARCH_DOCUMENT.format('inserted', 'staged.search_description')}
+                    FROM inserted JOIN staged ON staged.job_url = inserted.job_url
+                    ON CONFLICT (job_id) DO NOTHING
+                )
+                SELECT count(*) FROM inserted
+            """)
+            added_records = cursor.fetchone()[0]
+            self.connection.commit()
+        except psycopg2.Error as e:
+            self.connection.rollback()
+            self.log.error(f"Error adding records to the {table_name} table, error: {e}")
+            return 0
+        return added_records
+
+    @staticmethod
+    def to_bytea(data):
+        # bytea hex input format, accepted by COPY in csv format
+        return '\\x' + data.hex() if data is not None else None
+
+    @staticmethod
+    def to_copy_value(value):
+        # NaN (missing values in a DataFrame) is written as NULL, everything else as text
+        if value is None or (isinstance(value, float) and value != value):
+            return None
+        return str(int(value)) if isinstance(value, bool) else str(value)
+
+    def to_dicts(self, column_names, rows):
+        # Return dates as ISO strings, as SQLite stores them, so both backends serialise jobs the same way
+        jobs = super().to_dicts(column_names, rows)
+        for job in jobs:
+            for column, value in job.items():
+                if isinstance(value, datetime):
+                    job[column] = str(value)
+                elif isinstance(value, date):
+                    job[column] = value.isoformat()
+        return jobs
+
+    def open_stream_cursor(self, sql, params=()):
+        # A named (server-side) cursor, so fetchmany only transfers one batch at a time instead of the whole result
+        cursor = self.connection.cursor(name=f"stream_{uuid.uuid4().hex}")
+        cursor.execute(sql, params)
+        return cursor
+
+    def get_change_marker(self, table_name):
+        # PostgreSQL has no data_version equivalent, the indexed marker query is cheap enough to run every time
+        return self.query_change_marker(table_name)
+
+    def search_jobs(self, table_name, query, limit=25, offset=0, include_hidden=False):
+        # Full-text search using the GIN-indexed tsvector documents, ranked with ts_rank_cd
+        if not (query or '').strip():
+            return 0, []
+        search_table = get_search_table_name(table_name)
+        where = "search.document @@ plainto_tsquery('english', %s)" + ('' if include_hidden else ' AND jobs.hidden = 0')
+        from_sql = f'FROM "{search_table}" AS search JOIN "{table_name}" AS jobs ON jobs.id = search.job_id'
+        total = self.execute(f'SELECT count(*) {from_sql} WHERE {where}', (query,)).fetchone()[0]
+        cursor = self.execute(
+            f"SELECT jobs.*, -ts_rank_cd(search.document, plainto_tsquery('english', %s)) AS rank {from_sql} "
+            f"WHERE {where} ORDER BY rank, jobs.id DESC LIMIT %s OFFSET %s", (query, query, limit, offset))
+        return total, self.fetch_dicts(cursor)
+
+    def table_exists(self, table_name):
+        # Check if the table already exists in the database
+        return self.execute("SELECT to_regclass(%s) IS NOT NULL", (f'"{table_name}"',)).fetchone()[0]
+
+    def find_existing_keys(self, jobs, table_name):
+        # Same as DB_Manager.find_existing_keys, matching against arrays instead of expanded parameter lists
+        posting_ids, job_urls, title_company_dates = set(), set(), set()
+        for i in range(0, len(jobs), self.LOOKUP_CHUNK_SIZE):
+            chunk = jobs[i:i + self.LOOKUP_CHUNK_SIZE]
+            chunk_ids = [posting_id for posting_id in (self.get_posting_id(job) for job in chunk) if posting_id]
+            posting_ids.update(row[0] for row in self.execute(
+                f'SELECT posting_id FROM "{table_name}" WHERE posting_id = ANY(%s)', (chunk_ids,)).fetchall())
+            chunk_urls = [job['job_url'] for job in chunk if job.get('job_url')]
+            job_urls.update(row[0] for row in self.execute(
+                f'SELECT job_url FROM "{table_name}" WHERE job_url = ANY(%s)', (chunk_urls,)).fetchall())
+            dated = [job for job in chunk if job.get('date')]
+            title_company_dates.update(tuple(row) for row in self.execute(
+                f"SELECT title, company, to_char(date, 'YYYY-MM-DD') FROM \"{table_name}\" "
+                f'WHERE (title, company, date) IN (SELECT * FROM unnest(%s::text[], %s::text[], %s::date[]))',
+                ([job['title'] for job in dated], [job['company'] for job in dated],
+                 [job['date'] for job in dated])).fetchall())
+        return posting_ids, job_urls, title_company_dates
@@ -0,0 +1,120 @@
+from .generator import DOCUMENT_GENERATORS, RateLimiter, create_llm_cache, get_openai_settings
+from .logger import Logger
+from .prompt_compactor import PromptCompactor, get_settings as get_compaction_settings, refresh_compactor
+from .resume_cache import ResumeTextCache
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+log = Logger('__name__')
+
+# Pre-generation defaults, overridden by config["pregeneration"]
+DEFAULT_PREGENERATION_SETTINGS = {
+    "top_n": 5,
+    "rank_by": "max_salary",
+    "keywords": [],
+    "documents": ["cover_letter"],
+    "workers": 2,
+    "requests_per_minute": 20
+}
+# Columns the ranking rules and the prompts need
+JOB_FIELDS = ["title", "company", "location", "date", "min_salary", "max_salary", "job_description"]
+
+
+def get_settings(config):
+    return {**DEFAULT_PREGENERATION_SETTINGS, **(config.get("pregeneration") or {})}
+
+
+def select_jobs(jobs, settings):
+    """Pick the top_n jobs by the rank_by rule:
+    max_salary: highest max_salary first, jobs without a salary last.
+    keywords: most occurrences of the keywords in the title and description first.
+    newest: the most recently posted first.
+    Ties keep the newest job first.
+    """
+    rank_by = settings["rank_by"]
+    if rank_by == "max_salary":
+        key = lambda job: job["max_salary"] or 0
+    elif rank_by == "keywords":
+        keywords = [keyword.lower() for keyword in settings["keywords"]]
+        key = lambda job: sum(f'{job["title"]} {job["job_description"]}'.lower().count(keyword)
+                              for keyword in keywords)
+    elif rank_by == "newest":
+        key = lambda job: str(job["date"] or "")
+    else:
+        raise ValueError(f"Unknown pregeneration rank_by: {rank_by}")
+    jobs = sorted(jobs, key=lambda job: job["id"], reverse=True)
+    return sorted(jobs, key=key, reverse=True)[:settings["top_n"]]
+
+
+def pregenerate_documents(db_manager, config, table_name, date_loaded, resume_path, resolve_path):
+    """Generate cover letters (and optionally resumes) for the best jobs added by a scraper run, so they are ready
+    when the web interface is opened. Enabled by the "pregeneration" key of the config.
+    :param db_manager: Connected db manager the new jobs were inserted with, the documents are saved through it.
+    :param config: The loaded config.json.
+    :param table_name: The jobs table.
+    :param date_loaded: date_loaded of the run's jobs, as stored.
+    :param resume_path: Resolved path of the resume PDF.
+    :param resolve_path: Function resolving configured paths, used for the shared reply cache.
+    :return: The number of documents generated.
+    """
+    if "pregeneration" not in config:
+        return 0
+    settings = get_settings(config)
+    unknown = [document for document in settings["documents"] if document not in DOCUMENT_GENERATORS]
+    if unknown:
+        log.error(f"Unknown pregeneration documents: {', '.join(unknown)}")
+        return 0
+    if not config.get("OpenAI_API_KEY"):
+        log.error("OpenAI API key is empty, skipping pregeneration")
+        return 0
+
+    try:
+        jobs = select_jobs(db_manager.list_jobs(table_name, fields=JOB_FIELDS, loaded_at=date_loaded), settings)
+    except ValueError as e:
+        log.error(e)
+        return 0
+    if not jobs:
+        return 0
+    resume = read_resume(resume_path, config)
+    if resume is None:
+        return 0
+
+    compaction_settings = get_compaction_settings(config)
+    compactor = None
+    if compaction_settings is not None:
+        compactor = refresh_compactor(PromptCompactor(compaction_settings), db_manager, table_name)
+    openai_settings = get_openai_settings(config, create_llm_cache(config, resolve_path),
+                                          RateLimiter(settings["requests_per_minute"]), compactor)
+    generated = 0
+    # The language model calls run on the pool, the documents are saved from this thread as they complete
+    with ThreadPoolExecutor(max_workers=settings["workers"], thread_name_prefix='pregeneration') as executor:
+        futures = {executor.submit(DOCUMENT_GENERATORS[document], job, resume, openai_settings): (job, document)
+                   for job in jobs for document in settings["documents"]}
+        for future in as_completed(futures):
+            job, document = futures[future]
+            try:
+                text = future.result()
+            except Exception as e:
+                log.error(f"Failed to generate the {document} for job {job['id']}, error: {e}")
+                continue
+            db_manager.set_job_text(table_name, job["id"], document, text)
+            generated += 1
+    if openai_settings["cache"] is not None:
+        openai_settings["cache"].close()
+    log.info(f"Pre-generated {generated} documents for {len(jobs)} new jobs")
+    if compactor is not None:
+        log.info(f"Prompt compaction saved about {compactor.get_stats()['tokens_saved']} tokens")
+    return generated
+
+
+def read_resume(resume_path, config):
+    try:
+        # Imported here so pdfminer is only loaded when documents are generated
+        from pdfminer.high_level import extract_text
+    except ImportError:
+        log.error("Pregeneration requires pdfminer.six, install it with: pip install pdfminer.six")
+        return None
+    try:
+        return ResumeTextCache(extract_text, persist=config.get("resume_text_cache", False)).get_text(resume_path)
+    except Exception as e:
+        log.error(f"Could not read the resume {resume_path}, error: {e}")
+        return None
@@ -0,0 +1,158 @@
+from .logger import Logger
+from collections import Counter
+import math
+import re
+import threading
+import time
+
+log = Logger('__name__')
+
+# Prompt compaction defaults, overridden by config["prompt_compaction"]
+DEFAULT_COMPACTION_SETTINGS = {
+    "corpus_size": 500,  # most recent job descriptions the boilerplate is detected from
+    "min_documents": 3,  # a sentence found in at least this many descriptions is boilerplate
+    "min_words": 6,  # shorter sentences, e.g. a single skill in a list, are always kept
+    "description_tokens": 1500,  # token budget of the job description in a prompt, null for no limit
+    "resume_tokens": None,  # token budget of the resume in a prompt, null for no limit
+    "refresh_minutes": 60  # minimum time between rebuilding the boilerplate from newly added jobs
+}
+SENTENCE_REGEX = re.compile(r'(?<=[.!?])\s+')
+CHARS_PER_TOKEN = 4
+
+
+def get_settings(config):
+    # Compaction changes the prompts, so it only runs when config has the prompt_compaction key
+    settings = config.get("prompt_compaction")
+    if settings is None or settings is False:
+        return None
+    return {**DEFAULT_COMPACTION_SETTINGS, **(settings if isinstance(settings, dict) else {})}
+
+
+def estimate_tokens(text):
+    # Rough count for English text with OpenAI's tokenizers, about 4 characters per token
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def split_sentences(line):
+    return [sentence for sentence in SENTENCE_REGEX.split(line.strip()) if sentence]
+
+
+def normalize(sentence):
+    return ' '.join(re.sub(r'[^\w\s]', ' ', sentence.lower()).split())
+
+
+class PromptCompactor:
+    """Shrinks the job descriptions and resume put into the language model prompts. Sentences that recur across many
+    of our stored job descriptions, such as equal opportunity statements, benefits lists and a company's "About us",
+    are dropped, and each section is then cut to its token budget. Token savings are counted for reporting."""
+
+    def __init__(self, settings=None):
+        self.settings = {**DEFAULT_COMPACTION_SETTINGS, **(settings or {})}
+        self.boilerplate = frozenset()
+        self.corpus_marker = None
+        self.built_at = None
+        self.lock = threading.Lock()
+        self.tokens_before = 0
+        self.tokens_after = 0
+
+    def build(self, jobs, marker=None):
+        """Detect the boilerplate sentences of a corpus of jobs.
+        :param jobs: Job dicts with title, company and job_description. A job reposted for several locations is only
+            counted once, so its own sentences don't become boilerplate.
+        :param marker: Identifies the corpus, e.g. the newest job id, so refresh_due can tell when it changed.
+        :return: The number of boilerplate sentences found.
+        """
+        descriptions = {}
+        for job in jobs:
+            if job.get("job_description"):
+                descriptions.setdefault((job.get("company"), job.get("title")), job["job_description"])
+        document_counts = Counter()
+        for description in descriptions.values():
+            document_counts.update({normalize(sentence) for line in description.splitlines()
+                                    for sentence in split_sentences(line)})
+        boilerplate = frozenset(sentence for sentence, count in document_counts.items()
+                                if count >= self.settings["min_documents"]
+                                and len(sentence.split()) >= self.settings["min_words"])
+        with self.lock:
+            self.boilerplate = boilerplate
+            self.corpus_marker = marker
+            self.built_at = time.monotonic()
+        log.info(f"Detected {len(boilerplate)} boilerplate sentences in {len(descriptions)} job descriptions")
+        return len(boilerplate)
+
+    def refresh_due(self, marker):
+        # Rebuild when the corpus changed, but at most once every refresh_minutes
+        if self.built_at is None:
+            return True
+        return marker != self.corpus_marker and \
+            time.monotonic() - self.built_at >= self.settings["refresh_minutes"] * 60
+
+    def strip_boilerplate(self, text):
+        lines = []
+        for line in text.splitlines():
+            sentences = [sentence for sentence in split_sentences(line)
+                         if normalize(sentence) not in self.boilerplate]
+            if sentences:
+                lines.append(' '.join(sentences))
+        # A description made up of boilerplate only is more useful than none
+        return '\n'.join(lines) or text
+
+    @staticmethod
+    def truncate(text, max_tokens):
+        # Keep whole lines up to the budget, then cut the first line that doesn't fit at a word boundary
+        if max_tokens is None or estimate_tokens(text) <= max_tokens:
+            return text
+        max_chars = max_tokens * CHARS_PER_TOKEN
+        kept = []
+        length = 0
+        for line in text.splitlines():
+            if length + len(line) > max_chars:
+                remaining = line[:max(max_chars - length, 0)].rsplit(' ', 1)[0]
+                if remaining:
+                    kept.append(remaining)
+                break
+            kept.append(line)
+            length += len(line) + 1
+        return '\n'.join(kept)
+
+    def compact_job(self, job):
+        """A copy of the job with its description compacted, other fields are left as they are."""
+        description = job.get("job_description") or ""
+        compacted = self.truncate(self.strip_boilerplate(description), self.settings["description_tokens"])
+        self.count(description, compacted)
+        return {**job, "job_description": compacted}
+
+    def compact_resume(self, resume):
+        compacted = self.truncate(resume, self.settings["resume_tokens"])
+        self.count(resume, compacted)
+        return compacted
+
+    def count(self, original, compacted):
+        before, after = estimate_tokens(original), estimate_tokens(compacted)
+        with self.lock:
+            self.tokens_before += before
+            self.tokens_after += after
+        if before > after:
+            log.info(f"Compacted a prompt section from about {before} to {after} tokens")
+
+    def get_stats(self):
+        """Token counts of the prompt sections before and after compaction since the compactor was created."""
+        with self.lock:
+            saved = self.tokens_before - self.tokens_after
+            return {
+                "boilerplate_sentences": len(self.boilerplate),
+                "tokens_before": self.tokens_before,
+                "tokens_after": self.tokens_after,
+                "tokens_saved": saved,
+                "saved_ratio": round(saved / self.tokens_before, 3) if self.tokens_before else 0.0
+            }
+
+
+def refresh_compactor(compactor, db_manager, table_name):
+    """Rebuild the compactor's boilerplate from the newest stored job descriptions when it is due."""
+    max_id = db_manager.get_change_marker(table_name)[0]
+    if compactor.refresh_due(max_id):
+        jobs = db_manager.list_jobs(table_name, include_hidden=True, fields=["title", "company", "job_description"],
+                                    limit=compactor.settings["corpus_size"])
+        compactor.build(jobs, max_id)
+    return compactor
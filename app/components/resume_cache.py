@@ -0,0 +1,85 @@
+from .file_utils import replace_file
+from .logger import Logger
+import hashlib
+import io
+import json
+import os
+import threading
+
+log = Logger('__name__')
+
+
+class ResumeTextCache:
+    """Text extracted from resume PDFs, so an unchanged resume is only parsed once. An entry is reused while the file's
+    size and modification time are unchanged, and after they change as long as the content hash still matches, e.g.
+    when the file was copied over with the same content. With persist the entries are also kept in a JSON file next
+    to the PDF, so they survive restarts."""
+
+    CACHE_SUFFIX = '.text.json'
+
+    def __init__(self, extract_text, persist=False):
+        """
+        :param extract_text: Function taking a binary file object of the PDF and returning its text.
+        :param persist: Keep the extracted text in "<pdf path>.text.json" as well.
+        """
+        self.extract_text = extract_text
+        self.persist = persist
+        self.entries = {}
+        # Held while parsing, so concurrent requests for a changed resume parse it once
+        self.lock = threading.Lock()
+        self.parses = 0
+
+    def get_text(self, pdf_path):
+        """Get the text of a PDF, raises FileNotFoundError if the file does not exist."""
+        pdf_path = os.path.abspath(pdf_path)
+        stat = os.stat(pdf_path)
+        with self.lock:
+            entry = self.entries.get(pdf_path)
+            if entry is None and self.persist:
+                entry = self.load(pdf_path)
+            if entry is not None and (entry['mtime_ns'], entry['size']) == (stat.st_mtime_ns, stat.st_size):
+                self.entries[pdf_path] = entry
+                return entry['text']
+
+            with open(pdf_path, 'rb') as f:
+                content = f.read()
+            sha256 = hashlib.sha256(content).hexdigest()
+            if entry is None or entry['sha256'] != sha256:
+                log.info(f"Extracting the text of {pdf_path}")
+                # Parse the bytes that were hashed, not the file again, in case it changes in between
+                entry = {'sha256': sha256, 'text': self.extract_text(io.BytesIO(content))}
+                self.parses += 1
+            entry = {**entry, 'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size}
+            self.entries[pdf_path] = entry
+            if self.persist:
+                self.save(pdf_path, entry)
+            return entry['text']
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def get_cache_path(self, pdf_path):
+        return pdf_path + self.CACHE_SUFFIX
+
+    def load(self, pdf_path):
+        # A missing, unreadable or incomplete cache file is treated as no entry
+        try:
+            with open(self.get_cache_path(pdf_path)) as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if not isinstance(entry, dict) or not {'sha256', 'text', 'mtime_ns', 'size'} <= entry.keys():
+            return None
+        return entry
+
+    def save(self, pdf_path, entry):
+        def write(temporary_path):
+            with open(temporary_path, 'w') as f:
+                json.dump(entry, f)
+
+        cache_path = self.get_cache_path(pdf_path)
+        try:
+            replace_file(cache_path, write)
+        except OSError as e:
+            log.warning(f"Could not write the resume text cache {cache_path}, error: {e}")
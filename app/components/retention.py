@@ -0,0 +1,135 @@
+from .db_connection import connect
+from .db_schema import (JOB_COLUMNS, KEY_COLUMNS, SEARCH_COLUMNS, TEXT_COLUMNS, create_keys_table, decompress_text,
+                        ensure_schema, get_keys_table_name, get_search_table_name, get_texts_table_name)
+from .logger import Logger
+from datetime import datetime, timedelta
+import sqlite3
+
+log = Logger('__name__')
+
+# Retention defaults, overridden by config["retention"]. Jobs tables are only trimmed when a max age is set for them.
+DEFAULT_RETENTION_SETTINGS = {
+    "archive_path": "data/archive.db",
+    "jobs_max_age_days": None,
+    "filtered_jobs_max_age_days": 30,
+    "interval_hours": 24,
+    "vacuum_pages": 2000
+}
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+def get_settings(config):
+    return {**DEFAULT_RETENTION_SETTINGS, **(config.get("retention") or {})}
+
+
+def run_retention(db_manager, config, archive_path):
+    """Archive old jobs and compact the hot database, at most once every interval_hours.
+    :param db_manager: Connected SQLite DB_Manager for the hot database.
+    :param config: The loaded config.json, retention is enabled by its "retention" key.
+    :param archive_path: Resolved path of the archive database file.
+    :return: Dict of table name to archived row count, or None if retention did not run.
+    """
+    if "retention" not in config:
+        return None
+    connection = db_manager.connection
+    if not isinstance(connection, sqlite3.Connection):
+        log.warning("Retention is only supported for the sqlite db_backend, skipping")
+        return None
+    settings = get_settings(config)
+    if not is_due(connection, settings["interval_hours"]):
+        return None
+
+    archived = {}
+    max_ages = ((config['jobs_tablename'], settings["jobs_max_age_days"]),
+                (config['filtered_jobs_tablename'], settings["filtered_jobs_max_age_days"]))
+    for table_name, max_age_days in max_ages:
+        if max_age_days is not None and db_manager.table_exists(table_name):
+            db_manager.ensure_schema(table_name)
+            archived[table_name] = archive_jobs(connection, table_name, archive_path, max_age_days,
+                                                config.get("sqlite"))
+            log.info(f"Archived {archived[table_name]} records older than {max_age_days} days "
+                     f"from the {table_name} table")
+    compact(connection, settings["vacuum_pages"])
+    record_run(connection)
+    return archived
+
+
+def is_due(connection, interval_hours):
+    # Retention runs are recorded in the hot database so every scraper run can check the schedule cheaply
+    connection.execute("CREATE TABLE IF NOT EXISTS maintenance_runs (task TEXT PRIMARY KEY, last_run TIMESTAMP)")
+    row = connection.execute("SELECT last_run FROM maintenance_runs WHERE task = 'retention'").fetchone()
+    if row is None:
+        return True
+    return datetime.strptime(row[0], TIMESTAMP_FORMAT) <= datetime.now() - timedelta(hours=interval_hours)
+
+
+def record_run(connection):
+    connection.execute("INSERT OR REPLACE INTO maintenance_runs (task, last_run) VALUES ('retention', ?)",
+                       (datetime.now().strftime(TIMESTAMP_FORMAT),))
+    connection.commit()
+
+
+def archive_jobs(connection, table_name, archive_path, max_age_days, sqlite_settings=None):
+    """Move jobs loaded more than max_age_days ago into the archive database, leaving their dedupe keys in the
+    "<table>_keys" table. Jobs marked applied or interview stay in the hot table.
+    :return: The number of jobs archived.
+    """
+    cutoff = (datetime.now() - timedelta(days=max_age_days)).strftime(TIMESTAMP_FORMAT)
+    # The archive gets the same versioned schema, created on its own connection before it is attached
+    archive = connect(archive_path, sqlite_settings)
+    try:
+        ensure_schema(archive, table_name)
+        archive.commit()
+    finally:
+        archive.close()
+
+    texts_table = get_texts_table_name(table_name)
+    search_table = get_search_table_name(table_name)
+    columns = ', '.join(f'"{column}"' for column in JOB_COLUMNS)
+    create_keys_table(connection, table_name)
+    connection.create_function('decompress_text', 1, decompress_text, deterministic=True)
+    connection.commit()
+    connection.execute("ATTACH DATABASE ? AS archive", (archive_path,))
+    try:
+        with connection:
+            connection.execute("DROP TABLE IF EXISTS temp.retention_ids")
+            connection.execute(f'CREATE TEMP TABLE retention_ids AS SELECT id FROM main."{table_name}" '
+                               f'WHERE COALESCE(date_loaded, date) < ? AND applied = 0 AND interview = 0', (cutoff,))
+            selected = 'IN (SELECT id FROM temp.retention_ids)'
+            archived = connection.execute("SELECT count(*) FROM temp.retention_ids").fetchone()[0]
+            connection.execute(f'INSERT INTO main."{get_keys_table_name(table_name)}" ({", ".join(KEY_COLUMNS)}) '
+                               f'SELECT {", ".join(KEY_COLUMNS)} FROM main."{table_name}" WHERE id {selected}')
+            connection.execute(f'INSERT OR IGNORE INTO archive."{table_name}" ({columns}) '
+                               f'SELECT {columns} FROM main."{table_name}" WHERE id {selected}')
+            connection.execute(f'INSERT OR IGNORE INTO archive."{texts_table}" (job_id, {", ".join(TEXT_COLUMNS)}) '
+                               f'SELECT job_id, {", ".join(TEXT_COLUMNS)} FROM main."{texts_table}" '
+                               f'WHERE job_id {selected}')
+            # A contentless FTS5 index removes a row through a 'delete' command carrying the originally indexed values
+            connection.execute(f"""
+                INSERT INTO main."{search_table}" ("{search_table}", rowid, {', '.join(SEARCH_COLUMNS)})
+                SELECT 'delete', jobs.id, jobs.title, jobs.company, jobs.location,
+                       decompress_text(texts.job_description)
+                FROM main."{table_name}" AS jobs LEFT JOIN main."{texts_table}" AS texts ON texts.job_id = jobs.id
+                WHERE jobs.id {selected}
+            """)
+            connection.execute(f'DELETE FROM main."{texts_table}" WHERE job_id {selected}')
+            connection.execute(f'DELETE FROM main."{table_name}" WHERE id {selected}')
+            connection.execute("DROP TABLE temp.retention_ids")
+    finally:
+        connection.execute("DETACH DATABASE archive")
+    return archived
+
+
+def compact(connection, vacuum_pages):
+    """Refresh the query planner statistics and return up to vacuum_pages free pages to the filesystem."""
+    connection.execute("ANALYZE")
+    connection.commit()
+    if connection.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+        # Incremental vacuum needs auto_vacuum=INCREMENTAL, which only takes effect after one full VACUUM
+        log.info("Enabling incremental vacuum, running a one-time full VACUUM")
+        connection.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        connection.execute("VACUUM")
+    else:
+        # Each step of the pragma frees one page, so the result has to be read to the end
+        connection.execute(f"PRAGMA incremental_vacuum({int(vacuum_pages)})").fetchall()
+    connection.commit()
@@ -0,0 +1,55 @@
+from .db_connection import ConnectionPool
+from .db_manager import DB_Manager
+from .logger import Logger
+import os
+import sqlite3
+
+log = Logger('__name__')
+
+SQLITE = "sqlite"
+POSTGRES = "postgres"
+
+
+def create_db_manager(config, db_path=None, pooled=False, read_only=False):
+    """Create a connected db manager for the storage backend set in config["db_backend"].
+    :param config: The loaded config.json.
+    :param db_path: Resolved path to the SQLite database file, only used by the sqlite backend.
+    :param pooled: Take the SQLite connection from a process-wide pool, close() returns it. PostgreSQL connections
+        are always pooled.
+    :param read_only: Use a read-only (mode=ro) SQLite connection, only used together with pooled.
+    :return: A DB_Manager (sqlite, the default) or PG_Manager (postgres), connection is None if connecting failed.
+    """
+    backend = config.get("db_backend", SQLITE)
+    if backend == SQLITE and pooled:
+        pool = ConnectionPool.get_pool(db_path, config.get("sqlite"), read_only)
+        try:
+            db_manager = DB_Manager(pool.acquire(), pool)
+        except sqlite3.Error as e:
+            log.error(f"Error thrown while attempting to connect to database, error: {e}")
+            db_manager = DB_Manager()
+    elif backend == SQLITE:
+        db_manager = DB_Manager()
+        db_manager.create_connection(db_path, config.get("sqlite"))
+    elif backend == POSTGRES:
+        # Imported here so psycopg2 is only needed when the postgres backend is used
+        from .pg_manager import PG_Manager
+        db_manager = PG_Manager()
+        db_manager.create_connection(get_postgres_settings(config))
+    else:
+        raise ValueError(f"Unknown db_backend: {backend}")
+    return db_manager
+
+
+def get_postgres_settings(config):
+    """PostgreSQL connection settings from the DB_* environment variables, overridden by config["postgres"]."""
+    settings = {
+        "host": os.environ.get("DB_HOST") or "localhost",
+        "port": int(os.environ.get("DB_PORT") or 5432),
+        "user": os.environ.get("DB_USER"),
+        "password": os.environ.get("DB_PASSWORD"),
+        "dbname": os.environ.get("DB_NAME"),
+        "min_connections": 1,
+        "max_connections": 10
+    }
+    settings.update(config.get("postgres") or {})
+    return settings
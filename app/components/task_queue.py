@@ -0,0 +1,76 @@
+from .logger import Logger
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import uuid
+
+log = Logger('__name__')
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+class TaskQueue:
+    """Runs slow work, such as language model calls, on a fixed number of background threads. Tasks are looked up by
+    id to poll their status and result. A task submitted with the key of a task that is still queued or running
+    returns that task instead of starting the same work twice. Only the latest max_finished finished tasks are
+    kept."""
+
+    def __init__(self, max_workers=2, max_finished=256):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='task')
+        self.max_finished = max_finished
+        self.tasks = {}
+        self.active_keys = {}
+        self.finished = OrderedDict()
+        self.lock = threading.Lock()
+
+    def submit(self, key, function, *args):
+        """
+        :param key: Identifies the work, e.g. ("cover_letter", 12). None never matches another task.
+        :param function: Called with args on a worker thread, its return value is the task's result.
+        :return: The id of the new or already pending task.
+        """
+        with self.lock:
+            if key is not None and key in self.active_keys:
+                return self.active_keys[key]
+            task_id = uuid.uuid4().hex
+            self.tasks[task_id] = {"id": task_id, "status": QUEUED, "result": None, "error": None}
+            if key is not None:
+                self.active_keys[key] = task_id
+        self.executor.submit(self.run, task_id, key, function, args)
+        return task_id
+
+    def run(self, task_id, key, function, args):
+        self.update(task_id, status=RUNNING)
+        try:
+            result = function(*args)
+        except Exception as e:
+            log.error(f"Task {task_id} failed, error: {e}")
+            self.finish(task_id, key, status=FAILED, error=str(e))
+        else:
+            self.finish(task_id, key, status=DONE, result=result)
+
+    def update(self, task_id, **values):
+        with self.lock:
+            self.tasks[task_id].update(values)
+
+    def finish(self, task_id, key, **values):
+        with self.lock:
+            self.tasks[task_id].update(values)
+            if key is not None and self.active_keys.get(key) == task_id:
+                del self.active_keys[key]
+            self.finished[task_id] = True
+            while len(self.finished) > self.max_finished:
+                expired_id, _ = self.finished.popitem(last=False)
+                del self.tasks[expired_id]
+
+    def get(self, task_id):
+        """A copy of the task's id, status, result and error, or None if the id is unknown or expired."""
+        with self.lock:
+            task = self.tasks.get(task_id)
+            return dict(task) if task is not None else None
+
+    def shutdown(self, wait=True):
+        self.executor.shutdown(wait=wait)
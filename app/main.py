@@ -1,16 +1,23 @@
+import time as tm
+IMPORTS_STARTED = tm.perf_counter()  # The imports below are timed and logged on every run, see start()
 import argparse
 import os
-import pandas as pd
 import json
-import time as tm
 from datetime import datetime
-from components.db_manager import DB_Manager
+from components.exporter import compact_exports, export_jobs
+from components.import_report import report_import_times
+from components.retention import get_settings as get_retention_settings, run_retention
+from components.storage import create_db_manager
 from components.logger import Logger
+from components.pregeneration import pregenerate_documents
 from components.job_processor import JobProcessor
 from components.vpn_manager import reset_vpn
 
+IMPORTS_FINISHED = tm.perf_counter()
 log = Logger('__name__')
 
+DEFAULT_EXPORT_PATH = "data/exports"
+
 
 def load_config(file_name):
     file_path = get_path(file_name)
@@ -46,9 +53,26 @@ def main():
     parser.add_argument('-reset_vpn', action='store_true',
                         help="Reset the VPN before running the scraper.")
 
+    # Define the optional flag for reporting the import cost of the scraper instead of scraping
+    parser.add_argument('-import_report', action='store_true',
+                        help="Log how long importing the scraper and its deferred dependencies takes, then exit.")
+
+    # Define the optional flag for compacting the exports instead of scraping
+    parser.add_argument('-compact_exports', action='store_true',
+                        help="Merge the small per-run export files of each day into one file, then exit.")
+
     # Parse the arguments
     args = parser.parse_args()
 
+    if args.import_report:
+        report_import_times(os.path.dirname(os.path.abspath(__file__)))
+        return
+
+    if args.compact_exports:
+        config = load_config(args.config_file)
+        compact_exports(get_path(config.get("export_path", DEFAULT_EXPORT_PATH)))
+        return
+
     # Handle VPN reset if the flag is provided
     vpn_successful_reset = True
     if args.reset_vpn:
@@ -63,6 +87,7 @@ def main():
 
 def start(config_file):
     log.info("Start scraping...")
+    log.info(f"Imports took {(IMPORTS_FINISHED - IMPORTS_STARTED) * 1000:.0f} ms")
     start_time = tm.perf_counter()
 
     config = load_config(config_file)
@@ -70,8 +95,7 @@ def start(config_file):
 
     # Create a connection to the database
     db_path = get_path(config["db_path"])
-    db_manager = DB_Manager()
-    db_manager.create_connection(db_path)
+    db_manager = create_db_manager(config, db_path)
 
     # filtering out jobs that are already in the database
     all_jobs = db_manager.find_new_jobs(all_jobs, config)
@@ -82,6 +106,9 @@ def start(config_file):
         process_jobs(all_jobs, config, db_manager)
     else:
         log.info("No jobs found")
+    # Archive old jobs and compact the database when the retention schedule is due
+    if "retention" in config:
+        run_retention(db_manager, config, get_path(get_retention_settings(config)["archive_path"]))
     # Close connection to the database
     db_manager.close()
 
@@ -97,38 +124,40 @@ def process_jobs(all_jobs, config, db_manager):
     log.info(f"Total jobs to add after filtering: {len(jobs_to_add)}")
     # Create a list for jobs removed based on job description keywords - they will be added to the filtered_jobs table
     filtered_list = [job for job in job_list if job not in jobs_to_add]
-    df = pd.DataFrame(jobs_to_add)
-    df_filtered = pd.DataFrame(filtered_list)
-    df['date_loaded'] = datetime.now()
-    df_filtered['date_loaded'] = datetime.now()
-    df['date_loaded'] = df['date_loaded'].astype(str)
-    df_filtered['date_loaded'] = df_filtered['date_loaded'].astype(str)
+    # The job dicts are inserted as they are, building DataFrames would only add the cost of importing pandas
+    date_loaded = datetime.now()
+    jobs = [dict(job, date_loaded=str(date_loaded)) for job in jobs_to_add]
+    jobs_filtered = [dict(job, date_loaded=str(date_loaded)) for job in filtered_list]
 
     jobs_tablename = config['jobs_tablename']  # name of the table to store the "approved" jobs
     filtered_jobs_tablename = config['filtered_jobs_tablename']  # name of the table to store the jobs that have been
     # filtered out based on description keywords (so that in future they are not scraped again)
-    create_update_job_tables(db_manager, df, df_filtered, jobs_tablename, filtered_jobs_tablename)
+    create_update_job_tables(db_manager, jobs, jobs_filtered, jobs_tablename, filtered_jobs_tablename)
 
-    linkedin_job_csv_path: str = get_path("data/linkedin_jobs.csv")
-    linkedin_jobs_filtered_csv_path: str = get_path("data/linkedin_jobs_filtered.csv")
+    # Export this run's jobs as compressed Parquet files, partitioned by the day they were loaded
+    export_path = get_path(config.get("export_path", DEFAULT_EXPORT_PATH))
+    export_jobs(jobs_to_add, "linkedin_jobs", export_path, date_loaded)
+    export_jobs(filtered_list, "linkedin_jobs_filtered", export_path, date_loaded)
 
-    df.to_csv(linkedin_job_csv_path, mode='a', index=False, encoding='utf-8')
-    df_filtered.to_csv(linkedin_jobs_filtered_csv_path, mode='a', index=False, encoding='utf-8')
+    # Generate cover letters for the best of the new jobs, so they are ready when the web interface is opened
+    if "pregeneration" in config and db_manager.connection is not None:
+        pregenerate_documents(db_manager, config, jobs_tablename, str(date_loaded), get_path(config["resume_path"]),
+                              get_path)
 
 
-def create_update_job_tables(db_manager, df, df_filtered, jobs_tablename, filtered_jobs_tablename):
+def create_update_job_tables(db_manager, jobs, jobs_filtered, jobs_tablename, filtered_jobs_tablename):
     if db_manager.connection is not None:
         # Update or Create the database table for the job list
         if db_manager.table_exists(jobs_tablename):
-            db_manager.update_table(df, jobs_tablename)
+            db_manager.update_table(jobs, jobs_tablename)
         else:
-            db_manager.create_table(df, jobs_tablename)
+            db_manager.create_table(jobs, jobs_tablename)
 
         # Update or Create the database table for the filtered out jobs
         if db_manager.table_exists(filtered_jobs_tablename):
-            db_manager.update_table(df_filtered, filtered_jobs_tablename)
+            db_manager.update_table(jobs_filtered, filtered_jobs_tablename)
         else:
-            db_manager.create_table(df_filtered, filtered_jobs_tablename)
+            db_manager.create_table(jobs_filtered, filtered_jobs_tablename)
     else:
         log.error("Error! cannot create the database connection.")
 
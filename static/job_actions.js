@@ -9,9 +9,14 @@ async function showJobDetails(jobId) {
     newSelectedJob.classList.add('job-item-selected');
     selectedJob = newSelectedJob;
 
+    // The description and cover letter aren't part of the list page, fetch them for the selected job only
     const response = await fetch('/job_details/' + jobId);
     const jobData = await response.json();
 
+    // Ignore the response if another job was selected while it was loading
+    if (selectedJob !== newSelectedJob) {
+        return;
+    }
     updateJobDetails(jobData);
 
     if ('cover_letter' in jobData) {
@@ -48,9 +53,9 @@ function updateJobDetails(job) {
     html += '<div class="button-container" style="text-align:center">';
     html += '<a href="' + job.job_url + '" class="job-button">Go to job</a>';
     html += '<button class="job-button" onclick="markAsCoverLetter(' + job.id + ')">Cover Letter</button>';
-    html += '<button class="job-button" onclick="markAsApplied(' + job.id + ')">Applied</button>';
-    html += '<button class="job-button" onclick="markAsRejected(' + job.id + ')">Rejected</button>';
-    html += '<button class="job-button" onclick="markAsInterview(' + job.id + ')">Interview</button>';
+    html += '<button class="job-button" id="status-button-applied" onclick="markAsApplied(' + job.id + ')">Applied</button>';
+    html += '<button class="job-button" id="status-button-rejected" onclick="markAsRejected(' + job.id + ')">Rejected</button>';
+    html += '<button class="job-button" id="status-button-interview" onclick="markAsInterview(' + job.id + ')">Interview</button>';
     html += '<button class="job-button" onclick="hideJob(' + job.id + ')">Hide</button>';
     html += '</div>';
     html += '<p class="job-detail">' + job.company + ', ' + job.location + '</p>';
@@ -58,6 +63,7 @@ function updateJobDetails(job) {
     html += '<p class="job-description">' + job.job_description + '</p>';
 
     jobDetailsDiv.innerHTML = html;
+    updateStatusButtons(job.id);
     if (job.cover_letter) {
         // Update the cover letter div
         coverLetterDiv.innerHTML = '<p class="job-description">' + job.cover_letter + '</p>';
@@ -68,90 +74,241 @@ function updateJobDetails(job) {
 }
 
 
-function markAsApplied(jobId) {
-    console.log('Marking job as applied: ' + jobId)
-    fetch('/mark_applied/' + jobId, { method: 'POST' })
-        .then(response => response.json())
-        .then(data => {
-            console.log(data);  // Log the response
-            if (data.success) {
-                var jobCard = document.querySelector(`.job-item[data-job-id="${jobId}"]`);
-                jobCard.classList.add('job-item-applied');
-            }
-        });
+// Status changes are applied to the page right away and queued, then saved together through /update_job_statuses
+// shortly after the last click, or when the page is left
+var pendingStatusChanges = [];
+var statusFlushTimer = null;
+var hiddenJobIds = [];
+const STATUS_FLUSH_DELAY_MS = 1000;
+const STATUS_LABELS = {applied: ['Applied', 'Un-apply'], rejected: ['Rejected', 'Un-reject'],
+                       interview: ['Interview', 'No interview']};
+
+function queueStatusChange(jobId, status, value) {
+    pendingStatusChanges.push({id: Number(jobId), status: status, value: value});
+    clearTimeout(statusFlushTimer);
+    statusFlushTimer = setTimeout(flushStatusChanges, STATUS_FLUSH_DELAY_MS);
 }
 
-function markAsCoverLetter(jobId) {
-    console.log('Marking job as cover letter: ' + jobId)
-    fetch('/get_CoverLetter/' + jobId, { method: 'POST' })
-        .then(response => response.json())
-        .then(data => {
-            console.log(data);  // Log the response
-            if (data.cover_letter) {
-                // Show the job details again, this will also update the cover letter
-                showJobDetails(jobId);
+function flushStatusChanges(useBeacon) {
+    clearTimeout(statusFlushTimer);
+    statusFlushTimer = null;
+    if (pendingStatusChanges.length === 0) {
+        return;
+    }
+    var changes = pendingStatusChanges;
+    pendingStatusChanges = [];
+    var body = JSON.stringify({changes: changes});
+    // A beacon is still delivered after the page is closed
+    if (useBeacon === true && navigator.sendBeacon) {
+        navigator.sendBeacon('/update_job_statuses', new Blob([body], {type: 'application/json'}));
+        return;
+    }
+    fetch('/update_job_statuses', {method: 'POST', headers: {'Content-Type': 'application/json'}, body: body})
+        .then(response => {
+            if (!response.ok) {
+                throw new Error('HTTP ' + response.status);
             }
+            return response.json();
+        })
+        .then(data => console.log(data))
+        .catch(error => {
+            // Put the changes back ahead of any queued since, so the later clicks still win, and retry
+            console.log('Saving status changes failed: ' + error);
+            pendingStatusChanges = changes.concat(pendingStatusChanges);
+            clearTimeout(statusFlushTimer);
+            statusFlushTimer = setTimeout(flushStatusChanges, STATUS_FLUSH_DELAY_MS * 5);
         });
 }
 
+window.addEventListener('pagehide', () => flushStatusChanges(true));
+document.addEventListener('visibilitychange', () => {
+    if (document.visibilityState === 'hidden') {
+        flushStatusChanges(true);
+    }
+});
+
+function getJobCard(jobId) {
+    return document.querySelector(`.job-item[data-job-id="${jobId}"]`);
+}
+
+function updateJobCard(jobCard) {
+    // Rejected is shown over interview, and interview over applied
+    var shown = ['rejected', 'interview', 'applied'].find(status => jobCard.dataset[status] === '1');
+    ['rejected', 'interview', 'applied'].forEach(status => {
+        jobCard.classList.toggle('job-item-' + status, status === shown);
+    });
+}
+
+function updateStatusButtons(jobId) {
+    var jobCard = getJobCard(jobId);
+    Object.keys(STATUS_LABELS).forEach(status => {
+        var button = document.getElementById('status-button-' + status);
+        if (jobCard && button) {
+            button.innerText = STATUS_LABELS[status][jobCard.dataset[status] === '1' ? 1 : 0];
+        }
+    });
+}
+
+function toggleJobStatus(jobId, status) {
+    // Set the status, or clear it if the job already has it
+    var jobCard = getJobCard(jobId);
+    var value = jobCard.dataset[status] !== '1';
+    console.log('Setting job ' + status + ' to ' + value + ': ' + jobId);
+    jobCard.dataset[status] = value ? '1' : '0';
+    updateJobCard(jobCard);
+    updateStatusButtons(jobId);
+    queueStatusChange(jobId, status, value);
+}
+
+function markAsApplied(jobId) {
+    toggleJobStatus(jobId, 'applied');
+}
+
+const TASK_POLL_INTERVAL_MS = 2000;
+
+async function pollTask(statusUrl) {
+    // Wait for a background task to finish, returning its final status
+    while (true) {
+        await new Promise(resolve => setTimeout(resolve, TASK_POLL_INTERVAL_MS));
+        const response = await fetch(statusUrl);
+        const task = await response.json();
+        if (!response.ok || task.status === 'done' || task.status === 'failed') {
+            return task;
+        }
+    }
+}
+
+async function markAsCoverLetter(jobId) {
+    console.log('Generating cover letter: ' + jobId)
+    bottomPane.innerText = 'Generating a cover letter...';
+    const response = await fetch('/generate/cover_letter/' + jobId, { method: 'POST' });
+    const data = await response.json();
+    if (!response.ok) {
+        console.log(data);
+        bottomPane.innerText = data.error;
+        return;
+    }
+    const task = await pollTask(data.status_url);
+    console.log(task);  // Log the final task status
+    // Only touch the panes if the job is still the one shown
+    if (selectedJob === null || selectedJob.getAttribute('data-job-id') !== String(jobId)) {
+        return;
+    }
+    if (task.status === 'done') {
+        // Show the job details again, this will also update the cover letter
+        showJobDetails(jobId);
+    } else {
+        bottomPane.innerText = 'Generating the cover letter failed: ' + task.error;
+    }
+}
+
 function markAsRejected(jobId) {
-    console.log('Marking job as rejected: ' + jobId)
-    fetch('/mark_rejected/' + jobId, { method: 'POST' })
-        .then(response => response.json())
-        .then(data => {
-            console.log(data);  // Log the response
-            if (data.success) {
-                var jobCard = document.querySelector(`.job-item[data-job-id="${jobId}"]`);
-                jobCard.classList.add('job-item-rejected');
-            }
-        });
+    toggleJobStatus(jobId, 'rejected');
+}
+
+function markAsInterview(jobId) {
+    toggleJobStatus(jobId, 'interview');
 }
 
 function hideJob(jobId) {
-    fetch('/hide_job/' + jobId, { method: 'POST' })
-        .then(response => response.json())
-        .then(data => {
-            if (data.success) {
-                var jobCard = document.querySelector(`.job-item[data-job-id="${jobId}"]`);
-                
-                // Find the next sibling in the DOM that is a job-item
-                var nextJobCard = jobCard.nextElementSibling;
-                while(nextJobCard && !nextJobCard.classList.contains('job-item')) {
-                    nextJobCard = nextJobCard.nextElementSibling;
-                }
-                
-                // If a next job exists, show its details
-                if (nextJobCard) {
-                    var nextJobId = nextJobCard.getAttribute('data-job-id');
-                    showJobDetails(nextJobId);
-                }
-                
-                // Hide the current job
-                jobCard.style.display = 'none'; // Or you can remove it from DOM entirely
-
-                // If no next job exists, clear the job details div
-                if (!nextJobCard) {
-                    var jobDetailsDiv = document.getElementById('job-details');
-                    jobDetailsDiv.innerHTML = '';
-                }
-            }
-        });
+    var jobCard = getJobCard(jobId);
+    queueStatusChange(jobId, 'hidden', true);
+    hiddenJobIds.push(jobId);
+    document.getElementById('undo-hide-button').style.display = '';
+
+    // Find the next sibling in the DOM that is a visible job-item
+    var nextJobCard = jobCard.nextElementSibling;
+    while (nextJobCard && (!nextJobCard.classList.contains('job-item') || nextJobCard.style.display === 'none')) {
+        nextJobCard = nextJobCard.nextElementSibling;
+    }
+
+    // If a next job exists, show its details
+    if (nextJobCard) {
+        var nextJobId = nextJobCard.getAttribute('data-job-id');
+        showJobDetails(nextJobId);
+    }
+
+    // Hide the current job
+    jobCard.style.display = 'none';
+
+    // If no next job exists, clear the job details div
+    if (!nextJobCard) {
+        var jobDetailsDiv = document.getElementById('job-details');
+        jobDetailsDiv.innerHTML = '';
+    }
+}
+
+function undoHide() {
+    // Show the most recently hidden job again and un-hide it in the database
+    var jobId = hiddenJobIds.pop();
+    if (jobId === undefined) {
+        return;
+    }
+    queueStatusChange(jobId, 'hidden', false);
+    getJobCard(jobId).style.display = '';
+    if (hiddenJobIds.length === 0) {
+        document.getElementById('undo-hide-button').style.display = 'none';
+    }
+    showJobDetails(jobId);
 }
 
+// New jobs are pushed by the server as they are scraped and added to the top of the list. Only the first page
+// listens, older pages don't show the newest jobs anyway.
+function createJobCard(job) {
+    var jobCard = document.createElement('a');
+    jobCard.className = 'job-item';
+    jobCard.href = '#';
+    jobCard.setAttribute('data-job-id', job.id);
+    ['applied', 'interview', 'rejected'].forEach(status => {
+        jobCard.dataset[status] = String(job[status]);
+    });
+    jobCard.onclick = function(event) {
+        event.preventDefault();
+        showJobDetails(job.id);
+    };
+    var content = document.createElement('div');
+    content.className = 'job-content';
+    var lines = [job.company + ', ' + job.location, job.date];
+    if (job.min_salary && job.max_salary) {
+        lines.push('$' + Math.round(job.min_salary).toLocaleString('en-US') + ' - $'
+                   + Math.round(job.max_salary).toLocaleString('en-US'));
+    }
+    var title = document.createElement('h3');
+    title.textContent = job.title;
+    content.appendChild(title);
+    lines.forEach(line => {
+        var paragraph = document.createElement('p');
+        paragraph.textContent = line;
+        content.appendChild(paragraph);
+    });
+    jobCard.appendChild(content);
+    updateJobCard(jobCard);
+    return jobCard;
+}
 
-function markAsInterview(jobId) {
-    console.log('Marking job as interview: ' + jobId)
-    fetch('/mark_interview/' + jobId, { method: 'POST' })
-        .then(response => response.json())
-        .then(data => {
-            console.log(data);  // Log the response
-            if (data.success) {
-                var jobCard = document.querySelector(`.job-item[data-job-id="${jobId}"]`);
-                jobCard.classList.add('job-item-interview');
+function listenForNewJobs() {
+    var jobList = document.getElementById('job-list');
+    if (!jobList || jobList.dataset.firstPage !== 'true' || !window.EventSource) {
+        return;
+    }
+    var newestJob = jobList.querySelector('.job-item');
+    var newestId = newestJob ? newestJob.getAttribute('data-job-id') : 0;
+    var source = new EventSource('/stream/jobs?after=' + newestId);
+    source.addEventListener('jobs', function(event) {
+        var jobs = JSON.parse(event.data);
+        console.log('Received ' + jobs.length + ' new jobs');
+        // Jobs arrive newest first, so insert them oldest first to keep that order
+        var heading = jobList.querySelector('h2');
+        jobs.reverse().forEach(job => {
+            if (!getJobCard(job.id)) {
+                heading.after(createJobCard(job));
             }
         });
+    });
 }
 
+listenForNewJobs();
+
 var resizer = document.getElementById('resizer');
 var jobDetails = document.getElementById('job-details');
 var bottomPane = document.getElementById('bottom-pane');
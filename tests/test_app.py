@@ -0,0 +1,218 @@
+import gzip
+import json
+import re
+import sqlite3
+from datetime import date, timedelta
+import pytest
+from app.components.db_manager import DB_Manager
+import wsgi
+
+web_app = wsgi.web_app
+
+
+def make_job(number, days_old=0):
+    return {"title": f"Engineer {number}", "company": "TechCorp", "location": "Denver",
+            "date": (date.today() - timedelta(days=days_old)).isoformat(),
+            "job_url": f"https://www.linkedin.com/jobs/view/{number}/", "job_description": f"Kafka job {number}"}
+
+
+def insert_jobs(db_path, jobs):
+    db_manager = DB_Manager()
+    db_manager.create_connection(db_path)
+    db_manager.ensure_schema("jobs")
+    db_manager.insert_records(jobs, "jobs")
+    db_manager.close()
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    db_path = str(tmp_path / "jobs.db")
+    insert_jobs(db_path, [make_job(number, days_old=number % 10) for number in range(1, 61)])
+    return db_path
+
+
+@pytest.fixture
+def app(tmp_path, db_path):
+    config = {"db_path": db_path, "jobs_tablename": "jobs", "filtered_jobs_tablename": "filtered_jobs",
+              "resume_path": str(tmp_path / "resume.pdf"), "OpenAI_API_KEY": "", "llm_cache": False}
+    config_file = tmp_path / "config.json"
+    config_file.write_text(json.dumps(config))
+    return wsgi.create_app(str(config_file))
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+def get_job_ids(response):
+    return [int(job_id) for job_id in re.findall(r'data-job-id="(\d+)"', response.get_data(as_text=True))]
+
+
+def test_create_app_keeps_state_per_app(app, tmp_path):
+    other = wsgi.create_app(str(tmp_path / "config.json"))
+
+    state = app.extensions['job_scraper']
+    assert state is not other.extensions['job_scraper']
+    assert state.db_path == str(tmp_path / "jobs.db")
+    assert state.openai_settings is not None
+    assert app.config['TEMPLATES_AUTO_RELOAD'] is True
+
+
+def test_home_pages_through_jobs_with_before(client):
+    first_page = client.get('/')
+
+    assert first_page.status_code == 200
+    assert get_job_ids(first_page) == list(range(60, 10, -1))
+    assert 'href="/?before=11"' in first_page.get_data(as_text=True)
+
+    second_page = client.get('/?before=11')
+    assert get_job_ids(second_page) == list(range(10, 0, -1))
+    assert '/?before=' not in second_page.get_data(as_text=True)
+
+
+def test_etag_answers_unchanged_jobs_with_304(client):
+    response = client.get('/get_all_jobs?limit=5')
+    etag = response.get_etag()[0]
+
+    assert response.status_code == 200
+    assert response.cache_control.no_cache
+    assert client.get('/get_all_jobs?limit=5', headers={'If-None-Match': f'"{etag}"'}).status_code == 304
+
+    client.post('/hide_job/60')
+    response = client.get('/get_all_jobs?limit=5', headers={'If-None-Match': f'"{etag}"'})
+    assert response.status_code == 200
+    assert response.get_etag()[0] != etag
+
+
+def test_compressed_response_has_encoding_in_etag(client):
+    response = client.get('/get_all_jobs', headers={'Accept-Encoding': 'gzip'})
+    etag = response.get_etag()[0]
+
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert 'Accept-Encoding' in response.vary
+    assert etag.endswith('-gzip')
+    assert len(json.loads(gzip.decompress(response.get_data()))["jobs"]) == 60
+    response = client.get('/get_all_jobs', headers={'Accept-Encoding': 'gzip', 'If-None-Match': f'"{etag}"'})
+    assert response.status_code == 304
+    assert response.get_etag()[0] == etag
+
+
+def test_update_job_statuses_applies_changes_and_reversals(client):
+    response = client.post('/update_job_statuses', json={"changes": [
+        {"id": 1, "status": "applied"}, {"id": 2, "status": "hidden", "value": True},
+        {"id": 2, "status": "hidden", "value": False}, {"id": 3, "status": "interview", "value": 1}]})
+
+    assert response.status_code == 200
+    jobs = {job["id"]: job for job in client.get('/get_all_jobs?fields=id,applied,hidden,interview').json["jobs"]}
+    assert jobs[1]["applied"] == 1
+    assert jobs[2]["hidden"] == 0
+    assert jobs[3]["interview"] == 1
+
+
+@pytest.mark.parametrize("payload", [
+    {"changes": [{"id": 1, "status": "applied", "value": "false"}]},
+    {"changes": [{"id": 1, "status": "applied", "value": 2}]},
+    {"changes": [{"id": 1, "status": "promoted"}]},
+    {"changes": [{"status": "applied"}]},
+    {"changes": {"id": 1, "status": "applied"}},
+    {}
+])
+def test_update_job_statuses_rejects_invalid_changes(client, payload):
+    response = client.post('/update_job_statuses', json=payload)
+
+    assert response.status_code == 400
+    assert client.get('/get_all_jobs?fields=id,applied&limit=500').json["jobs"][-1] == {"id": 1, "applied": 0}
+
+
+def test_export_jobs_streams_every_job(client, monkeypatch):
+    monkeypatch.setattr(web_app, 'EXPORT_CHUNK_SIZE', 100)
+
+    response = client.get('/export_jobs?fields=id,title')
+    assert response.is_streamed
+    assert response.mimetype == 'application/x-ndjson'
+    rows = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert [row["id"] for row in rows] == list(range(60, 0, -1))
+    assert rows[0] == {"id": 60, "title": "Engineer 60"}
+
+    response = client.get('/export_jobs?format=json&fields=id', headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert 'Content-Length' not in response.headers
+    assert json.loads(gzip.decompress(response.get_data())) == [{"id": number} for number in range(60, 0, -1)]
+
+
+def test_export_jobs_rejects_unknown_format_and_fields(client):
+    assert client.get('/export_jobs?format=csv').status_code == 400
+    assert client.get('/export_jobs?fields=password').status_code == 400
+
+
+def test_stream_jobs_sends_new_jobs(client, db_path, monkeypatch):
+    monkeypatch.setattr(web_app, 'STREAM_POLL_SECONDS', 0.01)
+    assert client.get('/stream/jobs').status_code == 400
+
+    response = client.get('/stream/jobs?after=60')
+    assert response.mimetype == 'text/event-stream'
+    assert response.headers['Cache-Control'] == 'no-cache'
+    events = iter(response.response)
+    assert next(events) == b"retry: 5000\n\n"
+
+    insert_jobs(db_path, [make_job(61)])
+    event = next(events).decode()
+    response.close()
+
+    lines = event.splitlines()
+    assert lines[:2] == ["id: 61", "event: jobs"]
+    assert [job["title"] for job in json.loads(lines[2][len("data: "):])] == ["Engineer 61"]
+
+
+def test_query_jobs_returns_jobs_and_facets(client):
+    response = client.get('/query_jobs?company=TechCorp&per_page=10&page=2')
+
+    assert response.status_code == 200
+    assert response.json["total"] == 60
+    assert [job["id"] for job in response.json["jobs"]] == list(range(50, 40, -1))
+    assert response.json["facets"]["company"] == [{"value": "TechCorp", "count": 60}]
+    assert [facet["count"] for facet in response.json["facets"]["date"]] == [12, 48, 60]
+    assert client.get('/query_jobs?date_from=yesterday').status_code == 400
+
+
+def test_query_jobs_etag_changes_with_the_date(client, monkeypatch):
+    response = client.get('/query_jobs')
+    etag = response.get_etag()[0]
+    assert client.get('/query_jobs', headers={'If-None-Match': f'"{etag}"'}).status_code == 304
+    assert response.last_modified is None
+
+    class Tomorrow(date):
+        @classmethod
+        def today(cls):
+            return date.today() + timedelta(days=1)
+
+    # The date facets count from today, so the cached response is stale once the day changes
+    monkeypatch.setattr(web_app, 'date', Tomorrow)
+    response = client.get('/query_jobs', headers={'If-None-Match': f'"{etag}"'})
+    assert response.status_code == 200
+    assert response.get_etag()[0] != etag
+
+
+def test_create_app_migrates_the_database(tmp_path):
+    # A database left by an older version, without the updated_at column the read routes depend on
+    db_path = str(tmp_path / "old.db")
+    connection = sqlite3.connect(db_path)
+    connection.execute('CREATE TABLE jobs (id INTEGER PRIMARY KEY AUTOINCREMENT, title TEXT, company TEXT, '
+                       'location TEXT, date TEXT, job_url TEXT, job_description TEXT, applied INTEGER, '
+                       'hidden INTEGER, interview INTEGER, rejected INTEGER, min_salary REAL, max_salary INTEGER, '
+                       'date_loaded TEXT)')
+    connection.execute("INSERT INTO jobs (title, company, location, date, job_url, job_description, hidden) "
+                       "VALUES ('Engineer 1', 'TechCorp', 'Denver', '2023-08-25', "
+                       "'https://www.linkedin.com/jobs/view/1/', 'Kafka job 1', 0)")
+    connection.commit()
+    connection.close()
+    config_file = tmp_path / "old_config.json"
+    config_file.write_text(json.dumps({"db_path": db_path, "jobs_tablename": "jobs",
+                                       "filtered_jobs_tablename": "filtered_jobs", "llm_cache": False}))
+
+    client = wsgi.create_app(str(config_file)).test_client()
+
+    response = client.get('/')
+    assert response.status_code == 200
+    assert get_job_ids(response) == [1]
@@ -0,0 +1,104 @@
+from app.components.cache import LRUCache, PersistentCache
+from unittest.mock import patch
+import threading
+import pytest
+
+
+def test_lru_cache_evicts_least_recently_used():
+    cache = LRUCache(max_size=2)
+    cache.set(1, 'one')
+    cache.set(2, 'two')
+
+    assert cache.get(1) == 'one'  # 2 is now the least recently used
+    cache.set(3, 'three')
+
+    assert 2 not in cache
+    assert cache.get(1) == 'one'
+    assert cache.get(3) == 'three'
+    assert len(cache) == 2
+
+
+def test_lru_cache_invalidate():
+    cache = LRUCache()
+    cache.set(1, {'title': 'Software Engineer'})
+
+    cache.invalidate(1)
+    cache.invalidate(2)
+
+    assert cache.get(1) is None
+    assert cache.get(1, 'missing') == 'missing'
+    assert (cache.hits, cache.misses) == (0, 2)
+
+
+def test_persistent_cache_survives_reopening(tmp_path):
+    db_path = str(tmp_path / "cache.db")
+    cache = PersistentCache(db_path)
+    cache.set('prompt', 'reply')
+    cache.close()
+
+    cache = PersistentCache(db_path)
+    assert cache.get('prompt') == 'reply'
+    assert cache.get('other') is None
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_persistent_cache_expires_entries(tmp_path):
+    cache = PersistentCache(str(tmp_path / "cache.db"), ttl_seconds=60)
+    with patch('app.components.cache.time.time', return_value=1000.0):
+        cache.set('prompt', 'reply')
+    with patch('app.components.cache.time.time', return_value=1059.0):
+        assert cache.get('prompt') == 'reply'
+    with patch('app.components.cache.time.time', return_value=1060.0):
+        assert cache.get('prompt') is None
+    assert len(cache) == 0
+
+
+def test_persistent_cache_evicts_least_recently_used_over_max_bytes(tmp_path):
+    cache = PersistentCache(str(tmp_path / "cache.db"), max_bytes=10)
+    for now, key in enumerate(('a', 'b')):
+        with patch('app.components.cache.time.time', return_value=float(now)):
+            cache.set(key, '1234')
+    with patch('app.components.cache.time.time', return_value=2.0):
+        assert cache.get('a') == '1234'  # b is now the least recently used
+    with patch('app.components.cache.time.time', return_value=3.0):
+        cache.set('c', '1234')
+
+    assert cache.get('b') is None
+    assert (cache.get('a'), cache.get('c')) == ('1234', '1234')
+
+
+def test_persistent_cache_coalesces_concurrent_computations(tmp_path):
+    cache = PersistentCache(str(tmp_path / "cache.db"))
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return 'reply'
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get_or_set('prompt', compute)))
+               for _ in range(4)]
+    threads[0].start()
+    started.wait(5)
+    for thread in threads[1:]:
+        thread.start()
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert results == ['reply'] * 4
+    assert len(calls) == 1
+
+
+def test_persistent_cache_does_not_cache_errors(tmp_path):
+    cache = PersistentCache(str(tmp_path / "cache.db"))
+
+    def fail():
+        raise ValueError("OpenAI is down")
+
+    with pytest.raises(ValueError):
+        cache.get_or_set('prompt', fail)
+    assert cache.get_or_set('prompt', lambda: 'reply') == 'reply'
@@ -0,0 +1,47 @@
+import gzip
+import io
+from werkzeug.http import parse_accept_header
+from app.components import compression
+from app.components.compression import Compressor, choose_encoding, compress_body, compress_chunks
+
+
+def test_choose_encoding_honours_q_values():
+    assert choose_encoding(parse_accept_header('gzip, deflate')) == 'gzip'
+    assert choose_encoding(parse_accept_header('gzip;q=0, identity')) is None
+    assert choose_encoding(parse_accept_header('')) is None
+
+
+def test_compress_body_round_trip():
+    data = b'{"title": "Data Engineer"}' * 100
+
+    compressed = compress_body(data, 'gzip')
+    assert len(compressed) < len(data)
+    assert gzip.decompress(compressed) == data
+
+
+def test_compress_chunks_flushes_while_streaming(monkeypatch):
+    monkeypatch.setattr(compression, 'STREAM_FLUSH_SIZE', 100)
+    closed = []
+
+    def rows():
+        try:
+            for i in range(50):
+                yield f'{{"id": {i}}}\n'
+        finally:
+            closed.append(True)
+
+    parts = list(compress_chunks(rows(), 'gzip'))
+    assert len(parts) > 2
+    assert gzip.decompress(b''.join(parts)).decode().splitlines()[-1] == '{"id": 49}'
+
+    stream = compress_chunks(rows(), 'gzip')
+    next(stream)
+    stream.close()
+    assert closed == [True, True]
+
+
+def test_sync_flush_output_is_decodable():
+    compressor = Compressor('gzip')
+    partial = compressor.compress(b'first row\n') + compressor.flush()
+
+    assert gzip.GzipFile(fileobj=io.BytesIO(partial)).read1() == b'first row\n'
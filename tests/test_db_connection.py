@@ -0,0 +1,89 @@
+import pytest
+import sqlite3
+from unittest.mock import patch, MagicMock
+from app.components import db_connection
+
+
+def test_connect_applies_default_settings(tmp_path):
+    connection = db_connection.connect(str(tmp_path / "test.db"))
+
+    assert connection.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    assert connection.execute("PRAGMA synchronous").fetchone()[0] == 1  # NORMAL
+    assert connection.execute("PRAGMA busy_timeout").fetchone()[0] == 5000
+    assert connection.execute("PRAGMA temp_store").fetchone()[0] == 2  # MEMORY
+    assert connection.execute("PRAGMA cache_size").fetchone()[0] == -65536
+    connection.close()
+
+
+def test_connect_with_overrides(tmp_path):
+    settings = {"journal_mode": None, "busy_timeout": 100}
+
+    connection = db_connection.connect(str(tmp_path / "test.db"), settings)
+
+    assert connection.execute("PRAGMA journal_mode").fetchone()[0] == "delete"
+    assert connection.execute("PRAGMA busy_timeout").fetchone()[0] == 100
+    connection.close()
+
+
+@patch('app.components.db_connection.log')
+def test_apply_settings_skips_unknown_and_invalid(mock_log):
+    connection = MagicMock()
+
+    db_connection.apply_settings(connection, {"foreign_keys": "ON", "synchronous": "OFF; DROP TABLE jobs"})
+
+    executed = [call.args[0] for call in connection.execute.call_args_list]
+    assert "PRAGMA foreign_keys = ON" not in executed
+    assert not any("DROP" in statement for statement in executed)
+    assert "PRAGMA journal_mode = WAL" in executed
+    assert mock_log.warning.call_count == 2
+
+
+@patch('sqlite3.connect', side_effect=sqlite3.Error)
+def test_connect_failure(mock_connect):
+    with pytest.raises(sqlite3.Error):
+        db_connection.connect("invalid_db.sqlite")
+
+    mock_connect.assert_called_once_with("invalid_db.sqlite")
+
+
+def test_connect_read_only_rejects_writes(tmp_path):
+    db_path = str(tmp_path / "test db.db")
+    db_connection.connect(db_path).execute("CREATE TABLE jobs (id INTEGER)")
+
+    connection = db_connection.connect_read_only(db_path)
+
+    assert connection.execute("SELECT count(*) FROM jobs").fetchone()[0] == 0
+    with pytest.raises(sqlite3.OperationalError):
+        connection.execute("INSERT INTO jobs VALUES (1)")
+    connection.close()
+
+
+def test_connection_pool_reuses_connections(tmp_path):
+    pool = db_connection.ConnectionPool(str(tmp_path / "test.db"), max_idle=1)
+
+    connection = pool.acquire()
+    connection.execute("CREATE TABLE jobs (id INTEGER)")
+    connection.execute("INSERT INTO jobs VALUES (1)")  # left uncommitted
+    pool.release(connection)
+    second = pool.acquire()
+    third = pool.acquire()
+
+    assert second is connection
+    assert third is not connection
+    assert not second.in_transaction
+    assert second.execute("SELECT count(*) FROM jobs").fetchone()[0] == 0
+    pool.release(second)
+    pool.release(third)  # beyond max_idle, so it is closed
+    assert pool.idle == [second]
+    with pytest.raises(sqlite3.ProgrammingError):
+        third.execute("SELECT 1")
+    pool.close_all()
+
+
+def test_get_pool_is_shared_per_path_and_mode(tmp_path):
+    db_path = str(tmp_path / "test.db")
+
+    pool = db_connection.ConnectionPool.get_pool(db_path)
+
+    assert db_connection.ConnectionPool.get_pool(db_path) is pool
+    assert db_connection.ConnectionPool.get_pool(db_path, read_only=True) is not pool
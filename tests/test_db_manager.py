@@ -1,8 +1,10 @@
 import pytest
 from unittest.mock import patch, MagicMock
 from app.components.db_manager import DB_Manager
+import datetime
 import pandas as pd
 import sqlite3
+import time
 
 
 @pytest.fixture
@@ -17,7 +19,7 @@ def sample_df():
     return pd.DataFrame(data)
 
 
-@patch('sqlite3.connect', return_value=MagicMock)
+@patch('sqlite3.connect', return_value=MagicMock())
 def test_create_connection_success(mock_connect):
     db_manager = DB_Manager()
 
@@ -70,7 +72,7 @@ def test_create_table_success(mock_connection, sample_df):
 
     db_manager.create_table(sample_df, 'jobs_table')
 
-    mock_cursor.execute.assert_called()
+    mock_connection.execute.assert_called()
     mock_connection.commit.assert_called()
 
 
@@ -98,6 +100,296 @@ def test_update_table_with_new_records(sample_df):
     assert 'Data Scientist' in df_existing['title'].values  # Check the new record
 
 
+def test_update_table_ignores_duplicate_records(sample_df):
+    db_manager = DB_Manager()
+    db_manager.create_connection(":memory:")
+    db_manager.create_table(sample_df, 'jobs_table')
+
+    # Same url with a new date, and same title/company/date with a new url, are both duplicates
+    duplicates_df = pd.DataFrame({
+        'title': ['Software Engineer', 'Data Scientist'],
+        'company': ['TechCorp', 'DataCorp'],
+        'date': ['2023-09-01', '2023-08-26'],
+        'job_url': ['https://example.com/job1', 'https://example.com/job3']
+    })
+    db_manager.update_table(duplicates_df, 'jobs_table')
+
+    df_existing = pd.read_sql('SELECT * FROM jobs_table', db_manager.connection)
+    assert len(df_existing) == 2
+
+
+def test_update_table_removes_legacy_duplicates(sample_df):
+    db_manager = DB_Manager()
+    db_manager.create_connection(":memory:")
+    # Simulate a table created before the unique indexes existed
+    pd.concat([sample_df, sample_df]).to_sql('jobs_table', db_manager.connection, index=False)
+    db_manager.connection.execute('ALTER TABLE jobs_table ADD COLUMN id INTEGER')
+    db_manager.connection.execute('UPDATE jobs_table SET id = rowid')
+
+    db_manager.update_table(sample_df, 'jobs_table')
+
+    df_existing = pd.read_sql('SELECT * FROM jobs_table ORDER BY id', db_manager.connection)
+    assert len(df_existing) == 2
+    assert list(df_existing['id']) == [1, 2]
+
+
+def test_insert_records_from_job_dicts_in_chunks(sample_df):
+    db_manager = DB_Manager()
+    db_manager.create_connection(":memory:")
+    db_manager.create_table(sample_df.iloc[0:0], 'jobs_table')
+    jobs = [{'title': f'Engineer {i}', 'company': 'TechCorp', 'date': '2023-08-25',
+             'job_url': f'https://example.com/job{i}'} for i in range(DB_Manager.INSERT_CHUNK_SIZE * 2 + 1)]
+
+    added = db_manager.insert_records(jobs, 'jobs_table')
+    added_again = db_manager.insert_records(jobs, 'jobs_table')
+
+    assert added == len(jobs)
+    assert added_again == 0
+    count = db_manager.connection.execute('SELECT count(*) FROM jobs_table').fetchone()[0]
+    assert count == len(jobs)
+
+
+def test_insert_records_with_differing_fields():
+    db_manager = DB_Manager()
+    db_manager.create_connection(":memory:")
+    jobs = [{'title': 'Engineer 1', 'company': 'TechCorp', 'date': '2023-08-25', 'job_url': 'https://example.com/1'},
+            {'title': 'Engineer 2', 'company': 'TechCorp', 'date': '2023-08-25', 'job_url': 'https://example.com/2',
+             'job_description': 'Build pipelines'}]
+
+    db_manager.create_table(jobs, 'jobs_table')
+
+    assert db_manager.get_job('jobs_table', 2)['job_description'] == 'Build pipelines'
+    assert db_manager.get_job('jobs_table', 1)['job_description'] is None
+
+
+def test_insert_records_empty():
+    db_manager = DB_Manager()
+    db_manager.create_connection(":memory:")
+
+    assert db_manager.insert_records([], 'jobs_table') == 0
+
+
+def test_insert_records_stores_texts_compressed(sample_df):
+    db_manager = DB_Manager()
+    db_manager.create_connection(":memory:")
+    sample_df['job_description'] = ['Write Python', 'Train models']
+    db_manager.create_table(sample_df, 'jobs_table')
+
+    columns = [row[1] for row in db_manager.connection.execute("PRAGMA table_info(jobs_table)")]
+    stored = db_manager.connection.execute(
+        "SELECT job_description FROM jobs_table_texts WHERE job_id = 2").fetchone()[0]
+    job = db_manager.get_job('jobs_table', 2)
+
+    assert 'job_description' not in columns
+    assert isinstance(stored, bytes)
+    assert job['title'] == 'Data Scientist'
+    assert job['job_description'] == 'Train models'
+    assert job['cover_letter'] is None
+
+
+def test_insert_records_with_repeated_job_url():
+    db_manager = DB_Manager()
+    db_manager.create_connection(":memory:")
+    jobs = [{'title': 'Data Engineer', 'company': 'TechCorp', 'date': '2023-08-25', 'job_url': 'https://example.com/1',
+             'job_description': 'first kafka'},
+            {'title': 'Data Engineer II', 'company': 'TechCorp', 'date': '2023-08-25',
+             'job_url': 'https://example.com/1', 'job_description': 'second'}]
+
+    db_manager.create_table(jobs, 'jobs_table')
+
+    assert db_manager.get_job('jobs_table', 1)['job_description'] == 'first kafka'
+    assert db_manager.search_jobs('jobs_table', 'kafka')[0] == 1
+    assert db_manager.search_jobs('jobs_table', 'second') == (0, [])
+
+
+def test_set_job_text(sample_df):
+    db_manager = DB_Manager()
+    db_manager.create_connection(":memory:")
+    db_manager.create_table(sample_df, 'jobs_table')
+
+    db_manager.set_job_text('jobs_table', 1, 'cover_letter', 'Dear hiring manager')
+    db_manager.set_job_text('jobs_table', 1, 'resume', 'My resume')
+
+    texts = db_manager.get_job_texts('jobs_table', 1, ('cover_letter', 'resume'))
+    assert texts == {'cover_letter': 'Dear hiring manager', 'resume': 'My resume'}
+    assert db_manager.get_job('jobs_table', 3) is None
+    with pytest.raises(ValueError):
+        db_manager.set_job_text('jobs_table', 1, 'title', 'New title')
+
+
+def test_set_job_statuses(sample_df):
+    db_manager = DB_Manager()
+    db_manager.create_connection(":memory:")
+    db_manager.create_table(sample_df, 'jobs_table')
+    db_manager.set_job_status('jobs_table', 2, 'hidden')
+
+    updated = db_manager.set_job_statuses('jobs_table', [(1, 'applied', True), (2, 'hidden', False),
+                                                         (1, 'rejected', 1), (1, 'rejected', 0), (3, 'applied', 1)])
+
+    jobs = {job['id']: job for job in db_manager.list_jobs('jobs_table', include_hidden=True)}
+    assert updated == 3
+    assert (jobs[1]['applied'], jobs[1]['rejected'], jobs[2]['hidden']) == (1, 0, 0)
+    with pytest.raises(ValueError):
+        db_manager.set_job_statuses('jobs_table', [(1, 'hidden', 1), (2, 'title', 1)])
+    assert db_manager.get_job('jobs_table', 1)['hidden'] == 0
+
+
+def test_list_jobs_keyset_pages(sample_df):
+    db_manager = DB_Manager()
+    db_manager.create_connection(":memory:")
+    jobs = [{'title': f'Engineer {i}', 'company': 'TechCorp', 'date': '2023-08-25', 'hidden': int(i == 3),
+             'job_url': f'https://example.com/job{i}', 'job_description': f'Description {i}'} for i in range(1, 6)]
+    db_manager.create_table(pd.DataFrame(jobs), 'jobs_table')
+
+    first_page = db_manager.list_jobs('jobs_table', fields=['title'], limit=2)
+    second_page = db_manager.list_jobs('jobs_table', fields=['title'], before_id=first_page[-1]['id'], limit=2)
+
+    assert first_page == [{'id': 5, 'title': 'Engineer 5'}, {'id': 4, 'title': 'Engineer 4'}]
+    assert second_page == [{'id': 2, 'title': 'Engineer 2'}, {'id': 1, 'title': 'Engineer 1'}]
+    assert db_manager.list_jobs('jobs_table', fields=['title'], after_id=2) == \
+        [{'id': 5, 'title': 'Engineer 5'}, {'id': 4, 'title': 'Engineer 4'}]
+    assert len(db_manager.list_jobs('jobs_table', include_hidden=True)) == 5
+    assert 'job_description' not in db_manager.list_jobs('jobs_table')[0]
+    assert db_manager.list_jobs('jobs_table', fields=['job_description'], limit=1) == \
+        [{'id': 5, 'job_description': 'Description 5'}]
+    with pytest.raises(ValueError):
+        db_manager.list_jobs('jobs_table', fields=['title', 'password'])
+
+
+def test_iter_jobs_in_batches(sample_df):
+    db_manager = DB_Manager()
+    db_manager.create_connection(":memory:")
+    jobs = [{'title': f'Engineer {i}', 'company': 'TechCorp', 'date': '2023-08-25', 'hidden': int(i == 3),
+             'job_url': f'https://example.com/job{i}', 'job_description': f'Description {i}'} for i in range(1, 6)]
+    db_manager.create_table(pd.DataFrame(jobs), 'jobs_table')
+
+    assert [job['id'] for job in db_manager.iter_jobs('jobs_table', batch_size=2)] == [5, 4, 2, 1]
+    assert list(db_manager.iter_jobs('jobs_table', include_hidden=True, fields=['job_description'],
+                                     batch_size=2))[2] == {'id': 3, 'job_description': 'Description 3'}
+    with pytest.raises(ValueError):
+        next(db_manager.iter_jobs('jobs_table', fields=['password']))
+
+
+@pytest.fixture
+def facet_db_manager():
+    db_manager = DB_Manager()
+    db_manager.create_connection(":memory:")
+    today = datetime.date.today()
+    jobs = [{'title': f'Engineer {i}', 'company': company, 'location': location, 'job_url': f'https://example.com/{i}',
+             'date': (today - datetime.timedelta(days=age)).isoformat(), 'min_salary': salary // 2,
+             'max_salary': salary, 'applied': applied, 'hidden': hidden}
+            for i, (company, location, age, salary, applied, hidden) in enumerate([
+                ('TechCorp', 'Remote', 0, 160000, 1, 0),
+                ('TechCorp', 'Denver', 3, 0, 0, 0),
+                ('DataCorp', 'Remote', 10, 120000, 0, 0),
+                ('DataCorp', 'Remote', 40, 90000, 0, 1),
+                ('WebCorp', 'Boston', 2, 210000, 0, 0)], start=1)]
+    db_manager.create_table(jobs, 'jobs')
+    return db_manager
+
+
+def test_query_jobs_filters_and_sorts(facet_db_manager):
+    total, jobs, _ = facet_db_manager.query_jobs('jobs', {'location': ['Remote']}, fields=['title'])
+    assert total == 2
+    assert jobs == [{'id': 3, 'title': 'Engineer 3'}, {'id': 1, 'title': 'Engineer 1'}]
+
+    filters = {'company': ['TechCorp', 'WebCorp'], 'salary_min': 150000}
+    assert [job['id'] for job in facet_db_manager.query_jobs('jobs', filters, sort='salary')[1]] == [5, 1]
+    assert [job['id'] for job in facet_db_manager.query_jobs('jobs', {'status': ['new']}, sort='posted')[1]] == \
+        [5, 2, 3]
+    assert facet_db_manager.query_jobs('jobs', {'status': ['hidden']})[0] == 1
+    assert facet_db_manager.query_jobs('jobs', include_hidden=True)[0] == 5
+    assert facet_db_manager.query_jobs('jobs', {'salary_max': 70000})[0] == 1
+    date_from = (datetime.date.today() - datetime.timedelta(days=5)).isoformat()
+    total, jobs, _ = facet_db_manager.query_jobs('jobs', {'date_from': date_from}, limit=1, offset=1)
+    assert total == 3 and jobs[0]['id'] == 2
+    with pytest.raises(ValueError):
+        facet_db_manager.query_jobs('jobs', sort='title')
+    with pytest.raises(ValueError):
+        facet_db_manager.query_jobs('jobs', {'status': ['archived']})
+
+
+def test_query_jobs_facet_counts(facet_db_manager):
+    _, _, facets = facet_db_manager.query_jobs('jobs', {'company': ['TechCorp']})
+
+    # A facet's own selection doesn't narrow its counts, the other facets' selections do
+    assert facets['company'] == [{'value': 'TechCorp', 'count': 2}, {'value': 'DataCorp', 'count': 1},
+                                 {'value': 'WebCorp', 'count': 1}]
+    assert facets['location'] == [{'value': 'Denver', 'count': 1}, {'value': 'Remote', 'count': 1}]
+    assert facets['status'] == {'new': 1, 'applied': 1, 'interview': 0, 'rejected': 0, 'hidden': 0}
+    assert [bucket['count'] for bucket in facets['salary']] == [1, 0, 0, 0, 1, 0]
+    assert facets['salary'][0] == {'min': 0, 'max': 1, 'count': 1}
+    assert [(bucket['days'], bucket['count']) for bucket in facets['date']] == [(1, 1), (7, 2), (30, 2)]
+
+    _, _, facets = facet_db_manager.query_jobs('jobs', {'location': ['Remote']})
+    assert facets['status']['hidden'] == 1
+    assert facets['company'] == [{'value': 'DataCorp', 'count': 1}, {'value': 'TechCorp', 'count': 1}]
+
+
+def test_query_jobs_uses_facet_indexes(facet_db_manager):
+    plan = facet_db_manager.connection.execute(
+        'EXPLAIN QUERY PLAN SELECT company, count(*) FROM jobs WHERE hidden = 0 GROUP BY company').fetchall()
+    assert 'idx_jobs_hidden_company' in plan[0][3]
+
+
+def test_get_change_marker(sample_df, tmp_path):
+    db_path = str(tmp_path / "test.db")
+    db_manager = DB_Manager()
+    db_manager.create_connection(db_path)
+    db_manager.create_table(sample_df, 'jobs_table')
+    reader = DB_Manager()
+    reader.create_connection(db_path)
+
+    created = reader.get_change_marker('jobs_table')
+    assert created[:2] == (2, 2)
+    assert created[2] is not None
+    assert reader.get_change_marker('jobs_table') == created
+
+    # updated_at has millisecond resolution
+    time.sleep(0.002)
+    db_manager.set_job_status('jobs_table', 1, 'applied')
+    applied = reader.get_change_marker('jobs_table')
+    time.sleep(0.002)
+    db_manager.set_job_text('jobs_table', 1, 'cover_letter', 'Dear hiring manager')
+    written = reader.get_change_marker('jobs_table')
+    db_manager.connection.execute('DELETE FROM jobs_table WHERE id = 2')
+    db_manager.connection.commit()
+
+    assert applied[2] > created[2]
+    assert written[2] > applied[2]
+    assert reader.get_change_marker('jobs_table')[:2] == (1, 1)
+
+
+def test_search_jobs(sample_df):
+    db_manager = DB_Manager()
+    db_manager.create_connection(":memory:")
+    sample_df['job_description'] = ['Build Kafka pipelines', 'Train models with Python']
+    sample_df['hidden'] = [0, 0]
+    db_manager.create_table(sample_df, 'jobs_table')
+
+    total, jobs = db_manager.search_jobs('jobs_table', 'kafka')
+    assert total == 1
+    assert jobs[0]['title'] == 'Software Engineer'
+    assert 'job_description' not in jobs[0]
+
+    # Every word has to match, in any of the indexed columns
+    assert db_manager.search_jobs('jobs_table', 'python datacorp')[0] == 1
+    assert db_manager.search_jobs('jobs_table', 'python techcorp')[0] == 0
+
+    db_manager.connection.execute("UPDATE jobs_table SET hidden = 1 WHERE title = 'Software Engineer'")
+    assert db_manager.search_jobs('jobs_table', 'kafka')[0] == 0
+    assert db_manager.search_jobs('jobs_table', 'kafka', include_hidden=True)[0] == 1
+
+
+def test_search_jobs_escapes_query_syntax(sample_df):
+    db_manager = DB_Manager()
+    db_manager.create_connection(":memory:")
+    db_manager.create_table(sample_df, 'jobs_table')
+
+    assert db_manager.search_jobs('jobs_table', 'engineer OR "NEAR(') == (0, [])
+    assert db_manager.search_jobs('jobs_table', '   ') == (0, [])
+
+
 @patch('app.components.db_manager.sqlite3.Connection')
 def test_find_new_jobs(mock_connection, sample_df):
     db_manager = DB_Manager()
@@ -114,17 +406,29 @@ def test_find_new_jobs(mock_connection, sample_df):
     assert len(new_jobs) == len(sample_df)
 
 
+def test_find_new_jobs_with_existing_tables(sample_df):
+    db_manager = DB_Manager()
+    db_manager.create_connection(":memory:")
+    db_manager.create_table(sample_df.iloc[[0]], 'jobs_table')
+    db_manager.create_table(sample_df.iloc[[1]], 'filtered_jobs_table')
+    config = {
+        'jobs_tablename': 'jobs_table',
+        'filtered_jobs_tablename': 'filtered_jobs_table'
+    }
+    new_job = {'title': 'Backend Engineer', 'company': 'TechCorp', 'date': '2023-08-27',
+               'job_url': 'https://www.linkedin.com/jobs/view/3/'}
+
+    new_jobs = db_manager.find_new_jobs(sample_df.to_dict('records') + [new_job], config)
+
+    assert new_jobs == [new_job]
+
+
 @patch('app.components.db_manager.sqlite3.Connection')
 def test_job_exists_true(mock_connection, sample_df):
     db_manager = DB_Manager()
     db_manager.connection = mock_connection
 
-    existing_df = pd.DataFrame({
-        'title': ['Software Engineer'],
-        'company': ['TechCorp'],
-        'date': ['2023-08-25'],
-        'job_url': ['https://example.com/job1']
-    })
+    existing_keys = (set(), set(), {('Software Engineer', 'TechCorp', '2023-08-25')})
 
     job = {
         'title': 'Software Engineer',
@@ -133,22 +437,30 @@ def test_job_exists_true(mock_connection, sample_df):
         'job_url': 'https://example.com/job1'
     }
 
-    result = db_manager.job_exists(existing_df, job)
+    result = db_manager.job_exists(existing_keys, job)
 
     assert result is True
 
 
+def test_job_exists_by_posting_id():
+    db_manager = DB_Manager()
+    existing_keys = ({1234567890}, set(), set())
+    job = {
+        'title': 'Software Engineer',
+        'company': 'TechCorp',
+        'date': '2023-09-01',
+        'job_url': 'https://www.linkedin.com/jobs/view/1234567890/'
+    }
+
+    assert db_manager.job_exists(existing_keys, job) is True
+
+
 @patch('app.components.db_manager.sqlite3.Connection')
 def test_job_exists_false(mock_connection, sample_df):
     db_manager = DB_Manager()
     db_manager.connection = mock_connection
 
-    existing_df = pd.DataFrame({
-        'title': ['Data Scientist'],
-        'company': ['DataCorp'],
-        'date': ['2023-08-26'],
-        'job_url': ['https://example.com/job2']
-    })
+    existing_keys = ({2}, {'https://example.com/job2'}, {('Data Scientist', 'DataCorp', '2023-08-26')})
 
     job = {
         'title': 'Software Engineer',
@@ -157,6 +469,6 @@ def test_job_exists_false(mock_connection, sample_df):
         'job_url': 'https://example.com/job1'
     }
 
-    result = db_manager.job_exists(existing_df, job)
+    result = db_manager.job_exists(existing_keys, job)
 
     assert result is False
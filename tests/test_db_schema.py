@@ -0,0 +1,96 @@
+import pandas as pd
+import sqlite3
+from app.components import db_schema
+
+
+def create_legacy_table(connection):
+    # Table as created by the old pandas dtype based create_table
+    connection.execute('CREATE TABLE jobs (id INTEGER PRIMARY KEY AUTOINCREMENT, title TEXT, company TEXT, '
+                       'location TEXT, date TEXT, job_url TEXT, job_description TEXT, applied INTEGER, '
+                       'hidden INTEGER, interview INTEGER, rejected INTEGER, min_salary REAL, max_salary INTEGER, '
+                       'date_loaded TEXT)')
+    connection.executemany(
+        'INSERT INTO jobs (title, company, location, date, job_url, job_description, applied, hidden, interview, '
+        'rejected, min_salary, max_salary, date_loaded) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+        [('Software Engineer', 'TechCorp', 'Denver', '2023-08-25', 'https://www.linkedin.com/jobs/view/111/',
+          'desc', 1, 0, 0, 0, 90000.0, 120000, '2023-08-25 10:00:00'),
+         ('Data Scientist', 'DataCorp', None, '2023-08-26', 'https://www.linkedin.com/jobs/view/222/',
+          'desc', None, 0, 0, 0, None, None, '2023-08-26 10:00:00'),
+         ('Software Engineer', 'TechCorp', 'Denver', '2023-08-25', 'https://www.linkedin.com/jobs/view/333/',
+          'desc', 0, 0, 0, 0, 0, 0, '2023-08-27 10:00:00')])
+    connection.commit()
+
+
+def test_parse_posting_id():
+    assert db_schema.parse_posting_id('https://www.linkedin.com/jobs/view/1234567890/') == 1234567890
+    assert db_schema.parse_posting_id('https://www.linkedin.com/jobs/view/python-dev-at-acme-42') == 42
+    assert db_schema.parse_posting_id('https://example.com/job1') is None
+    assert db_schema.parse_posting_id(None) is None
+
+
+def test_compress_text_round_trip():
+    text = 'Equal opportunity employer. ' * 100
+
+    compressed = db_schema.compress_text(text)
+
+    assert len(compressed) < len(text)
+    assert db_schema.decompress_text(compressed) == text
+    assert db_schema.compress_text(None) is None
+    assert db_schema.decompress_text(None) is None
+
+
+def test_ensure_schema_creates_new_table():
+    connection = sqlite3.connect(':memory:')
+
+    previous_version = db_schema.ensure_schema(connection, 'jobs')
+
+    assert previous_version == 0
+    assert db_schema.get_version(connection, 'jobs') == db_schema.SCHEMA_VERSION
+    assert db_schema.get_columns(connection, 'jobs') == list(db_schema.JOB_COLUMNS)
+    assert db_schema.get_columns(connection, 'jobs_texts') == ['job_id', *db_schema.TEXT_COLUMNS]
+    indexes = {row[1] for row in connection.execute("PRAGMA index_list(jobs)")}
+    assert {f'idx_jobs_{suffix}' for suffix, _, _ in db_schema.JOB_INDEXES} <= indexes
+
+
+def test_ensure_schema_migrates_legacy_table():
+    connection = sqlite3.connect(':memory:')
+    create_legacy_table(connection)
+
+    db_schema.ensure_schema(connection, 'jobs')
+
+    df = pd.read_sql('SELECT * FROM jobs ORDER BY id', connection)
+    assert list(df.columns) == list(db_schema.JOB_COLUMNS)
+    # The third row duplicates the first by title, company and date
+    assert list(df['id']) == [1, 2]
+    assert list(df['posting_id']) == [111, 222]
+    assert list(df['applied']) == [1, 0]
+    assert list(df['min_salary']) == [90000, 0]
+    assert df['location'][1] == ''
+    texts = connection.execute('SELECT job_id, job_description, cover_letter FROM jobs_texts ORDER BY job_id').fetchall()
+    assert [(job_id, db_schema.decompress_text(description), cover_letter)
+            for job_id, description, cover_letter in texts] == [(1, 'desc', None), (2, 'desc', None)]
+    assert db_schema.get_version(connection, 'jobs') == db_schema.SCHEMA_VERSION
+    matches = connection.execute("SELECT rowid FROM jobs_search WHERE jobs_search MATCH 'datacorp'").fetchall()
+    assert matches == [(2,)]
+    plan = connection.execute("EXPLAIN QUERY PLAN SELECT id FROM jobs WHERE posting_id = 111").fetchall()
+    assert 'idx_jobs_posting_id' in plan[0][3]
+
+
+def test_ensure_schema_adds_facet_indexes_to_version_4_table():
+    connection = sqlite3.connect(':memory:')
+    db_schema.ensure_schema(connection, 'jobs')
+    connection.execute('DROP INDEX idx_jobs_hidden_company')
+    connection.execute("UPDATE schema_versions SET version = 4 WHERE table_name = 'jobs'")
+
+    assert db_schema.ensure_schema(connection, 'jobs') == 4
+    indexes = {row[1] for row in connection.execute("PRAGMA index_list(jobs)")}
+    assert 'idx_jobs_hidden_company' in indexes
+
+
+def test_ensure_schema_is_noop_when_current():
+    connection = sqlite3.connect(':memory:')
+    db_schema.ensure_schema(connection, 'jobs')
+
+    previous_version = db_schema.ensure_schema(connection, 'jobs')
+
+    assert previous_version == db_schema.SCHEMA_VERSION
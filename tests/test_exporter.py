@@ -0,0 +1,46 @@
+import os
+from datetime import datetime
+import pandas as pd
+import pyarrow.parquet as pq
+from app.components import exporter
+
+sample_jobs = [
+    {"posting_id": 111, "title": "Software Engineer", "company": "TechCorp", "location": "Denver",
+     "date": "2023-08-25", "job_url": "https://www.linkedin.com/jobs/view/111/", "job_description": "desc",
+     "applied": 0, "hidden": 0, "interview": 0, "rejected": 0, "min_salary": 90000.0, "max_salary": 0},
+    {"title": "Data Scientist", "company": "DataCorp", "date": "2023-08-26",
+     "job_url": "https://www.linkedin.com/jobs/view/222/", "min_salary": float("nan")}
+]
+
+
+def test_export_jobs_writes_partitioned_parquet(tmp_path):
+    loaded_at = datetime(2023, 8, 26, 9, 30)
+
+    file_path = exporter.export_jobs(sample_jobs, "linkedin_jobs", str(tmp_path), loaded_at)
+
+    assert os.path.dirname(file_path) == str(tmp_path / "linkedin_jobs" / "date_loaded=2023-08-26")
+    table = pq.read_table(file_path)
+    assert table.schema == exporter.get_export_schema()
+    assert table.column("min_salary").to_pylist() == [90000, None]
+    assert table.column("posting_id").to_pylist() == [111, None]
+    assert table.column("loaded_at").to_pylist() == [loaded_at, loaded_at]
+
+
+def test_export_jobs_without_jobs(tmp_path):
+    assert exporter.export_jobs([], "linkedin_jobs", str(tmp_path), datetime.now()) is None
+    assert not os.listdir(tmp_path)
+
+
+def test_compact_exports_merges_partition_files(tmp_path):
+    for hour in (9, 10, 11):
+        exporter.export_jobs(sample_jobs, "linkedin_jobs", str(tmp_path), datetime(2023, 8, 26, hour))
+    exporter.export_jobs(sample_jobs, "linkedin_jobs", str(tmp_path), datetime(2023, 8, 27, 9))
+
+    assert exporter.compact_exports(str(tmp_path)) == 1
+
+    assert len(os.listdir(tmp_path / "linkedin_jobs" / "date_loaded=2023-08-26")) == 1
+    assert len(os.listdir(tmp_path / "linkedin_jobs" / "date_loaded=2023-08-27")) == 1
+    # Partition pruning still works on the compacted dataset
+    df = pd.read_parquet(tmp_path / "linkedin_jobs", filters=[("date_loaded", "=", "2023-08-26")])
+    assert len(df) == 6
+    assert df["loaded_at"].is_monotonic_increasing
@@ -0,0 +1,31 @@
+import pytest
+from app.components.file_utils import replace_file
+
+
+def write_text(text):
+    def write(temporary_path):
+        with open(temporary_path, 'w') as f:
+            f.write(text)
+    return write
+
+
+def test_replace_file(tmp_path):
+    file_path = str(tmp_path / "cache.json")
+
+    replace_file(file_path, write_text("first"))
+    replace_file(file_path, write_text("second"))
+
+    assert open(file_path).read() == "second"
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["cache.json"]
+
+
+def test_replace_file_keeps_old_file_when_writing_fails(tmp_path):
+    file_path = str(tmp_path / "cache.json")
+    replace_file(file_path, write_text("first"))
+
+    def fail(temporary_path):
+        raise OSError("disk full")
+
+    with pytest.raises(OSError):
+        replace_file(file_path, fail)
+    assert open(file_path).read() == "first"
@@ -0,0 +1,94 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import time
+import threading
+import pytest
+from app.components.cache import PersistentCache
+from app.components.generator import (GenerationError, RateLimiter, generate_cover_letter, generate_resume,
+                                      get_openai_settings)
+
+job = {'title': 'Data Engineer', 'company': 'TechCorp', 'job_description': 'Build Kafka pipelines'}
+
+
+class StubLLMHandler(BaseHTTPRequestHandler):
+    # Answers chat completions like the OpenAI API, replying with the model and the prompt's length
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        self.server.requests.append(body)
+        if self.server.fail:
+            self.send_response(500)
+            self.end_headers()
+            return
+        content = f"{body['model']}:{len(body['messages'][0]['content'])}"
+        reply = json.dumps({"id": "chatcmpl-1", "object": "chat.completion", "created": 0, "model": body['model'],
+                            "choices": [{"index": 0, "finish_reason": "stop",
+                                         "message": {"role": "assistant", "content": content}}]}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(reply)))
+        self.end_headers()
+        self.wfile.write(reply)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def stub_llm(monkeypatch):
+    monkeypatch.setenv('NO_PROXY', '127.0.0.1')
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubLLMHandler)
+    server.requests = []
+    server.fail = False
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def settings(stub_llm):
+    return get_openai_settings({"OpenAI_API_KEY": "test-key", "OpenAI_Model": "gpt-4",
+                                "OpenAI_API_BASE": f"http://127.0.0.1:{stub_llm.server_port}/v1"})
+
+
+def test_generate_cover_letter_revises_draft(stub_llm, settings):
+    cover_letter = generate_cover_letter(job, "My resume", settings)
+
+    draft, revision = [request['messages'][0]['content'] for request in stub_llm.requests]
+    assert [request['model'] for request in stub_llm.requests] == ['gpt-4', 'gpt-4']
+    assert 'Build Kafka pipelines' in draft and 'My resume' in draft
+    assert f"cover letter I got so far: gpt-4:{len(draft)}" in revision
+    assert cover_letter == f"gpt-4:{len(revision)}"
+
+
+def test_generate_resume_uses_resume_model(stub_llm, settings):
+    resume = generate_resume(job, "My resume", settings)
+
+    assert resume.startswith('gpt-3.5-turbo:')
+    assert 'Data Engineer at TechCorp' in stub_llm.requests[0]['messages'][0]['content']
+
+
+def test_generate_raises_generation_error(stub_llm, settings):
+    stub_llm.fail = True
+    with pytest.raises(GenerationError):
+        generate_cover_letter(job, "My resume", settings)
+
+
+def test_generate_with_cache_reuses_replies(stub_llm, settings, tmp_path):
+    settings["cache"] = PersistentCache(str(tmp_path / "llm_cache.db"))
+    first = generate_cover_letter(job, "My resume", settings)
+    generate_cover_letter(dict(job, title='Data Engineer II'), "My resume", settings)
+    again = generate_cover_letter(job, "My resume", settings)
+
+    assert again == first
+    assert len(stub_llm.requests) == 4
+    assert settings["cache"].hits == 2
+
+
+def test_rate_limiter_spaces_requests():
+    rate_limiter = RateLimiter(requests_per_minute=600)
+    start = time.monotonic()
+    for _ in range(3):
+        rate_limiter.wait()
+
+    assert time.monotonic() - start >= 0.2
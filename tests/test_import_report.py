@@ -0,0 +1,28 @@
+import os
+from app.components.import_report import get_total, measure_imports, measure_statement
+
+APP_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), '../app'))
+
+
+def test_measure_imports_of_a_module():
+    interpreter_modules = {entry[0] for entry in measure_imports("pass", APP_PATH)}
+    entries = measure_imports("import json", APP_PATH, interpreter_modules)
+
+    modules = {module: depth for module, _, _, depth in entries}
+    assert modules["json"] == 0
+    assert modules["json.decoder"] > 0
+    assert get_total(entries) > 0
+    assert measure_imports("import not_a_module", APP_PATH) is None
+
+
+def test_main_imports_without_heavy_dependencies():
+    entries = measure_imports("import main", APP_PATH)
+
+    modules = {module for module, _, _, _ in entries}
+    assert "components.job_processor" in modules
+    assert not modules & {"pandas", "bs4", "langdetect", "pyarrow", "openai", "pdfminer"}
+
+
+def test_measure_statement():
+    assert measure_statement("sum(range(10))", "import math", APP_PATH) >= 0
+    assert measure_statement("1 / 0", "pass", APP_PATH) is None
@@ -75,7 +75,7 @@ def test_get_path_local(sample_config_file):
 
 @patch('app.main.log')
 @patch('app.main.process_jobs')
-@patch('app.main.DB_Manager')
+@patch('app.main.create_db_manager')
 @patch('app.main.get_path', return_value="data/test_db.db")
 @patch('app.main.load_config', return_value=sample_config)
 @patch('app.main.JobProcessor.get_jobcards', return_value=sample_jobs)
@@ -90,7 +90,7 @@ def test_start_with_jobs_found(mock_get_jobcards, mock_load_config, mock_get_pat
     mock_load_config.assert_called_once_with("config.json")
     mock_get_jobcards.assert_called_once_with(sample_config)
     mock_get_path.assert_called_once_with(sample_config["db_path"])
-    mock_db_manager_instance.create_connection.assert_called_once_with("data/test_db.db")
+    mock_db_manager.assert_called_once_with(sample_config, "data/test_db.db")
     mock_db_manager_instance.find_new_jobs.assert_called_once_with(sample_jobs, sample_config)
     mock_process_jobs.assert_called_once_with(sample_jobs, sample_config, mock_db_manager_instance)
     mock_db_manager_instance.close.assert_called_once()
@@ -98,7 +98,7 @@ def test_start_with_jobs_found(mock_get_jobcards, mock_load_config, mock_get_pat
 
 
 @patch('app.main.log')
-@patch('app.main.DB_Manager')
+@patch('app.main.create_db_manager')
 @patch('app.main.get_path', return_value="data/test_db.db")
 @patch('app.main.load_config', return_value=sample_config)
 @patch('app.main.JobProcessor.get_jobcards', return_value=[])
@@ -113,47 +113,69 @@ def test_start_with_no_jobs_found(mock_get_jobcards, mock_load_config, mock_get_
     mock_load_config.assert_called_once_with("config.json")
     mock_get_jobcards.assert_called_once_with(sample_config)
     mock_get_path.assert_called_once_with(sample_config["db_path"])
-    mock_db_manager_instance.create_connection.assert_called_once_with("data/test_db.db")
+    mock_db_manager.assert_called_once_with(sample_config, "data/test_db.db")
     mock_db_manager_instance.find_new_jobs.assert_called_once_with([], sample_config)
     mock_log.info.assert_any_call("No jobs found")
     mock_db_manager_instance.close.assert_called_once()
 
 
 @patch('app.main.log')
-@patch('app.main.get_path', side_effect=["data/linkedin_jobs.csv", "data/linkedin_jobs_filtered.csv"])
+@patch('app.main.export_jobs')
+@patch('app.main.get_path', return_value="data/exports")
 @patch('app.main.create_update_job_tables')
-@patch('app.main.pd.DataFrame')
-@patch('app.main.JobProcessor.remove_irrelevant_jobs_by_max_salary', return_value=sample_jobs)
+@patch('app.main.JobProcessor.remove_irrelevant_jobs_by_max_salary', return_value=sample_jobs[:1])
 @patch('app.main.JobProcessor.remove_irrelevant_jobs_by_descriptions', return_value=sample_jobs)
 @patch('app.main.JobProcessor.add_job_descriptions', return_value=sample_jobs)
 def test_process_jobs(mock_add_job_descriptions, mock_remove_irrelevant_jobs_by_descriptions,
-                      mock_remove_irrelevant_jobs_by_max_salary, mock_dataframe, mock_create_update_job_tables,
-                      mock_get_path, mock_log):
-    # Create mock DataFrames and .to_csv for the DataFrame and csv operations
-    mock_df = MagicMock()
-    mock_df.to_csv = MagicMock()
-    mock_dataframe.return_value = mock_df
+                      mock_remove_irrelevant_jobs_by_max_salary, mock_create_update_job_tables,
+                      mock_get_path, mock_export_jobs, mock_log):
+    db_manager = MagicMock()
 
-    main.process_jobs(sample_jobs, sample_config, MagicMock())
+    main.process_jobs(sample_jobs, sample_config, db_manager)
 
     # Check if the expected functions were called
     mock_add_job_descriptions.assert_called_once_with(sample_jobs, sample_config)
     mock_remove_irrelevant_jobs_by_descriptions.assert_called_once_with(sample_jobs, sample_config)
     mock_remove_irrelevant_jobs_by_max_salary.assert_called_once_with(sample_jobs, sample_config)
 
-    # Check if DataFrame operations were performed
-    mock_dataframe.assert_any_call(sample_jobs)
-    assert mock_df['date_loaded'].astype.call_count == 2
+    # Check if the job dicts were stamped with the load time, without modifying the scraped jobs
+    _, jobs, jobs_filtered, jobs_tablename, filtered_jobs_tablename = mock_create_update_job_tables.call_args[0]
+    assert [job['title'] for job in jobs] == ["Software Engineer"]
+    assert [job['title'] for job in jobs_filtered] == ["Data Scientist"]
+    assert jobs[0]['date_loaded'] == jobs_filtered[0]['date_loaded']
+    assert 'date_loaded' not in sample_jobs[0]
+    assert (jobs_tablename, filtered_jobs_tablename) == ("jobs_table", "filtered_jobs_table")
+
+    # Check if the exports were written
+    mock_get_path.assert_called_once_with("data/exports")
+    assert mock_export_jobs.call_count == 2
+    jobs, dataset, export_path, _ = mock_export_jobs.call_args_list[0][0]
+    assert (jobs, dataset, export_path) == (sample_jobs[:1], "linkedin_jobs", "data/exports")
+    assert mock_export_jobs.call_args_list[1][0][1] == "linkedin_jobs_filtered"
 
-    # Check if files were written
-    mock_df.to_csv.assert_any_call("data/linkedin_jobs.csv", mode='a', index=False, encoding='utf-8')
-    mock_df.to_csv.assert_any_call("data/linkedin_jobs_filtered.csv", mode='a', index=False, encoding='utf-8')
+    # Check if logging was done
+    mock_log.info.assert_any_call("Total jobs to add after filtering: 1")
 
-    # Check if the create_update_job_tables was called correctly
-    mock_create_update_job_tables.assert_called_once()
 
-    # Check if logging was done
-    mock_log.info.assert_any_call(f"Total jobs to add after filtering: {len(sample_jobs)}")
+@patch('app.main.pregenerate_documents')
+@patch('app.main.export_jobs')
+@patch('app.main.get_path', side_effect=lambda path: f"/app/{path}")
+@patch('app.main.create_update_job_tables')
+@patch('app.main.JobProcessor.remove_irrelevant_jobs_by_max_salary', return_value=sample_jobs)
+@patch('app.main.JobProcessor.remove_irrelevant_jobs_by_descriptions', return_value=sample_jobs)
+@patch('app.main.JobProcessor.add_job_descriptions', return_value=sample_jobs)
+def test_process_jobs_pregenerates_documents(mock_add_job_descriptions, mock_remove_irrelevant_jobs_by_descriptions,
+                                             mock_remove_irrelevant_jobs_by_max_salary, mock_create_update_job_tables,
+                                             mock_get_path, mock_export_jobs, mock_pregenerate_documents):
+    config = {**sample_config, "resume_path": "data/resume.pdf", "pregeneration": {"top_n": 3}}
+    db_manager = MagicMock()
+
+    main.process_jobs(sample_jobs, config, db_manager)
+
+    args = mock_pregenerate_documents.call_args[0]
+    assert args[:3] == (db_manager, config, "jobs_table")
+    assert args[3] == mock_create_update_job_tables.call_args[0][1][0]['date_loaded']
+    assert args[4] == "/app/data/resume.pdf"
 
 
 @patch('app.main.log')
@@ -231,7 +253,8 @@ def mock_args(config_file="data/config.json", reset_vpn=False):
 def test_run_without_vpn_reset(mock_reset_vpn, mock_start, mock_log):
     with patch('argparse.ArgumentParser.parse_args') as mock_parse_args:
         # Mock the parsed arguments
-        mock_parse_args.return_value = argparse.Namespace(config_file="data/config.json", reset_vpn=False)
+        mock_parse_args.return_value = argparse.Namespace(config_file="data/config.json", reset_vpn=False,
+                                                          compact_exports=False, import_report=False)
 
         main.main()
 
@@ -254,7 +277,8 @@ def test_main_with_vpn_reset(mock_reset_vpn, mock_log, mock_start):
     # Call the entry point of the script
     with patch('argparse.ArgumentParser.parse_args') as mock_parse_args:
         # Mock the parsed arguments
-        mock_parse_args.return_value = argparse.Namespace(config_file="data/config.json", reset_vpn=True)
+        mock_parse_args.return_value = argparse.Namespace(config_file="data/config.json", reset_vpn=True,
+                                                          compact_exports=False, import_report=False)
 
         main.main()
 
@@ -275,7 +299,8 @@ def test_main_vpn_reset_fails(mock_reset_vpn, mock_log, mock_start):
 
     with patch('argparse.ArgumentParser.parse_args') as mock_parse_args:
         # Mock the parsed arguments
-        mock_parse_args.return_value = argparse.Namespace(config_file="data/config.json", reset_vpn=True)
+        mock_parse_args.return_value = argparse.Namespace(config_file="data/config.json", reset_vpn=True,
+                                                          compact_exports=False, import_report=False)
 
         main.main()
 
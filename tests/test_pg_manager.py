@@ -0,0 +1,93 @@
+import os
+import pandas as pd
+import pytest
+from app.components.pg_manager import PG_Manager, psycopg2
+
+# These tests need a PostgreSQL server to write to, e.g. PG_TEST_DSN="host=localhost user=postgres dbname=postgres"
+PG_TEST_DSN = os.environ.get("PG_TEST_DSN")
+pytestmark = pytest.mark.skipif(psycopg2 is None or not PG_TEST_DSN, reason="requires psycopg2 and PG_TEST_DSN")
+
+TABLE_NAME = "test_pg_jobs"
+sample_jobs = [
+    {"title": "Python Developer", "company": "Acme", "location": "Remote", "date": "2024-01-01",
+     "job_url": "https://www.linkedin.com/jobs/view/123/", "job_description": 'Build "python", APIs\nwith Kafka',
+     "applied": 0, "hidden": 0, "interview": 0, "rejected": 0, "min_salary": float("nan"), "max_salary": 100000,
+     "date_loaded": "2024-01-02 10:00:00"},
+    {"title": "Java Developer", "company": "Beta", "location": "Denver", "date": "2024-01-01",
+     "job_url": "https://www.linkedin.com/jobs/view/124/", "job_description": "Java services",
+     "applied": 0, "hidden": 0, "interview": 0, "rejected": 0, "min_salary": 1, "max_salary": 2,
+     "date_loaded": "2024-01-02 10:00:00"}
+]
+
+
+@pytest.fixture
+def db_manager():
+    db_manager = PG_Manager()
+    db_manager.create_connection({"dsn": PG_TEST_DSN})
+    cursor = db_manager.connection.cursor()
+    for table_name in (TABLE_NAME, f"{TABLE_NAME}_texts", f"{TABLE_NAME}_search"):
+        cursor.execute(f'DROP TABLE IF EXISTS "{table_name}"')
+    if db_manager.table_exists("schema_versions"):
+        cursor.execute("DELETE FROM schema_versions WHERE table_name = %s", (TABLE_NAME,))
+    db_manager.connection.commit()
+    yield db_manager
+    db_manager.close()
+
+
+def test_insert_records_skips_duplicates(db_manager):
+    db_manager.create_table(pd.DataFrame(sample_jobs), TABLE_NAME)
+
+    assert db_manager.insert_records(sample_jobs + [dict(sample_jobs[0], title="Repost")], TABLE_NAME) == 0
+    jobs = db_manager.list_jobs(TABLE_NAME)
+    assert [job["title"] for job in jobs] == ["Java Developer", "Python Developer"]
+    assert jobs[1]["posting_id"] == 123
+    assert jobs[1]["min_salary"] == 0
+    assert jobs[1]["date"] == "2024-01-01"
+
+
+def test_iter_jobs_server_side_cursor(db_manager):
+    db_manager.create_table(pd.DataFrame(sample_jobs), TABLE_NAME)
+
+    jobs = list(db_manager.iter_jobs(TABLE_NAME, fields=["title", "date", "job_description"], batch_size=1))
+    assert [job["title"] for job in jobs] == ["Java Developer", "Python Developer"]
+    assert jobs[1]["date"] == "2024-01-01"
+    assert jobs[1]["job_description"] == sample_jobs[0]["job_description"]
+
+
+def test_query_jobs_with_facets(db_manager):
+    db_manager.create_table(pd.DataFrame(sample_jobs), TABLE_NAME)
+
+    total, jobs, facets = db_manager.query_jobs(TABLE_NAME, {"location": ["Remote"], "date_from": "2024-01-01"},
+                                                sort="salary", fields=["title", "date"])
+    assert total == 1
+    assert jobs[0]["title"] == "Python Developer" and jobs[0]["date"] == "2024-01-01"
+    assert facets["location"] == [{"value": "Denver", "count": 1}, {"value": "Remote", "count": 1}]
+    assert facets["company"] == [{"value": "Acme", "count": 1}]
+    assert facets["status"]["new"] == 1
+    assert [bucket["count"] for bucket in facets["salary"]] == [0, 0, 0, 1, 0, 0]
+
+
+def test_get_job_and_search(db_manager):
+    db_manager.create_table(pd.DataFrame(sample_jobs), TABLE_NAME)
+    job_id = db_manager.list_jobs(TABLE_NAME)[1]["id"]
+
+    assert db_manager.get_job(TABLE_NAME, job_id)["job_description"] == sample_jobs[0]["job_description"]
+    total, jobs = db_manager.search_jobs(TABLE_NAME, "kafka")
+    assert total == 1 and jobs[0]["id"] == job_id
+
+    assert db_manager.set_job_status(TABLE_NAME, job_id, "hidden")
+    assert db_manager.search_jobs(TABLE_NAME, "kafka") == (0, [])
+    assert db_manager.set_job_statuses(TABLE_NAME, [(job_id, "hidden", False), (job_id, "applied", True)]) == 2
+    assert db_manager.search_jobs(TABLE_NAME, "kafka")[0] == 1
+
+
+def test_find_existing_keys(db_manager):
+    db_manager.create_table(pd.DataFrame(sample_jobs), TABLE_NAME)
+    jobs = [{"title": "Python Developer", "company": "Acme", "date": "2024-01-01",
+             "job_url": "https://www.linkedin.com/jobs/view/124/"}]
+
+    posting_ids, job_urls, title_company_dates = db_manager.find_existing_keys(jobs, TABLE_NAME)
+
+    assert posting_ids == {124}
+    assert job_urls == {"https://www.linkedin.com/jobs/view/124/"}
+    assert title_company_dates == {("Python Developer", "Acme", "2024-01-01")}
@@ -0,0 +1,72 @@
+import threading
+import pandas as pd
+import pytest
+from unittest.mock import patch
+from app.components.db_manager import DB_Manager
+from app.components.generator import GenerationError
+from app.components import pregeneration
+from app.components.pregeneration import pregenerate_documents, select_jobs
+
+DATE_LOADED = '2024-09-01 07:00:00'
+
+
+@pytest.fixture
+def db_manager():
+    db_manager = DB_Manager()
+    db_manager.create_connection(":memory:")
+    jobs = [{'title': f'Engineer {i}', 'company': 'TechCorp', 'location': 'Remote', 'date': f'2024-08-2{i}',
+             'job_url': f'https://example.com/job{i}', 'job_description': 'Kafka ' * i,
+             'max_salary': 100000 + i * 10000 if i != 2 else 0,
+             'date_loaded': DATE_LOADED if i > 1 else '2024-08-01 07:00:00'} for i in range(1, 5)]
+    db_manager.create_table(pd.DataFrame(jobs), 'jobs')
+    return db_manager
+
+
+def test_select_jobs_by_rule():
+    jobs = [{'id': 1, 'title': 'Kafka Engineer', 'job_description': 'Go', 'max_salary': 150000, 'date': '2024-08-01'},
+            {'id': 2, 'title': 'Engineer', 'job_description': 'Kafka, kafka', 'max_salary': None,
+             'date': '2024-08-03'},
+            {'id': 3, 'title': 'Engineer', 'job_description': 'Java', 'max_salary': 150000, 'date': '2024-08-02'}]
+    settings = dict(pregeneration.DEFAULT_PREGENERATION_SETTINGS, top_n=2)
+
+    assert [job['id'] for job in select_jobs(jobs, settings)] == [3, 1]
+    assert [job['id'] for job in select_jobs(jobs, dict(settings, rank_by='keywords', keywords=['KAFKA']))] == [2, 1]
+    assert [job['id'] for job in select_jobs(jobs, dict(settings, rank_by='newest'))] == [2, 3]
+    with pytest.raises(ValueError):
+        select_jobs(jobs, dict(settings, rank_by='vibes'))
+
+
+def test_pregenerate_documents_for_top_new_jobs(db_manager):
+    config = {"OpenAI_API_KEY": "test-key", "llm_cache": False,
+              "pregeneration": {"top_n": 2, "documents": ["cover_letter", "resume"], "requests_per_minute": 6000}}
+    threads = set()
+
+    def generate(document):
+        def generator(job, resume, settings):
+            threads.add(threading.current_thread().name)
+            if job['id'] == 3 and document == 'resume':
+                raise GenerationError("OpenAI is down")
+            return f"{document} for {job['title']} from {resume}"
+        return generator
+
+    generators = {document: generate(document) for document in ("cover_letter", "resume")}
+    with patch.object(pregeneration, 'DOCUMENT_GENERATORS', generators), \
+            patch.object(pregeneration, 'read_resume', return_value='My resume'):
+        generated = pregenerate_documents(db_manager, config, 'jobs', DATE_LOADED, 'resume.pdf', lambda path: path)
+
+    # Job 1 is from an earlier run and job 2 has no salary
+    assert generated == 3
+    assert db_manager.get_job('jobs', 4)['cover_letter'] == 'cover_letter for Engineer 4 from My resume'
+    assert db_manager.get_job('jobs', 4)['resume'] == 'resume for Engineer 4 from My resume'
+    assert db_manager.get_job('jobs', 3)['resume'] is None
+    assert db_manager.get_job('jobs', 2)['cover_letter'] is None
+    assert all(name.startswith('pregeneration') for name in threads)
+
+
+def test_pregenerate_documents_disabled_or_without_api_key(db_manager):
+    with patch.object(pregeneration, 'read_resume') as mock_read_resume:
+        assert pregenerate_documents(db_manager, {"OpenAI_API_KEY": "test-key"}, 'jobs', DATE_LOADED, 'resume.pdf',
+                                     lambda path: path) == 0
+        assert pregenerate_documents(db_manager, {"OpenAI_API_KEY": "", "pregeneration": {}}, 'jobs', DATE_LOADED,
+                                     'resume.pdf', lambda path: path) == 0
+    mock_read_resume.assert_not_called()
@@ -0,0 +1,73 @@
+import pandas as pd
+from app.components.db_manager import DB_Manager
+from app.components.prompt_compactor import PromptCompactor, estimate_tokens, get_settings, refresh_compactor
+
+EEO = "We are an equal opportunity employer and value diversity at our company."
+BENEFITS = "Benefits include medical, dental and vision insurance from day one."
+
+
+def make_job(company, title, duties):
+    return {'company': company, 'title': title, 'job_description': f"About the role\n{duties}\n{BENEFITS} {EEO}"}
+
+
+corpus = [make_job('TechCorp', 'Data Engineer', 'Build Kafka pipelines.'),
+          make_job('DataCorp', 'Backend Engineer', 'Write Python services.'),
+          make_job('WebCorp', 'Platform Engineer', 'Run Kubernetes clusters.')]
+
+
+def test_build_detects_boilerplate_sentences():
+    compactor = PromptCompactor()
+
+    assert compactor.build(corpus) == 2
+    job = compactor.compact_job(make_job('NewCorp', 'ML Engineer', 'Train models with PyTorch on large datasets.'))
+
+    # Short lines shared by every description, like headings, are kept
+    assert job['job_description'] == "About the role\nTrain models with PyTorch on large datasets."
+    assert job['company'] == 'NewCorp'
+    assert compactor.get_stats()['tokens_saved'] > 0
+
+
+def test_build_counts_reposted_jobs_once():
+    compactor = PromptCompactor()
+    reposts = [make_job('TechCorp', 'Data Engineer', 'Build and operate our Kafka pipelines every single day.')] * 3
+
+    assert compactor.build(reposts) == 0
+    assert compactor.strip_boilerplate(reposts[0]['job_description']) == reposts[0]['job_description']
+
+
+def test_truncate_to_token_budget():
+    text = "first line of the description\nsecond line of the description"
+
+    assert PromptCompactor.truncate(text, None) == text
+    assert PromptCompactor.truncate(text, 100) == text
+    truncated = PromptCompactor.truncate(text, 10)
+    assert truncated == "first line of the description\nsecond"
+    assert estimate_tokens(truncated) <= 10
+
+
+def test_compact_resume_only_with_budget():
+    compactor = PromptCompactor({"resume_tokens": 3})
+
+    assert compactor.compact_resume("Senior Python developer") == "Senior"
+    assert PromptCompactor().compact_resume("Senior Python developer") == "Senior Python developer"
+
+
+def test_refresh_compactor_from_stored_descriptions():
+    db_manager = DB_Manager()
+    db_manager.create_connection(":memory:")
+    jobs = [dict(job, job_url=f'https://example.com/job{i}', date='2024-08-25') for i, job in enumerate(corpus)]
+    db_manager.create_table(pd.DataFrame(jobs), 'jobs')
+    compactor = PromptCompactor({"refresh_minutes": 0})
+
+    refresh_compactor(compactor, db_manager, 'jobs')
+    assert len(compactor.boilerplate) == 2
+    assert compactor.corpus_marker == 3
+    assert not compactor.refresh_due(3)
+    assert compactor.refresh_due(4)
+
+
+def test_get_settings_is_opt_in():
+    assert get_settings({}) is None
+    assert get_settings({"prompt_compaction": False}) is None
+    assert get_settings({"prompt_compaction": True})["description_tokens"] == 1500
+    assert get_settings({"prompt_compaction": {"description_tokens": None}})["description_tokens"] is None
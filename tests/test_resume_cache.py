@@ -0,0 +1,61 @@
+import os
+import pytest
+from app.components.resume_cache import ResumeTextCache
+
+
+def extract_text(pdf_file):
+    return pdf_file.read().decode().upper()
+
+
+@pytest.fixture
+def resume_path(tmp_path):
+    path = tmp_path / "resume.pdf"
+    path.write_bytes(b"python engineer")
+    return str(path)
+
+
+def test_get_text_parses_unchanged_resume_once(resume_path):
+    cache = ResumeTextCache(extract_text)
+
+    assert cache.get_text(resume_path) == "PYTHON ENGINEER"
+    assert cache.get_text(resume_path) == "PYTHON ENGINEER"
+    assert cache.parses == 1
+    assert not os.path.exists(resume_path + ResumeTextCache.CACHE_SUFFIX)
+
+
+def test_get_text_checks_content_hash_when_file_changes(resume_path):
+    cache = ResumeTextCache(extract_text)
+    cache.get_text(resume_path)
+
+    stat = os.stat(resume_path)
+    os.utime(resume_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    assert cache.get_text(resume_path) == "PYTHON ENGINEER"
+    assert cache.parses == 1
+
+    with open(resume_path, 'wb') as f:
+        f.write(b"kafka engineer")
+    assert cache.get_text(resume_path) == "KAFKA ENGINEER"
+    assert cache.parses == 2
+
+
+def test_get_text_persisted_next_to_pdf(resume_path):
+    ResumeTextCache(extract_text, persist=True).get_text(resume_path)
+    cache = ResumeTextCache(extract_text, persist=True)
+
+    assert os.path.exists(resume_path + ResumeTextCache.CACHE_SUFFIX)
+    assert cache.get_text(resume_path) == "PYTHON ENGINEER"
+    assert cache.parses == 0
+
+
+def test_get_text_ignores_corrupt_cache_file(resume_path):
+    with open(resume_path + ResumeTextCache.CACHE_SUFFIX, 'w') as f:
+        f.write("{not json")
+    cache = ResumeTextCache(extract_text, persist=True)
+
+    assert cache.get_text(resume_path) == "PYTHON ENGINEER"
+    assert cache.parses == 1
+
+
+def test_get_text_missing_file(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        ResumeTextCache(extract_text).get_text(str(tmp_path / "missing.pdf"))
@@ -0,0 +1,65 @@
+import sqlite3
+from datetime import datetime, timedelta
+from unittest.mock import MagicMock
+from app.components import retention
+from app.components.db_manager import DB_Manager
+
+config = {
+    "jobs_tablename": "jobs",
+    "filtered_jobs_tablename": "filtered_jobs",
+    "retention": {"jobs_max_age_days": 90, "filtered_jobs_max_age_days": 30}
+}
+
+
+def make_job(number, days_old, applied=0):
+    loaded = (datetime.now() - timedelta(days=days_old)).strftime('%Y-%m-%d %H:%M:%S')
+    return {"title": f"Engineer {number}", "company": "TechCorp", "location": "Denver", "date": loaded[:10],
+            "job_url": f"https://www.linkedin.com/jobs/view/{number}/", "job_description": f"Kafka job {number}",
+            "applied": applied, "date_loaded": loaded}
+
+
+def create_db_manager(tmp_path):
+    db_manager = DB_Manager()
+    db_manager.create_connection(str(tmp_path / "hot.db"))
+    db_manager.ensure_schema("jobs")
+    db_manager.insert_records([make_job(1, 100), make_job(2, 100, applied=1), make_job(3, 5)], "jobs")
+    db_manager.ensure_schema("filtered_jobs")
+    db_manager.insert_records([make_job(4, 40), make_job(5, 1)], "filtered_jobs")
+    return db_manager
+
+
+def test_run_retention_archives_old_jobs(tmp_path):
+    db_manager = create_db_manager(tmp_path)
+    archive_path = str(tmp_path / "archive.db")
+
+    archived = retention.run_retention(db_manager, config, archive_path)
+
+    assert archived == {"jobs": 1, "filtered_jobs": 1}
+    assert [job["title"] for job in db_manager.list_jobs("jobs")] == ["Engineer 3", "Engineer 2"]
+    assert db_manager.search_jobs("jobs", "kafka")[0] == 2
+    archive = DB_Manager(sqlite3.connect(archive_path))
+    assert archive.get_job("jobs", 1)["job_description"] == "Kafka job 1"
+    assert [job["title"] for job in archive.list_jobs("filtered_jobs")] == ["Engineer 4"]
+    # The archived jobs are still recognised as already scraped
+    scraped = [make_job(1, 0), make_job(4, 0), make_job(6, 0)]
+    assert [job["title"] for job in db_manager.find_new_jobs(scraped, config)] == ["Engineer 6"]
+    assert db_manager.connection.execute("PRAGMA auto_vacuum").fetchone()[0] == 2
+    db_manager.close()
+
+
+def test_run_retention_schedule(tmp_path):
+    db_manager = create_db_manager(tmp_path)
+    archive_path = str(tmp_path / "archive.db")
+
+    assert retention.run_retention(db_manager, config, archive_path) is not None
+    assert retention.run_retention(db_manager, config, archive_path) is None
+    assert retention.run_retention(db_manager, {**config, "retention": {"interval_hours": 0}}, archive_path) == \
+        {"filtered_jobs": 0}
+    db_manager.close()
+
+
+def test_run_retention_disabled():
+    db_manager = MagicMock()
+
+    assert retention.run_retention(db_manager, {"jobs_tablename": "jobs"}, "archive.db") is None
+    db_manager.table_exists.assert_not_called()
@@ -0,0 +1,54 @@
+import pytest
+from unittest.mock import patch
+from app.components import storage
+from app.components.db_manager import DB_Manager
+
+
+def test_create_db_manager_defaults_to_sqlite(tmp_path):
+    db_manager = storage.create_db_manager({}, str(tmp_path / "test.db"))
+
+    assert type(db_manager) is DB_Manager
+    assert db_manager.connection is not None
+    db_manager.close()
+
+
+@patch('app.components.pg_manager.PG_Manager.create_connection')
+def test_create_db_manager_postgres(mock_create_connection):
+    config = {"db_backend": "postgres", "postgres": {"host": "db", "max_connections": 4}}
+
+    db_manager = storage.create_db_manager(config)
+
+    assert db_manager.PLACEHOLDER == '%s'
+    settings = mock_create_connection.call_args[0][0]
+    assert settings["host"] == "db"
+    assert settings["max_connections"] == 4
+
+
+def test_create_db_manager_unknown_backend():
+    with pytest.raises(ValueError):
+        storage.create_db_manager({"db_backend": "mysql"})
+
+
+@patch.dict('os.environ', {"DB_HOST": "pg", "DB_PORT": "6543", "DB_USER": "scraper", "DB_PASSWORD": "secret",
+                           "DB_NAME": "jobs"})
+def test_get_postgres_settings_from_environment():
+    settings = storage.get_postgres_settings({"postgres": {"dbname": "jobs_test"}})
+
+    assert settings["host"] == "pg"
+    assert settings["port"] == 6543
+    assert settings["user"] == "scraper"
+    assert settings["password"] == "secret"
+    assert settings["dbname"] == "jobs_test"
+    assert settings["min_connections"] == 1
+
+
+def test_create_db_manager_pooled(tmp_path):
+    db_path = str(tmp_path / "test.db")
+    storage.create_db_manager({}, db_path).close()  # creates the database file
+
+    db_manager = storage.create_db_manager({}, db_path, pooled=True, read_only=True)
+    connection = db_manager.connection
+    db_manager.close()
+
+    assert db_manager.connection is None
+    assert storage.create_db_manager({}, db_path, pooled=True, read_only=True).connection is connection
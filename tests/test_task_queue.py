@@ -0,0 +1,59 @@
+import threading
+from app.components.task_queue import DONE, FAILED, TaskQueue
+
+
+def wait_for(task_queue, task_id):
+    task_queue.shutdown()
+    return task_queue.get(task_id)
+
+
+def test_submit_runs_task_in_background():
+    task_queue = TaskQueue(max_workers=1)
+    release = threading.Event()
+    task_id = task_queue.submit(("cover_letter", 1), lambda: release.wait(5) and "Dear hiring manager")
+
+    assert task_queue.get(task_id)["status"] in ("queued", "running")
+    release.set()
+    task = wait_for(task_queue, task_id)
+    assert (task["status"], task["result"], task["error"]) == (DONE, "Dear hiring manager", None)
+
+
+def test_submit_reuses_pending_task_with_same_key():
+    task_queue = TaskQueue(max_workers=1)
+    release = threading.Event()
+    calls = []
+
+    def generate(job_id):
+        calls.append(job_id)
+        release.wait(5)
+        return job_id
+
+    first_id = task_queue.submit(("cover_letter", 1), generate, 1)
+    assert task_queue.submit(("cover_letter", 1), generate, 1) == first_id
+    other_id = task_queue.submit(("resume", 1), generate, 2)
+    release.set()
+    task_queue.shutdown()
+
+    assert other_id != first_id
+    assert calls == [1, 2]
+    assert task_queue.get(first_id)["status"] == DONE
+
+
+def test_failed_task_records_error():
+    task_queue = TaskQueue()
+
+    def fail():
+        raise ValueError("OpenAI is down")
+
+    task = wait_for(task_queue, task_queue.submit(None, fail))
+    assert (task["status"], task["error"]) == (FAILED, "OpenAI is down")
+
+
+def test_finished_tasks_expire():
+    task_queue = TaskQueue(max_workers=1, max_finished=2)
+    task_ids = [task_queue.submit(None, lambda i=i: i) for i in range(3)]
+    task_queue.shutdown()
+
+    assert task_queue.get(task_ids[0]) is None
+    assert task_queue.get(task_ids[2])["result"] == 2
+    assert task_queue.get("unknown") is None
@@ -0,0 +1,14 @@
+# WSGI entry point of the web interface, e.g. gunicorn --workers 1 --threads 8 "wsgi:create_app()". app.py can't be
+# imported as "app", since the app/ package of the scraper takes that name, so it is loaded from its file here.
+import importlib.util
+import os
+import sys
+
+spec = importlib.util.spec_from_file_location(
+    'web_app', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'app.py'))
+web_app = importlib.util.module_from_spec(spec)
+# Registered before running it, Flask looks the module up by name to find the templates and static files
+sys.modules['web_app'] = web_app
+spec.loader.exec_module(web_app)
+
+create_app = web_app.create_app